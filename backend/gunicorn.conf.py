@@ -0,0 +1,55 @@
+"""
+Gunicorn configuration, read from the working directory on start.
+
+The application is loaded and warmed up once in the master process
+before workers are forked, so workers start in milliseconds and share the
+imported code copy-on-write. Migrations are not run here; they run in the
+release step (see the Procfile).
+"""
+import gc
+import multiprocessing
+import os
+
+bind = f'0.0.0.0:{os.environ.get("PORT", "8000")}'
+workers = int(os.environ.get(
+    'WEB_CONCURRENCY', min(4, multiprocessing.cpu_count() * 2 + 1)))
+# Event streams (/api/events/) hold a thread for minutes; threaded workers
+# keep serving other requests meanwhile and only time out when the whole
+# worker hangs
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+# Read by the settings, which size the event streams and caches for them
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['GUNICORN_THREADS'] = str(threads)
+preload_app = True
+# Writing the heartbeat to memory avoids stalls on slow container disks
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def when_ready(server):
+    from django.core import checks
+    from django.db import connections
+
+    from tasks.events import get_setting
+    from tasks.startup import pending_migrations, warm_up
+
+    warm_up()
+    pending = pending_migrations()
+    if pending:
+        server.log.warning(
+            '%d unapplied migrations, run "manage.py migrate"', len(pending))
+    # Settings that break with several workers or in production
+    for message in checks.run_checks(
+            tags=[checks.Tags.caches, checks.Tags.security]):
+        server.log.warning('%s', message)
+    if worker_class == 'sync' and get_setting('STREAM_SECONDS') >= timeout:
+        server.log.warning(
+            'Sync workers are blocked by event streams and killed after '
+            '%ds; use the gthread worker class', timeout)
+    # Workers open their own database connections
+    connections.close_all()
+    # Objects created so far are never freed; keeping the collector away
+    # from them keeps their pages shared with the workers
+    gc.freeze()
+
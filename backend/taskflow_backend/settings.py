@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import dj_database_url
 from pathlib import Path
 from datetime import timedelta
+from importlib.util import find_spec
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -52,7 +53,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Routes token-authenticated API requests around the session, CSRF,
+    # messages and static file middleware (see API_PIPELINE)
+    'tasks.pipeline.RequestPipelineMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'tasks.throttling.RateLimitHeadersMiddleware',
+    'tasks.middleware.CompressionMiddleware',
+    'tasks.middleware.CachePolicyMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -61,6 +68,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Writes the task activity of a request in one query (see
+    # tasks/activity.py)
+    'tasks.activity.ActivityMiddleware',
 ]
 
 ROOT_URLCONF = 'taskflow_backend.urls'
@@ -113,6 +123,28 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing: Argon2id when argon2-cffi is installed, scrypt otherwise.
+# The first hasher is used for new passwords; the others still verify old
+# hashes, which are upgraded on the next login. Costs are in
+# PASSWORD_HASHING (see tasks/hashers.py).
+PASSWORD_HASHERS = [
+    'tasks.hashers.TunedScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+if find_spec('argon2'):
+    PASSWORD_HASHERS.insert(0, 'tasks.hashers.TunedArgon2PasswordHasher')
+
+PASSWORD_HASHING = {
+    'MAX_CONCURRENT': int(os.environ.get('PASSWORD_HASHING_CONCURRENCY', 2)),
+    'ARGON2_TIME_COST': 2,
+    'ARGON2_MEMORY_COST': 64 * 1024,
+    'ARGON2_PARALLELISM': 1,
+    'SCRYPT_WORK_FACTOR': 2 ** 14,
+    'SCRYPT_BLOCK_SIZE': 8,
+    'SCRYPT_PARALLELISM': 1,
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -148,7 +180,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'tasks.pagination.BoundedPageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -162,7 +194,34 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.JSONParser',
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
-    ]
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'tasks.throttling.CostThrottle',
+    ],
+}
+
+# Cost-weighted token bucket throttling (see tasks/throttling.py). Buckets
+# live in the CACHE alias, which must be shared (REDIS_URL) with several
+# workers; the tasks.W003 check warns otherwise. RATE is tokens refilled
+# per second.
+TASK_THROTTLE = {
+    'CACHE': 'default',
+    'CAPACITY': 300,
+    'RATE': 5,
+    'ANON_CAPACITY': 60,
+    'ANON_RATE': 1,
+    'DEFAULT_COST': 1,
+    'COSTS': {
+        'list': 2,
+        'search': 5,
+        'export': 20,
+        'statistics': 10,
+        'trends': 5,
+        'critical_path': 5,
+        'dashboard_summary': 10,
+        'login_user': 5,
+        'register_user': 10,
+    },
 }
 
 # JWT Configuration
@@ -194,62 +253,183 @@ CORS_ALLOWED_ORIGINS = [
     "https://*.vercel.app",
 ]
 
-# Cache configuration (development)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+# Gunicorn exports its worker and thread counts (see gunicorn.conf.py);
+# they are unset under runserver
+WEB_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 1))
+WEB_THREADS = int(os.environ.get('GUNICORN_THREADS', 0))
+
+# Cache configuration. The local memory cache is per process; several
+# workers need a shared cache (REDIS_URL, requires the redis package) for
+# the throttle buckets, event broker and saved view invalidations.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+        }
     }
-}
 
 # Logging configuration
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-            'style': '{',
+        'json': {
+            '()': 'tasks.log.JSONFormatter',
         },
         'simple': {
             'format': '{levelname} {message}',
             'style': '{',
         },
     },
+    'filters': {
+        'sampling': {
+            '()': 'tasks.log.SamplingFilter',
+            # Fraction of records kept per logger (warnings always are)
+            'rates': {
+                'django.server': float(
+                    os.environ.get('LOG_SAMPLE_SERVER', 0.1)),
+                'django.db.backends': 0.01,
+            },
+        },
+    },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': 'django.log',
-            'formatter': 'verbose',
+            'class': 'tasks.log.SizedTimedRotatingFileHandler',
+            'filename': os.environ.get('LOG_FILE', 'django.log'),
+            'when': 'midnight',
+            'backupCount': 7,
+            'maxBytes': 50 * 1024 * 1024,
+            'delay': True,
+            'formatter': 'json',
         },
         'console': {
             'level': 'INFO',
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        # Requests only enqueue records; a listener thread writes them
+        'queue': {
+            'class': 'tasks.log.QueueListenerHandler',
+            'targets': ['cfg://handlers.console', 'cfg://handlers.file'],
+            'queue_size': 10000,
+            'filters': ['sampling'],
+        },
     },
     'root': {
-        'handlers': ['console', 'file'],
+        'handlers': ['queue'],
         'level': 'INFO',
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
     },
 }
 
+# Recurring tasks: how many days back overdue occurrences are expanded
+RECURRENCE_OVERDUE_LOOKBACK_DAYS = 7
+
+# Server-push change events. Several workers only see each other's events
+# through CacheBroker and a shared cache. Each open stream holds a worker
+# thread; MAX_STREAMS per process leaves the other half to the API.
+# Streams open with a ticket valid for TICKET_SECONDS.
+TASK_EVENTS = {
+    'BACKEND': ('tasks.events.CacheBroker' if WEB_WORKERS > 1
+                else 'tasks.events.InProcessBroker'),
+    'BACKLOG': 500,
+    'KEEPALIVE_SECONDS': 15,
+    'STREAM_SECONDS': 300,
+    'MAX_STREAMS': WEB_THREADS // 2 or None,
+    'TICKET_SECONDS': 60,
+}
+
+# API response compression and caching (see tasks/middleware.py). zstd and
+# brotli are used when the zstandard/brotli packages are installed.
+API_HTTP = {
+    'COMPRESS_MIN_SIZE': 1024,
+    'ENCODINGS': ['zstd', 'br', 'gzip'],
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 4,
+    'ZSTD_LEVEL': 3,
+    # Cache-Control per URL name. Responses carry ETags, so "no-cache"
+    # still lets clients revalidate cheaply.
+    'CACHE_CONTROL': {
+        'DEFAULT': 'private, no-cache',
+        'task-trends': 'private, max-age=300',
+        'auth-register': 'no-store',
+        'auth-login': 'no-store',
+        'auth-logout': 'no-store',
+        'auth-profile': 'no-store',
+        'event-ticket': 'no-store',
+    },
+}
+
+# Lean middleware stack for token-authenticated API requests (see
+# tasks/pipeline.py). TIMING adds a Server-Timing header with the time
+# spent in each middleware.
+API_PIPELINE = {
+    'ENABLED': True,
+    'FULL_STACK_PATHS': ['/api/auth/login/', '/api/auth/register/'],
+    'TIMING': os.environ.get('API_PIPELINE_TIMING', 'False') == 'True',
+}
+
+# Cached task id lists of saved views (see tasks/saved_views.py). Use a
+# shared cache (e.g. Redis) so invalidations reach every worker.
+SAVED_VIEWS = {
+    'CACHE': 'default',
+    'TIMEOUT': 600,
+    'TIME_DEPENDENT_TIMEOUT': 60,
+    'MAX_IDS': 5000,
+}
+
+# Due-date reminders sent by the dispatch_reminders command (see
+# tasks/reminders.py). Sinks: tasks.reminders.LocalSink (log only),
+# EmailSink (EMAIL_BACKEND) and WebhookSink (OPTIONS: {'url': ...}).
+TASK_REMINDERS = {
+    'SINKS': [{'BACKEND': os.environ.get(
+        'REMINDER_SINK', 'tasks.reminders.LocalSink')}],
+    'TICK_SECONDS': 1,
+    'WINDOW_SECONDS': 300,
+    'RESCAN_SECONDS': 5,
+    'BATCH_SIZE': 500,
+    'MAX_REMINDERS': 5,
+}
+
+# Append-only task activity log behind /api/activity/ (see
+# tasks/activity.py). Months older than the retention are dropped by the
+# partition_activity command.
+TASK_ACTIVITY = {
+    'RETENTION_MONTHS': 24,
+    'PARTITIONS_AHEAD': 3,
+    'PAGE_SIZE': 50,
+}
+
+# Soft-deleted tasks and categories can be restored for this many days
+# before the purge_tombstones command removes them
+TOMBSTONE_RETENTION_DAYS = 30
+
+# Completed tasks move to the archive table this many days after completion
+# (see the archive_tasks command)
+TASK_ARCHIVE_AFTER_DAYS = 90
+
 # Email configuration (for development)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # Production Settings
 
 if not DEBUG:
-    print("Running in PRODUCTION mode")
-
     # Security Settings
     SECURE_SSL_REDIRECT = True
     SESSION_COOKIE_SECURE = True
@@ -266,12 +446,8 @@ if not DEBUG:
     if frontend_url:
         CORS_ALLOWED_ORIGINS = [frontend_url]
         CORS_ALLOW_ALL_ORIGINS = False
-        print(f"CORS allowed for: {frontend_url}")
     else:
         CORS_ALLOW_ALL_ORIGINS = True
-        print("WARNING: CORS allows all origins")
-else:
-    print("Running in DEVELOPMENT mode")
 
 # Static files for production
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
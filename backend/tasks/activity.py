@@ -0,0 +1,118 @@
+"""
+Append-only task activity log.
+
+Task signals call ``record`` for every change. Inside a request an event
+joins the request's buffer once its transaction commits
+(``transaction.on_commit``), so rolled back changes are never logged,
+and ``ActivityMiddleware`` writes the whole buffer with one
+``bulk_create`` when the view returns, with the request's user as the
+actor. Outside requests each event is written when its transaction
+commits.
+
+Settings live in ``TASK_ACTIVITY``; old months are dropped by the
+partition_activity command.
+"""
+import logging
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import TaskActivity
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'RETENTION_MONTHS': 24,
+    # Monthly partitions created in advance (PostgreSQL)
+    'PARTITIONS_AHEAD': 3,
+    'PAGE_SIZE': 50,
+}
+
+# Fields that change with every write and say nothing about the change
+BOOKKEEPING_FIELDS = {'updated_at', 'version', 'completed_at'}
+
+_buffer = ContextVar('activity_buffer', default=None)
+
+
+def get_setting(name):
+    return getattr(settings, 'TASK_ACTIVITY', {}).get(name, DEFAULTS[name])
+
+
+class ActivityBuffer:
+    """Committed events of one request, written together at its end"""
+
+    def __init__(self):
+        self.events = []
+        self.actor_id = None
+        self.flushed = False
+
+    def add(self, event):
+        if self.flushed:
+            # Committed after the view returned (e.g. by an outer atomic)
+            event.actor_id = self.actor_id
+            TaskActivity.objects.bulk_create([event])
+        else:
+            self.events.append(event)
+
+    def flush(self, actor_id=None):
+        self.actor_id = actor_id
+        self.flushed = True
+        for event in self.events:
+            event.actor_id = actor_id
+        if self.events:
+            TaskActivity.objects.bulk_create(self.events)
+        self.events = []
+
+
+def record(task, action, changes=None):
+    """Log a change of ``task`` once the current transaction commits"""
+    event = TaskActivity(
+        task_id=task.pk, owner_id=task.user_id,
+        category_id=task.category_id, action=action, changes=changes)
+    buffer = _buffer.get()
+    if buffer is None:
+        transaction.on_commit(
+            lambda: TaskActivity.objects.bulk_create([event]))
+    else:
+        transaction.on_commit(lambda: buffer.add(event))
+
+
+def record_save(task, created, update_fields):
+    """Log a task save, as reported by its post_save signal"""
+    if created:
+        return record(task, TaskActivity.CREATED)
+    fields = set(update_fields or ())
+    if 'deleted_at' in fields:
+        return record(task, TaskActivity.DELETED if task.deleted_at
+                      else TaskActivity.RESTORED)
+    # Signals are sent before the task forgets its loaded values
+    loaded_status = task._loaded('status')
+    changes = {'fields': sorted(fields - BOOKKEEPING_FIELDS - {'status'})}
+    if 'status' in fields and loaded_status != task.status:
+        changes['status'] = [loaded_status, task.status]
+        return record(task, TaskActivity.STATUS_CHANGED, changes)
+    return record(task, TaskActivity.UPDATED, changes)
+
+
+class ActivityMiddleware:
+    """Collects a request's activity and writes it in one query"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        buffer = ActivityBuffer()
+        token = _buffer.set(buffer)
+        try:
+            return self.get_response(request)
+        finally:
+            _buffer.reset(token)
+            # DRF sets the authenticated user on the request
+            user = getattr(request, 'user', None)
+            try:
+                buffer.flush(
+                    user.pk if user and user.is_authenticated else None)
+            except Exception:
+                logger.exception('Could not write %d activity events',
+                                 len(buffer.events))
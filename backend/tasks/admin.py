@@ -1,6 +1,51 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Category, Task
+from .models import (
+    User, Category, CategoryMembership, SavedView, Tag, Task, ArchivedTask,
+    TaskActivity, TaskDependency, TaskReminder
+)
+from .pagination import EstimatedCountPaginator
+
+
+class InputListFilter(admin.SimpleListFilter):
+    """
+    List filter rendered as a text box.
+
+    The built-in related filters render one link per user or category,
+    which means loading every row of those tables on each changelist
+    page. This filters on an exact, indexed lookup instead.
+    """
+    template = 'admin/tasks/input_filter.html'
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.lookup: self.value()})
+        return queryset
+
+    def choices(self, changelist):
+        # Keep the other active filters when the box is submitted
+        params = {name: value for name, value in changelist.params.items()
+                  if name != self.parameter_name}
+        yield {'params': params, 'value': self.value() or ''}
+
+
+class UsernameListFilter(InputListFilter):
+    title = 'username'
+    parameter_name = 'username'
+    lookup = 'user__username'
+
+
+class CategoryNameListFilter(InputListFilter):
+    title = 'category name'
+    parameter_name = 'category_name'
+    lookup = 'category__name'
 
 
 @admin.register(User)
@@ -17,9 +62,13 @@ class UserAdmin(BaseUserAdmin):
 class CategoryAdmin(admin.ModelAdmin):
     """Category admin interface"""
     list_display = ['name', 'user', 'color', 'created_at']
-    list_filter = ['created_at', 'user']
-    search_fields = ['name', 'user__username']
+    list_filter = ['created_at', UsernameListFilter]
+    list_select_related = ['user']
+    # Prefix and exact lookups can use the name and username indexes
+    search_fields = ['name__startswith', '=user__username']
     ordering = ['-created_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     # Hide user field from the form
     fields = ['name', 'color']
@@ -38,6 +87,17 @@ class CategoryAdmin(admin.ModelAdmin):
         return qs.filter(user=request.user)
 
 
+@admin.register(CategoryMembership)
+class CategoryMembershipAdmin(admin.ModelAdmin):
+    """Category membership admin interface"""
+    list_display = ['category', 'user', 'role', 'created_at']
+    list_filter = ['role']
+    list_select_related = ['category', 'user']
+    raw_id_fields = ['category', 'user']
+    search_fields = ['category__name__startswith', '=user__username']
+    ordering = ['-created_at']
+
+
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     """Task admin interface"""
@@ -53,14 +113,19 @@ class TaskAdmin(admin.ModelAdmin):
     list_filter = [
         'status',
         'priority',
-        'category',
+        CategoryNameListFilter,
         'created_at',
         'due_date',
-        'user'
+        UsernameListFilter,
     ]
-    search_fields = ['title', 'description', 'user__username']
+    list_select_related = ['user', 'category']
+    # Prefix and exact lookups can use the title and username indexes;
+    # substring search over descriptions means a full table scan
+    search_fields = ['=id', 'title__startswith', '=user__username']
     ordering = ['-created_at']
-    date_hierarchy = 'created_at'
+    autocomplete_fields = ['category']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     # Custom fieldsets without user field
     fieldsets = (
@@ -87,3 +152,78 @@ class TaskAdmin(admin.ModelAdmin):
         if request.user.is_superuser:
             return qs
         return qs.filter(user=request.user)
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    """Tag admin interface"""
+    list_display = ['name', 'user', 'task_count', 'created_at']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    readonly_fields = ['task_count']
+    search_fields = ['name__startswith', '=user__username']
+    ordering = ['-created_at']
+
+
+@admin.register(SavedView)
+class SavedViewAdmin(admin.ModelAdmin):
+    """Saved view admin interface"""
+    list_display = ['name', 'user', 'updated_at']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    search_fields = ['name__startswith', '=user__username']
+    ordering = ['-updated_at']
+
+
+@admin.register(TaskDependency)
+class TaskDependencyAdmin(admin.ModelAdmin):
+    """Task dependency admin interface"""
+    list_display = ['task', 'depends_on', 'user', 'created_at']
+    list_select_related = ['task', 'depends_on', 'user']
+    raw_id_fields = ['task', 'depends_on', 'user']
+    ordering = ['-created_at']
+
+
+@admin.register(TaskReminder)
+class TaskReminderAdmin(admin.ModelAdmin):
+    """Task reminder admin interface"""
+    list_display = ['task', 'user', 'offset', 'remind_at', 'sent_at']
+    list_select_related = ['task', 'user']
+    raw_id_fields = ['task', 'user']
+    search_fields = ['=user__username']
+    ordering = ['-remind_at']
+
+
+@admin.register(TaskActivity)
+class TaskActivityAdmin(admin.ModelAdmin):
+    """Read-only view of the append-only activity log"""
+    list_display = ['id', 'task_id', 'action', 'owner_id', 'actor_id',
+                    'created_at']
+    list_filter = ['action']
+    # Exact lookups use the (task, id) and (owner, id) indexes
+    search_fields = ['=task__id', '=owner__username']
+    ordering = ['-id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedTask)
+class ArchivedTaskAdmin(admin.ModelAdmin):
+    """Archived task admin interface"""
+    list_display = ['title', 'user', 'priority', 'completed_at',
+                    'archived_at']
+    list_select_related = ['user']
+    raw_id_fields = ['user', 'category']
+    search_fields = ['=id', '=user__username']
+    ordering = ['-completed_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
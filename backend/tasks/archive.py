@@ -0,0 +1,135 @@
+"""
+Archival tier for completed tasks.
+
+Tasks completed more than ``TASK_ARCHIVE_AFTER_DAYS`` ago are moved from
+``tasks_task`` to ``ArchivedTask`` by the archive_tasks command, in small
+transactions. Lists and search only read the archive when a client passes
+``include_archived=1``; statistics add the archived counts so aggregates
+don't change when tasks move. Archived tasks leave the tag index; the
+names of their tags are kept in ``ArchivedTask.tags``.
+"""
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Value, When
+from django.utils import timezone
+
+from .models import ArchivedTask, Tag, Task, TaskDependency, TaskTag
+
+ARCHIVE_AFTER_DAYS = getattr(settings, 'TASK_ARCHIVE_AFTER_DAYS', 90)
+
+_archiving = ContextVar('archiving', default=False)
+
+
+def is_archiving():
+    """Whether tasks deleted now are moving to the archive"""
+    return _archiving.get()
+
+
+def archivable_tasks(cutoff):
+    """
+    Live tasks completed before ``cutoff`` that can safely be moved.
+
+    Tasks with live subtasks or materialized occurrences stay until those
+    are archived, and occurrences are only archived once their date is
+    past the cutoff too, so the recurrence expansion never revives them.
+    """
+    return Task.objects.filter(
+        status='completed', completed_at__lt=cutoff, recurrence='',
+    ).filter(
+        Q(occurrence_date__isnull=True) | Q(occurrence_date__lt=cutoff)
+    ).exclude(
+        Exists(Task.all_objects.filter(parent=OuterRef('pk')))
+    ).exclude(
+        Exists(Task.all_objects.filter(recurrence_parent=OuterRef('pk')))
+    )
+
+
+def archive_batch(cutoff, batch_size):
+    """Move one batch of archivable tasks; returns the number moved"""
+    with transaction.atomic():
+        tasks = list(archivable_tasks(cutoff).order_by(
+            'completed_at').select_for_update()[:batch_size])
+        if not tasks:
+            return 0
+        ids = [task.pk for task in tasks]
+        archived = [ArchivedTask.from_task(task) for task in tasks]
+        # Archived tasks keep the names of their tags, but leave the tag
+        # index and counts
+        tags = {}
+        for task_id, user_id, name in TaskTag.objects.filter(
+                task_id__in=ids).order_by('tag__name').values_list(
+                'task_id', 'user_id', 'tag__name'):
+            tags.setdefault(task_id, []).append(
+                {'user': user_id, 'name': name})
+        for task in archived:
+            task.tags = tags.get(task.pk, [])
+        ArchivedTask.objects.bulk_create(archived)
+        Tag.adjust_task_counts(ids, -1)
+        # Blockers of completed tasks no longer matter
+        TaskDependency.objects.filter(
+            Q(task_id__in=ids) | Q(depends_on_id__in=ids)).delete()
+        # A queryset delete skips Task.delete(), which would detach the
+        # rows from their ancestors' rollups. Its delete signals report
+        # the tasks as archived.
+        token = _archiving.set(True)
+        try:
+            Task.all_objects.filter(pk__in=ids).delete()
+        finally:
+            _archiving.reset(token)
+    return len(ids)
+
+
+def archive_cutoff(days=None):
+    return timezone.now() - timedelta(
+        days=ARCHIVE_AFTER_DAYS if days is None else days)
+
+
+def archived_counts(archived_tasks):
+    """Archived task counts by priority and live category name, one query"""
+    return archived_tasks.values(
+        'priority',
+        category_name=Case(When(
+            category__deleted_at__isnull=True, then=F('category__name'))),
+    ).annotate(count=Count('id')).order_by()
+
+
+class ArchiveUnionSequence:
+    """
+    Sliceable UNION ALL of live and archived tasks, for the paginator.
+
+    Pages are ordered in the database over the key columns only; the rows
+    on the page are then loaded from their own table.
+    """
+
+    def __init__(self, live, archived):
+        ordering = list(live.query.order_by or Task._meta.ordering)
+        columns = ['id'] + [name.lstrip('-') for name in ordering
+                            if name.lstrip('-') != 'id']
+        self.live = live
+        self.archived = archived
+        self.keys = live.order_by().values(
+            *columns, archived=Value(False)
+        ).union(
+            archived.order_by().values(*columns, archived=Value(True)),
+            all=True,
+        ).order_by(*ordering)
+
+    def count(self):
+        return self.keys.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        page = [(row['archived'], row['id']) for row in self.keys[index]]
+        live = self.live.in_bulk(
+            [pk for archived, pk in page if not archived])
+        archived = self.archived.select_related('user', 'category').in_bulk(
+            [pk for archived, pk in page if archived])
+        return [archived[pk].as_task() if is_archived else live[pk]
+                for is_archived, pk in page]
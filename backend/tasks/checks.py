@@ -0,0 +1,72 @@
+"""
+System checks for deployment settings.
+
+Gunicorn exports its worker count as ``WEB_WORKERS``; with several
+workers, state kept in a local memory cache or in process memory is seen
+by one worker only. Production also needs its CORS origins set.
+Gunicorn logs these checks when it starts.
+"""
+from django.conf import settings
+from django.core import checks
+
+from .events import get_setting as event_setting
+from .throttling import get_setting as throttle_setting
+
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def is_process_local(alias):
+    """Whether each process has its own copy of the cache"""
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    return backend in PROCESS_LOCAL_CACHES
+
+
+@checks.register(checks.Tags.caches)
+def check_event_broker(app_configs, **kwargs):
+    workers = getattr(settings, 'WEB_WORKERS', 1)
+    if workers <= 1:
+        return []
+    backend = event_setting('BACKEND')
+    if backend == 'tasks.events.InProcessBroker':
+        return [checks.Warning(
+            f'Events published in one of the {workers} workers never reach '
+            f'streams held by another.',
+            hint="Set TASK_EVENTS['BACKEND'] to 'tasks.events.CacheBroker'.",
+            id='tasks.W001')]
+    alias = event_setting('OPTIONS').get('cache_alias', 'default')
+    if (backend == 'tasks.events.CacheBroker'
+            and is_process_local(alias)):
+        return [checks.Warning(
+            f'The event broker cache "{alias}" is not shared by the '
+            f'{workers} workers.',
+            hint='Use a shared cache such as Redis (REDIS_URL).',
+            id='tasks.W002')]
+    return []
+
+
+@checks.register(checks.Tags.caches)
+def check_throttle_cache(app_configs, **kwargs):
+    workers = getattr(settings, 'WEB_WORKERS', 1)
+    alias = throttle_setting('CACHE')
+    if workers > 1 and is_process_local(alias):
+        return [checks.Warning(
+            f'Each of the {workers} workers keeps its own token buckets in '
+            f'the cache "{alias}", so clients get up to {workers} times '
+            f'the configured rate limits.',
+            hint='Use a shared cache such as Redis (REDIS_URL).',
+            id='tasks.W003')]
+    return []
+
+
+@checks.register(checks.Tags.security)
+def check_cors_origins(app_configs, **kwargs):
+    if not settings.DEBUG and getattr(
+            settings, 'CORS_ALLOW_ALL_ORIGINS', False):
+        return [checks.Warning(
+            'CORS allows all origins in production.',
+            hint='Set FRONTEND_URL to the origin of the frontend.',
+            id='tasks.W004')]
+    return []
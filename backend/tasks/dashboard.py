@@ -0,0 +1,225 @@
+"""
+Dashboard payloads.
+
+``dashboard_summary`` can return several named sections in one response so
+the frontend doesn't fan out into one request per widget. Sections share
+the same base querysets and cheap version aggregates. Each section carries
+an ETag; sections whose ETag the client already has are not recomputed.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .archive import archived_counts
+from .models import ArchivedTask, Category, CategoryMembership
+from .recurrence import OVERDUE_LOOKBACK_DAYS, day_window, window_tasks
+from .serializers import (
+    CategorySerializer, TaskSerializer, TaskStatisticsSerializer
+)
+from .sharing import member_category_ids, visible_tasks
+
+OPEN_STATUSES = ['pending', 'in_progress']
+
+
+def task_statistics(user_tasks, archived_tasks=None):
+    """
+    Statistics payload: one aggregate query plus two GROUP BYs, and one
+    more for the archived tasks (which are all completed) when given.
+    """
+    counts = user_tasks.aggregate(
+        total_tasks=Count('id'),
+        pending_tasks=Count('id', filter=Q(status='pending')),
+        in_progress_tasks=Count('id', filter=Q(status='in_progress')),
+        completed_tasks=Count('id', filter=Q(status='completed')),
+        overdue_tasks=Count('id', filter=Q(
+            due_date__lt=timezone.now(), status__in=OPEN_STATUSES)),
+    )
+
+    archived = [] if archived_tasks is None else list(
+        archived_counts(archived_tasks))
+    archived_total = sum(row['count'] for row in archived)
+    counts['total_tasks'] += archived_total
+    counts['completed_tasks'] += archived_total
+
+    # Calculate completion rate
+    total_tasks = counts['total_tasks']
+    completion_rate = (counts['completed_tasks'] / total_tasks *
+                       100) if total_tasks > 0 else 0
+
+    # Tasks by priority
+    priority_stats = user_tasks.values(
+        'priority').annotate(count=Count('id')).order_by()
+    tasks_by_priority = {str(item['priority']): item['count']
+                         for item in priority_stats}
+    for row in archived:
+        key = str(row['priority'])
+        tasks_by_priority[key] = tasks_by_priority.get(key, 0) + row['count']
+
+    # Tasks by category
+    category_stats = user_tasks.filter(
+        category__isnull=False, category__deleted_at__isnull=True
+    ).values(
+        'category__name'
+    ).annotate(count=Count('id')).order_by()
+    tasks_by_category = {item['category__name']: item['count']
+                         for item in category_stats}
+    for row in archived:
+        name = row['category_name']
+        if name is not None:
+            tasks_by_category[name] = (
+                tasks_by_category.get(name, 0) + row['count'])
+
+    return TaskStatisticsSerializer({
+        **counts,
+        'completion_rate': round(completion_rate, 2),
+        'tasks_by_priority': tasks_by_priority,
+        'tasks_by_category': tasks_by_category,
+    }).data
+
+
+def summary(user_tasks, user_categories, archived_tasks=None):
+    """The original dashboard summary payload"""
+    now = timezone.now()
+    tasks = user_tasks.select_related('user', 'category')
+
+    # Recent tasks (last 5)
+    recent_tasks = tasks.order_by('-created_at')[:5]
+
+    # Upcoming tasks (next 5 by due date)
+    upcoming_tasks = tasks.filter(
+        due_date__gte=now,
+        status__in=OPEN_STATUSES
+    ).order_by('due_date')[:5]
+
+    counts = user_tasks.aggregate(
+        total_tasks=Count('id'),
+        completed_today=Count('id', filter=Q(completed_at__date=now.date())),
+        overdue_count=Count('id', filter=Q(
+            due_date__lt=now, status__in=OPEN_STATUSES)),
+    )
+    if archived_tasks is not None:
+        counts['total_tasks'] += archived_tasks.count()
+    return {
+        'total_tasks': counts['total_tasks'],
+        'total_categories': user_categories.count(),
+        'completed_today': counts['completed_today'],
+        'overdue_count': counts['overdue_count'],
+        'recent_tasks': TaskSerializer(recent_tasks, many=True).data,
+        'upcoming_tasks': TaskSerializer(upcoming_tasks, many=True).data,
+    }
+
+
+def first_page(tasks):
+    """Count and first page of a task sequence, like a list response"""
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    return {
+        'count': tasks.count(),
+        'results': TaskSerializer(tasks[:page_size], many=True).data,
+    }
+
+
+class Dashboard:
+    """Builds named dashboard sections for one user"""
+
+    SECTIONS = ['summary', 'tasks', 'statistics', 'categories',
+                'today', 'overdue']
+
+    def __init__(self, user):
+        self.user = user
+        self.now = timezone.now()
+        # Like the task and category lists, including shared categories
+        self.user_tasks = visible_tasks(user)
+        self.user_categories = Category.objects.filter(
+            pk__in=member_category_ids(user))
+        self.user_archived = ArchivedTask.objects.filter(user=user)
+        self._versions = {}
+
+    # Versions: cheap fingerprints of the data a section depends on
+
+    def version(self, name):
+        if name not in self._versions:
+            if name == 'tasks':
+                value = self.user_tasks.aggregate(
+                    count=Count('id'), latest=Max('updated_at'))
+            elif name == 'categories':
+                value = list(self.user_categories.order_by(
+                    'id').values_list('id', 'name', 'color'))
+            elif name == 'memberships':
+                # Joining or leaving a category changes the visible tasks
+                value = list(CategoryMembership.objects.filter(
+                    user=self.user).order_by('category_id').values_list(
+                    'category_id', 'role'))
+            elif name == 'minute':
+                # Overdue state changes as time passes, not only on writes
+                value = self.now.replace(second=0, microsecond=0)
+            else:
+                value = timezone.localdate(self.now)
+            self._versions[name] = value
+        return self._versions[name]
+
+    DEPENDENCIES = {
+        'summary': ['memberships', 'tasks', 'categories', 'minute'],
+        'tasks': ['memberships', 'tasks', 'categories'],
+        'statistics': ['memberships', 'tasks', 'categories', 'minute'],
+        'categories': ['memberships', 'tasks', 'categories'],
+        'today': ['memberships', 'tasks', 'categories', 'date'],
+        'overdue': ['memberships', 'tasks', 'categories', 'minute'],
+    }
+
+    def etag(self, section):
+        parts = [section] + [repr(self.version(name))
+                             for name in self.DEPENDENCIES[section]]
+        digest = hashlib.md5('|'.join(parts).encode(), usedforsecurity=False)
+        return digest.hexdigest()
+
+    # Section builders
+
+    def build_summary(self):
+        return summary(
+            self.user_tasks, self.user_categories, self.user_archived)
+
+    def build_tasks(self):
+        return first_page(self.user_tasks.select_related('user', 'category'))
+
+    def build_statistics(self):
+        return task_statistics(self.user_tasks, self.user_archived)
+
+    def build_categories(self):
+        categories = self.user_categories.select_related('user').annotate(
+            annotated_task_count=Count(
+                'task', filter=Q(task__deleted_at__isnull=True))
+        ).order_by('-created_at')
+        return CategorySerializer(categories, many=True).data
+
+    def build_today(self):
+        start, end = day_window(timezone.localdate(self.now))
+        return first_page(window_tasks(
+            self.user_tasks, self.user_tasks.filter(
+                due_date__gte=start, due_date__lt=end).select_related(
+                'user', 'category'),
+            start, end))
+
+    def build_overdue(self):
+        overdue_tasks = self.user_tasks.filter(
+            due_date__lt=self.now, status__in=OPEN_STATUSES
+        ).select_related('user', 'category')
+        return first_page(window_tasks(
+            self.user_tasks, overdue_tasks,
+            self.now - timedelta(days=OVERDUE_LOOKBACK_DAYS), self.now))
+
+    def sections(self, names, known_etags):
+        """Build the requested sections, skipping ones the client has"""
+        payload = {}
+        for name in names:
+            etag = self.etag(name)
+            if known_etags.get(name) == etag:
+                payload[name] = {'etag': etag, 'not_modified': True}
+            else:
+                payload[name] = {
+                    'etag': etag,
+                    'data': getattr(self, f'build_{name}')(),
+                }
+        return payload
@@ -0,0 +1,144 @@
+"""
+Task dependency graph queries.
+
+Every graph operation works on a single bulk fetch of the user's edges
+(``TaskDependency.user`` is denormalized for that purpose) followed by an
+in-memory pass, so the number of queries does not grow with the graph.
+Edges belong to the owner of their blocked task. Through shared
+categories a chain can cross owners, so cycle checks fetch the edges of
+every owner the chain reaches, one query per round of owners.
+"""
+from collections import defaultdict, deque
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import User, Task, TaskDependency
+
+OPEN_STATUSES = ['pending', 'in_progress']
+
+
+class DependencyCycleError(ValueError):
+    """Raised when a new dependency would create a cycle"""
+
+
+def load_edges(user):
+    """Fetch all (task_id, depends_on_id) edges of a user in one query"""
+    return list(TaskDependency.objects.filter(
+        user=user).values_list('task_id', 'depends_on_id'))
+
+
+def load_connected_edges(tasks):
+    """
+    Fetch the edges of the tasks' owners and of every owner whose tasks
+    those edges lead to, locking the owners against concurrent edits
+    """
+    owners = {task.user_id for task in tasks}
+    loaded, edges = set(), []
+    while owners:
+        # Serialize graph edits per owner so concurrent inserts can't race
+        # each other into a cycle
+        list(User.objects.select_for_update().filter(
+            pk__in=owners).order_by('pk').values_list('pk', flat=True))
+        loaded |= owners
+        edges += TaskDependency.objects.filter(
+            user__in=owners).values_list('task_id', 'depends_on_id')
+        owners = set(Task.all_objects.filter(
+            dependents__user__in=owners).exclude(
+            user__in=loaded).values_list('user_id', flat=True))
+    return edges
+
+
+def would_create_cycle(edges, task_id, depends_on_id):
+    """Check if adding task_id -> depends_on_id closes a cycle"""
+    if task_id == depends_on_id:
+        return True
+    blockers = defaultdict(list)
+    for source, target in edges:
+        blockers[source].append(target)
+
+    # A cycle exists if task_id is reachable from depends_on_id
+    seen = {depends_on_id}
+    stack = [depends_on_id]
+    while stack:
+        node = stack.pop()
+        for target in blockers[node]:
+            if target == task_id:
+                return True
+            if target not in seen:
+                seen.add(target)
+                stack.append(target)
+    return False
+
+
+def add_dependency(task, depends_on):
+    """Create a dependency edge after checking for cycles"""
+    with transaction.atomic():
+        edges = load_connected_edges([task, depends_on])
+        if would_create_cycle(edges, task.pk, depends_on.pk):
+            raise DependencyCycleError(
+                "This dependency would create a cycle")
+        dependency, created = TaskDependency.objects.get_or_create(
+            task=task, depends_on=depends_on,
+            defaults={'user_id': task.user_id})
+    return dependency
+
+
+def blocked_filter():
+    """Exists() expression matching tasks with at least one open blocker"""
+    return Exists(TaskDependency.objects.filter(
+        task=OuterRef('pk'),
+        depends_on__status__in=OPEN_STATUSES,
+        depends_on__deleted_at__isnull=True,
+    ))
+
+
+def ready_tasks(queryset):
+    """Open tasks whose blockers are all completed, as a single query"""
+    return queryset.filter(status__in=OPEN_STATUSES).exclude(blocked_filter())
+
+
+def blocked_tasks(queryset):
+    """Open tasks waiting on at least one open blocker"""
+    return queryset.filter(status__in=OPEN_STATUSES).filter(blocked_filter())
+
+
+def critical_path_ids(user):
+    """
+    Return the longest chain of open tasks, blockers first.
+
+    Uses one query for the open tasks, one for the edges and a topological
+    (Kahn) pass over the result, so it is O(V + E) in memory.
+    """
+    open_ids = set(Task.objects.filter(
+        user=user, status__in=OPEN_STATUSES).values_list('id', flat=True))
+    successors = defaultdict(list)
+    indegree = dict.fromkeys(open_ids, 0)
+    for task_id, depends_on_id in load_edges(user):
+        # Completed blockers no longer constrain anything
+        if task_id in open_ids and depends_on_id in open_ids:
+            successors[depends_on_id].append(task_id)
+            indegree[task_id] += 1
+
+    length = dict.fromkeys(open_ids, 1)
+    previous = {}
+    queue = deque(node for node, degree in indegree.items() if degree == 0)
+    while queue:
+        node = queue.popleft()
+        for successor in successors[node]:
+            if length[node] + 1 > length[successor]:
+                length[successor] = length[node] + 1
+                previous[successor] = node
+            indegree[successor] -= 1
+            if indegree[successor] == 0:
+                queue.append(successor)
+
+    if not length:
+        return []
+    node = max(length, key=length.get)
+    path = [node]
+    while node in previous:
+        node = previous[node]
+        path.append(node)
+    path.reverse()
+    return path
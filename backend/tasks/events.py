@@ -0,0 +1,257 @@
+"""
+Per-user change events for server-push notifications.
+
+``Task`` and ``Category`` signals publish small change events to a broker;
+the ``/api/events/`` stream delivers them as server-sent events. Each user
+has a monotonically increasing event id so clients can resume with
+``Last-Event-ID``. Streams are opened with a short-lived ticket from
+``/api/events/ticket/``, not the API token. The broker backend is configured by ``TASK_EVENTS``:
+
+* ``InProcessBroker`` keeps events in memory and wakes waiting streams
+  directly. It is the default and what the tests use.
+* ``CacheBroker`` stores events in the shared Django cache so every worker
+  process sees them, at the cost of polling. The default when gunicorn
+  runs several workers.
+
+An open stream holds a server thread for up to ``STREAM_SECONDS``;
+``MAX_STREAMS`` caps them per process so the other threads stay free for
+API requests.
+"""
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    'BACKEND': 'tasks.events.InProcessBroker',
+    'BACKLOG': 500,
+    'KEEPALIVE_SECONDS': 15,
+    'STREAM_SECONDS': 300,
+    'MAX_STREAMS': None,
+    # Lifetime of the tickets that open a stream (see authentication.py)
+    'TICKET_SECONDS': 60,
+    'OPTIONS': {},
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'TASK_EVENTS', {}).get(name, DEFAULTS[name])
+
+
+def make_event(event_id, event_type, payload):
+    return {
+        'id': event_id,
+        'type': event_type,
+        'data': payload,
+        'timestamp': timezone.now().isoformat(),
+    }
+
+
+class BaseBroker:
+    """Interface shared by all event brokers"""
+
+    def __init__(self, backlog=None, **options):
+        self.backlog = backlog or get_setting('BACKLOG')
+
+    def publish(self, user_id, event_type, payload):
+        """Append an event to the user's stream and return it"""
+        raise NotImplementedError
+
+    def read(self, user_id, after_id):
+        """
+        Return (events, complete) for events newer than ``after_id``.
+
+        ``complete`` is False when older events were already evicted from
+        the backlog, meaning the client must reload its state.
+        """
+        raise NotImplementedError
+
+    def wait(self, user_id, after_id, timeout):
+        """Block until new events exist or the timeout expires"""
+        raise NotImplementedError
+
+    def last_id(self, user_id):
+        """Id of the latest event published for the user"""
+        raise NotImplementedError
+
+
+class InProcessBroker(BaseBroker):
+    """Broker for a single process, backed by per-user ring buffers"""
+
+    def __init__(self, backlog=None, **options):
+        super().__init__(backlog, **options)
+        self._condition = threading.Condition()
+        self._events = defaultdict(lambda: deque(maxlen=self.backlog))
+        self._sequence = defaultdict(int)
+
+    def publish(self, user_id, event_type, payload):
+        with self._condition:
+            self._sequence[user_id] += 1
+            event = make_event(self._sequence[user_id], event_type, payload)
+            self._events[user_id].append(event)
+            self._condition.notify_all()
+        return event
+
+    def read(self, user_id, after_id):
+        with self._condition:
+            events = list(self._events.get(user_id, ()))
+        newer = [event for event in events if event['id'] > after_id]
+        complete = not events or events[0]['id'] <= after_id + 1
+        return newer, complete
+
+    def wait(self, user_id, after_id, timeout):
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._sequence.get(user_id, 0) > after_id, timeout)
+
+    def last_id(self, user_id):
+        with self._condition:
+            return self._sequence.get(user_id, 0)
+
+
+class CacheBroker(BaseBroker):
+    """Broker shared by all workers through a Django cache (e.g. Redis)"""
+
+    def __init__(self, backlog=None, cache_alias='default',
+                 poll_interval=0.5, **options):
+        super().__init__(backlog, **options)
+        self.cache = caches[cache_alias]
+        self.poll_interval = poll_interval
+
+    def _key(self, user_id, suffix):
+        return f'task-events:{user_id}:{suffix}'
+
+    def publish(self, user_id, event_type, payload):
+        sequence_key = self._key(user_id, 'seq')
+        self.cache.add(sequence_key, 0, timeout=None)
+        event_id = self.cache.incr(sequence_key)
+        event = make_event(event_id, event_type, payload)
+        self.cache.set(self._key(user_id, event_id), event, timeout=86400)
+        # Evict the event that just fell out of the backlog window
+        self.cache.delete(self._key(user_id, event_id - self.backlog))
+        return event
+
+    def read(self, user_id, after_id):
+        last_id = self.last_id(user_id)
+        first_id = max(after_id + 1, last_id - self.backlog + 1)
+        keys = [self._key(user_id, event_id)
+                for event_id in range(first_id, last_id + 1)]
+        found = self.cache.get_many(keys)
+        events = [found[key] for key in keys if key in found]
+        complete = first_id == after_id + 1 and len(events) == len(keys)
+        return events, complete
+
+    def wait(self, user_id, after_id, timeout):
+        deadline = time.monotonic() + timeout
+        while self.last_id(user_id) <= after_id:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(self.poll_interval, remaining))
+
+    def last_id(self, user_id):
+        return self.cache.get(self._key(user_id, 'seq'), 0)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the configured broker, creating it on first use"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = import_string(get_setting('BACKEND'))
+                _broker = backend(**get_setting('OPTIONS'))
+    return _broker
+
+
+_open_streams = 0
+_streams_lock = threading.Lock()
+
+
+def acquire_stream():
+    """Take one of the process's stream slots; False when none are left"""
+    global _open_streams
+    limit = get_setting('MAX_STREAMS')
+    with _streams_lock:
+        if limit and _open_streams >= limit:
+            return False
+        _open_streams += 1
+        return True
+
+
+def release_stream():
+    global _open_streams
+    with _streams_lock:
+        _open_streams -= 1
+
+
+class EventStream:
+    """
+    SSE frames of one stream, holding a stream slot until closed.
+
+    The response closes it when the client disconnects or the stream
+    runs out, even if it was never iterated.
+    """
+
+    def __init__(self, user_id, last_event_id):
+        self.frames = stream_events(user_id, last_event_id)
+        self.closed = False
+
+    def __iter__(self):
+        return self.frames
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.frames.close()
+            release_stream()
+
+
+def format_event(event):
+    """Encode one event as a server-sent events frame"""
+    data = json.dumps(
+        {'type': event['type'], 'timestamp': event['timestamp'],
+         **event['data']},
+        separators=(',', ':'))
+    return f'id: {event["id"]}\nevent: {event["type"]}\ndata: {data}\n\n'
+
+
+def stream_events(user_id, last_event_id):
+    """Yield SSE frames for a user until the stream duration runs out"""
+    broker = get_broker()
+    keepalive = get_setting('KEEPALIVE_SECONDS')
+    deadline = time.monotonic() + get_setting('STREAM_SECONDS')
+
+    yield f'retry: {keepalive * 1000}\n\n'
+    if last_event_id is None:
+        last_event_id = broker.last_id(user_id)
+    elif last_event_id > broker.last_id(user_id):
+        # The broker lost its history (e.g. a restart): reload everything
+        last_event_id = broker.last_id(user_id)
+        yield format_event(make_event(last_event_id, 'reset', {}))
+
+    while time.monotonic() < deadline:
+        events, complete = broker.read(user_id, last_event_id)
+        if not complete:
+            # Missed events were evicted from the backlog
+            last_event_id = broker.last_id(user_id)
+            yield format_event(make_event(last_event_id, 'reset', {}))
+            continue
+        if events:
+            for event in events:
+                yield format_event(event)
+                last_event_id = event['id']
+            continue
+        broker.wait(user_id, last_event_id,
+                    min(keepalive, max(deadline - time.monotonic(), 0)))
+        if broker.last_id(user_id) <= last_event_id:
+            yield ': keepalive\n\n'
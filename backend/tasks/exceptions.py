@@ -0,0 +1,16 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PreconditionFailed(APIException):
+    """The If-Match version no longer matches the stored task"""
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The task was modified by another request.'
+    default_code = 'precondition_failed'
+
+
+class StreamsUnavailable(APIException):
+    """Every event stream slot of this process is taken"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many open event streams, try again later.'
+    default_code = 'streams_unavailable'
@@ -0,0 +1,91 @@
+"""
+Password hashers with parameters from ``PASSWORD_HASHING``.
+
+Hashing is deliberately slow, so concurrent hashes in one process are
+capped at ``MAX_CONCURRENT``: a burst of signups or logins then queues up
+instead of starving the other requests of the same worker of CPU.
+Existing hashes made with other parameters or algorithms are upgraded by
+Django when their user next logs in (``must_update``).
+"""
+import threading
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, ScryptPasswordHasher
+)
+
+DEFAULTS = {
+    'MAX_CONCURRENT': 2,
+    # argon2id, roughly 30-50 ms per hash on one core
+    'ARGON2_TIME_COST': 2,
+    'ARGON2_MEMORY_COST': 64 * 1024,  # KiB
+    'ARGON2_PARALLELISM': 1,
+    # scrypt N = 2 ** 14, about 16 MiB per hash
+    'SCRYPT_WORK_FACTOR': 2 ** 14,
+    'SCRYPT_BLOCK_SIZE': 8,
+    'SCRYPT_PARALLELISM': 1,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'PASSWORD_HASHING', {}).get(
+        name, DEFAULTS[name])
+
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def hashing_slots():
+    """Semaphore bounding concurrent password hashes in this process"""
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(
+                    get_setting('MAX_CONCURRENT'))
+    return _slots
+
+
+class BoundedHasherMixin:
+    """Run encode() and verify() under the per-process hashing slots"""
+
+    def encode(self, *args, **kwargs):
+        with hashing_slots():
+            return super().encode(*args, **kwargs)
+
+    def verify(self, *args, **kwargs):
+        with hashing_slots():
+            return super().verify(*args, **kwargs)
+
+
+class TunedArgon2PasswordHasher(BoundedHasherMixin, Argon2PasswordHasher):
+    """Argon2id with configurable cost parameters"""
+
+    @property
+    def time_cost(self):
+        return get_setting('ARGON2_TIME_COST')
+
+    @property
+    def memory_cost(self):
+        return get_setting('ARGON2_MEMORY_COST')
+
+    @property
+    def parallelism(self):
+        return get_setting('ARGON2_PARALLELISM')
+
+
+class TunedScryptPasswordHasher(BoundedHasherMixin, ScryptPasswordHasher):
+    """scrypt with configurable cost parameters"""
+
+    @property
+    def work_factor(self):
+        return get_setting('SCRYPT_WORK_FACTOR')
+
+    @property
+    def block_size(self):
+        return get_setting('SCRYPT_BLOCK_SIZE')
+
+    @property
+    def parallelism(self):
+        return get_setting('SCRYPT_PARALLELISM')
@@ -0,0 +1,196 @@
+"""
+Non-blocking, structured logging.
+
+Loggers hand records to ``QueueListenerHandler``, which only puts them on
+an in-memory queue; a listener thread formats them and does the I/O on
+the real handlers. When the queue is full, records are dropped and
+counted rather than blocking the request. ``SamplingFilter`` keeps a
+fraction of the records of chatty loggers, ``JSONFormatter`` writes one
+JSON object per line and ``SizedTimedRotatingFileHandler`` rotates the
+log file daily and whenever it grows past a size limit.
+
+Rotation is per process: with several workers, log to the console and
+let the process manager collect it, or give each worker its own file.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from datetime import datetime, timezone
+
+# LogRecord attributes that aren't user-supplied ``extra`` fields
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {
+    'message', 'asctime', 'request', 'status_code',
+}
+
+TRACEBACK_FORMATTER = logging.Formatter()
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with ``extra`` fields included"""
+
+    def format(self, record):
+        payload = {
+            'time': datetime.fromtimestamp(
+                record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        # django.request and django.server records carry the request
+        request = getattr(record, 'request', None)
+        if request is not None and hasattr(request, 'path'):
+            payload['method'] = request.method
+            payload['path'] = request.path
+        if hasattr(record, 'status_code'):
+            payload['status_code'] = record.status_code
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exception'] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of the records of some loggers.
+
+    ``rates`` maps logger names to the fraction kept; a name also covers
+    its children, and the longest match wins. Warnings and errors are
+    always kept.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self._cache = {}
+
+    def rate(self, name):
+        if name not in self._cache:
+            matches = [logger for logger in self.rates
+                       if name == logger or name.startswith(logger + '.')]
+            self._cache[name] = (self.rates[max(matches, key=len)]
+                                 if matches else 1.0)
+        return self._cache[name]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """Rotate at the time interval, or earlier once ``maxBytes`` is reached"""
+
+    def __init__(self, filename, maxBytes=0, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.maxBytes = maxBytes
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        if self.maxBytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        return self.stream.tell() >= self.maxBytes
+
+    def rotation_filename(self, default_name):
+        # Several size rollovers in one interval share the date suffix
+        name, index = default_name, 0
+        while os.path.exists(name):
+            index += 1
+            name = f'{default_name}.{index}'
+        return super().rotation_filename(name)
+
+
+class QueueListenerHandler(logging.handlers.QueueHandler):
+    """
+    Queue records for a listener thread that passes them to ``targets``.
+
+    ``targets`` are handlers from the same dictConfig, referenced as
+    ``'cfg://handlers.<name>'``. The listener is restarted in a forked
+    child (threads don't survive fork) and flushed on exit.
+    """
+
+    def __init__(self, targets, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.queue_size = queue_size
+        self.targets = self._resolve(targets)
+        self.dropped = 0
+        self._reported = 0
+        self._listener = None
+        self._pid = None
+        self._start()
+        atexit.register(self._stop)
+
+    @staticmethod
+    def _resolve(targets):
+        handlers = [targets[index] for index in range(len(targets))]
+        for handler in handlers:
+            if not isinstance(handler, logging.Handler):
+                # Makes dictConfig retry once the other handlers exist
+                raise ValueError('target not configured yet')
+        return handlers
+
+    def _start(self):
+        if self._pid is not None:
+            # A forked child: the parent's queue may have been locked
+            self.queue = queue.Queue(self.queue_size)
+        self._pid = os.getpid()
+        self._listener = logging.handlers.QueueListener(
+            self.queue, *self.targets, respect_handler_level=True)
+        self._listener.start()
+
+    def _stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread. The message and any
+        # traceback are rendered here, as they may change after the call.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = TRACEBACK_FORMATTER.formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped > self._reported:
+            # Report drops once there is room in the queue again
+            dropped = self.dropped - self._reported
+            self._reported = self.dropped
+            self.enqueue(logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING,
+                'levelname': 'WARNING',
+                'msg': f'{dropped} log records dropped, the queue was full',
+            }))
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        super().emit(record)
+
+    def close(self):
+        self._stop()
+        super().close()
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks.archive import (
+    ARCHIVE_AFTER_DAYS, archivable_tasks, archive_batch, archive_cutoff
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Move tasks completed longer ago than TASK_ARCHIVE_AFTER_DAYS to '
+        'the archive table, one small transaction per batch. Run it '
+        'nightly to keep tasks_task proportional to active work.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=ARCHIVE_AFTER_DAYS,
+            help='Archive tasks completed at least this many days ago')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--sleep', type=float, default=0.0,
+            help='Seconds to pause between batches')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many tasks would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['days'])
+        if options['dry_run']:
+            self.stdout.write(
+                f'Would archive {archivable_tasks(cutoff).count()} tasks '
+                f'completed before {cutoff}')
+            return
+
+        total = 0
+        while True:
+            # Each pass also picks up parents whose last subtasks were
+            # archived by the previous batch
+            moved = archive_batch(cutoff, options['batch_size'])
+            if not moved:
+                break
+            total += moved
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {total} tasks completed before {cutoff}'))
@@ -0,0 +1,165 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from tasks.models import User, Category, Tag, Task, TaskTag
+from tasks.query_plans import analyze, audit, plans_as_json, replay
+
+
+class Rollback(Exception):
+    """Raised to discard the replay's side effects and synthetic data"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay the canonical API queries, record their EXPLAIN plans and '
+        'report unused and redundant indexes and full table scans. With '
+        '--check the queries run against a seeded dataset and the command '
+        'fails when a hot query scans a large table.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Replay as this user (default: the one with most tasks)')
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Seed a large synthetic dataset and fail on full scans')
+        parser.add_argument('--tasks', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Full scans of smaller tables are not reported')
+        parser.add_argument(
+            '--output', help='Write the recorded plans to this JSON file')
+
+    def handle(self, *args, **options):
+        # Nothing the replay writes (tokens, seeded rows) is kept
+        try:
+            with transaction.atomic():
+                report = self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+        regressions = report['regressions']
+        if options['check'] and regressions:
+            raise CommandError(
+                f'{len(regressions)} hot queries scan a large table: ' +
+                '; '.join(f'{plan.label} ({table})'
+                          for plan, table in regressions))
+
+    def run(self, options):
+        if options['check']:
+            user = self.seed(options)
+            analyze()
+        else:
+            user = self.pick_user(options['user'])
+        values = {}
+        category = Category.objects.filter(user=user).first()
+        if category:
+            values['category'] = category.pk
+        tag = Tag.objects.filter(user=user).order_by('-task_count').first()
+        if tag:
+            values['tag'] = tag.pk
+
+        plans = replay(user, **values)
+        report = audit(plans, options['min_rows'])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(plans_as_json(plans))
+        self.print_report(plans, report, options)
+        return report
+
+    def pick_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'No user named "{username}"')
+        user = User.objects.annotate(
+            task_total=Count('tasks')).order_by('-task_total').first()
+        if user is None:
+            raise CommandError('No users to replay the queries as')
+        return user
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        users = [
+            User.objects.create_user(
+                username=f'audit-indexes-{i}',
+                email=f'audit-indexes-{i}@example.com')
+            for i in range(options['users'])
+        ]
+        categories = {
+            user.pk: [Category.objects.create(name=f'Category {i}', user=user)
+                      for i in range(5)]
+            for user in users
+        }
+        tags = {
+            user.pk: Tag.objects.bulk_create([
+                Tag(name=f'tag {i}', user=user) for i in range(5)])
+            for user in users
+        }
+        statuses = ['pending', 'in_progress', 'completed']
+        tasks = Task.objects.bulk_create([
+            Task(title=f'Task {i}', user=user, status=rng.choice(statuses),
+                 priority=rng.randint(1, 4),
+                 category=rng.choice(categories[user.pk] + [None]),
+                 due_date=now + timedelta(hours=rng.randint(-2000, 2000)))
+            for i in range(options['tasks'])
+            for user in [rng.choice(users)]
+        ], batch_size=1000)
+        TaskTag.objects.bulk_create([
+            TaskTag(task=task, tag=tag, user_id=task.user_id)
+            for task in tasks
+            for tag in rng.sample(tags[task.user_id], 2)
+        ], batch_size=1000)
+        for user_tags in tags.values():
+            for tag in user_tags:
+                Tag.objects.filter(pk=tag.pk).update(
+                    task_count=tag.entries.count())
+        self.stdout.write(
+            f'Seeded {len(tasks)} tasks for {len(users)} users')
+        return users[0]
+
+    def print_report(self, plans, report, options):
+        self.stdout.write(
+            f'Replayed {len({plan.label for plan in plans})} requests, '
+            f'{len(plans)} queries')
+        if options['verbosity'] > 1:
+            for plan in plans:
+                self.stdout.write(f'\n{plan.label}\n  {plan.sql}')
+                for line in plan.lines:
+                    self.stdout.write(f'    {line}')
+
+        self.stdout.write('\nIndex usage')
+        for name, (table, columns, _) in sorted(
+                report['indexes'].items(), key=lambda item: item[1][0]):
+            count = len(report['usage'].get(name, ()))
+            used = f'{count} requests' if count else 'UNUSED'
+            self.stdout.write(
+                f'  {table:<24} {name:<36} ({", ".join(columns)}) {used}')
+
+        if report['redundant']:
+            self.stdout.write('\nRedundant indexes')
+            for name, other in report['redundant']:
+                self.stdout.write(f'  {name} is covered by {other}')
+
+        if report['full_scans']:
+            self.stdout.write(
+                f'\nFull scans of tables with {options["min_rows"]}+ rows '
+                f'(missing indexes)')
+            for plan, table in report['full_scans']:
+                marker = 'HOT ' if plan.hot else ''
+                self.stdout.write(
+                    f'  {marker}{plan.label}: {table} '
+                    f'({report["rows"][table]} rows)')
+        elif options['check']:
+            self.stdout.write(self.style.SUCCESS(
+                '\nNo query scans a large table'))
@@ -0,0 +1,92 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from django.utils.module_loading import import_string
+from rest_framework.test import APIRequestFactory
+
+from tasks.views import login_user, register_user
+
+PASSWORD = 'benchmark-Password-123'
+
+# Signups and logins must not be throttled while measuring
+UNTHROTTLED = {**getattr(settings, 'TASK_THROTTLE', {}),
+               'ANON_CAPACITY': 10 ** 9, 'ANON_RATE': 10 ** 9}
+
+
+class Rollback(Exception):
+    """Raised to discard the synthetic benchmark data"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure signups and logins per second in one worker thread, and '
+        'the cost of each configured password hasher'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.hashers(options)
+        try:
+            with transaction.atomic(), override_settings(
+                    TASK_THROTTLE=UNTHROTTLED):
+                self.endpoints(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def report(self, label, count, elapsed):
+        self.stdout.write(
+            f'{label:<36} {elapsed * 1000 / count:8.1f} ms  '
+            f'{count / elapsed:7.1f} /s')
+
+    def hashers(self, options):
+        rounds = max(options['users'] // 4, 3)
+        for path in settings.PASSWORD_HASHERS:
+            hasher = import_string(path)()
+            start = time.perf_counter()
+            for _ in range(rounds):
+                hasher.encode(PASSWORD, hasher.salt())
+            self.report(f'hash ({hasher.algorithm})', rounds,
+                        time.perf_counter() - start)
+
+    def post(self, view, data):
+        request = APIRequestFactory().post(
+            '/', data, format='json', HTTP_HOST='localhost')
+        request.session = import_module(
+            settings.SESSION_ENGINE).SessionStore()
+        response = view(request)
+        if response.status_code >= 400:
+            raise RuntimeError(response.data)
+        return response
+
+    def endpoints(self, options):
+        count = options['users']
+        usernames = [f'benchmark-auth-{index}' for index in range(count)]
+
+        start = time.perf_counter()
+        for username in usernames:
+            self.post(register_user, {
+                'username': username, 'email': f'{username}@example.com',
+                'password': PASSWORD, 'password_confirm': PASSWORD})
+        self.report('POST /api/auth/register/', count,
+                    time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for username in usernames:
+            self.post(login_user,
+                      {'username': username, 'password': PASSWORD})
+        self.report('POST /api/auth/login/', count,
+                    time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for username in usernames:
+            self.post(login_user, {'username': username,
+                                   'password': PASSWORD, 'session': True})
+        self.report('POST /api/auth/login/ (session)', count,
+                    time.perf_counter() - start)
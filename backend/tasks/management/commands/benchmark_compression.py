@@ -0,0 +1,92 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from tasks.middleware import available_compressors
+from tasks.models import Category, Task, User
+from tasks.views import TaskViewSet
+
+# Levels tried per encoding, fastest first
+LEVELS = {
+    'gzip': ('GZIP_LEVEL', [1, 6, 9]),
+    'br': ('BROTLI_QUALITY', [1, 4, 11]),
+    'zstd': ('ZSTD_LEVEL', [1, 3, 19]),
+}
+
+
+class Rollback(Exception):
+    """Raised to discard the synthetic benchmark data"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare CPU time against bytes saved for each available encoding '
+        'on /api/tasks/ pages'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=500)
+        parser.add_argument(
+            '--page-sizes', default='20,100',
+            help='Comma separated page sizes to measure')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def render_page(self, user, page_size):
+        request = APIRequestFactory().get(
+            '/api/tasks/', {'page_size': page_size}, HTTP_HOST='localhost')
+        force_authenticate(request, user)
+        response = TaskViewSet.as_view({'get': 'list'})(request)
+        response.render()
+        return response.content
+
+    def run(self, options):
+        user = User.objects.create_user(
+            username='benchmark-compression',
+            email='benchmark-compression@example.com')
+        category = Category.objects.create(name='Benchmark', user=user)
+        now = timezone.now()
+        Task.objects.bulk_create([
+            Task(title=f'Benchmark task {index}',
+                 description='Notes for the task. ' * (index % 20),
+                 priority=1 + index % 3, user=user, category=category,
+                 due_date=now + timedelta(hours=index))
+            for index in range(options['tasks'])
+        ], batch_size=500)
+
+        compressors = available_compressors()
+        self.stdout.write(f'Encodings: {", ".join(compressors)}')
+        for page_size in options['page_sizes'].split(','):
+            body = self.render_page(user, int(page_size))
+            self.stdout.write(
+                f'\npage_size={page_size}: {len(body)} bytes uncompressed')
+            for encoding, compressor_class in compressors.items():
+                setting, levels = LEVELS[encoding]
+                for level in levels:
+                    self.measure(encoding, compressor_class, setting, level,
+                                 body, options['repeat'])
+
+    def measure(self, encoding, compressor_class, setting, level, body,
+                repeat):
+        with override_settings(API_HTTP={setting: level}):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                compressor = compressor_class()
+                size = len(compressor.compress(body) + compressor.flush())
+            elapsed = (time.perf_counter() - start) / repeat
+        self.stdout.write(
+            f'  {encoding:<5} level {level:<3} {size:8d} bytes '
+            f'({size / len(body):6.1%})  {elapsed * 1000:7.3f} ms  '
+            f'{len(body) / elapsed / 1e6:8.1f} MB/s')
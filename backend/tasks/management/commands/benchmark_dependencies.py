@@ -0,0 +1,80 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tasks.dependencies import (
+    blocked_tasks, critical_path_ids, load_edges, ready_tasks,
+    would_create_cycle
+)
+from tasks.models import User, Task, TaskDependency
+
+
+class Rollback(Exception):
+    """Raised to discard the synthetic benchmark data"""
+
+
+class Command(BaseCommand):
+    help = 'Benchmark dependency graph queries on a synthetic DAG'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=5000)
+        parser.add_argument('--edges', type=int, default=12000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def timed(self, label, func):
+        start = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stdout.write(f'{label:<28} {elapsed:9.2f} ms')
+        return result
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        user = User.objects.create_user(
+            username='benchmark-dependencies',
+            email='benchmark-dependencies@example.com')
+
+        statuses = ['pending', 'in_progress', 'completed']
+        Task.objects.bulk_create([
+            Task(title=f'Task {i}', user=user, status=rng.choice(statuses))
+            for i in range(options['tasks'])
+        ], batch_size=1000)
+        ids = list(Task.objects.filter(
+            user=user).order_by('id').values_list('id', flat=True))
+
+        # Edges always point from a later task to an earlier one: a DAG
+        edges = set()
+        while len(edges) < options['edges']:
+            a, b = rng.sample(range(len(ids)), 2)
+            if a < b:
+                a, b = b, a
+            edges.add((ids[a], ids[b]))
+        TaskDependency.objects.bulk_create([
+            TaskDependency(task_id=a, depends_on_id=b, user=user)
+            for a, b in edges
+        ], batch_size=1000)
+        self.stdout.write(
+            f'Graph: {len(ids)} tasks, {len(edges)} edges')
+
+        queryset = Task.objects.filter(user=user)
+        self.timed('ready (count)', lambda: ready_tasks(queryset).count())
+        self.timed('ready (first page)',
+                   lambda: list(ready_tasks(queryset)[:20]))
+        self.timed('blocked (count)', lambda: blocked_tasks(queryset).count())
+        path = self.timed('critical path',
+                          lambda: critical_path_ids(user))
+        self.stdout.write(f'Critical path length: {len(path)}')
+
+        loaded = self.timed('load edges', lambda: load_edges(user))
+        self.timed('cycle check (back edge)',
+                   lambda: would_create_cycle(loaded, ids[0], ids[-1]))
@@ -0,0 +1,65 @@
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from rest_framework.authtoken.models import Token
+
+from tasks.models import User
+
+
+class Rollback(Exception):
+    """Raised to discard the synthetic benchmark data"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the full and the lean API middleware stacks on a minimal '
+        'endpoint, with the time spent in each middleware'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--path', default='/api/auth/profile/')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self, options):
+        user = User.objects.create_user(
+            username='benchmark-pipeline',
+            email='benchmark-pipeline@example.com')
+        token = Token.objects.create(user=user)
+        for label, enabled in [('full stack', False), ('API pipeline', True)]:
+            self.measure(label, enabled, token, options)
+
+    def measure(self, label, enabled, token, options):
+        count = options['requests']
+        totals = defaultdict(float)
+        # A bucket large enough to never throttle the benchmark
+        with override_settings(
+                API_PIPELINE={'ENABLED': enabled, 'TIMING': True},
+                TASK_THROTTLE={'CAPACITY': 1e9, 'RATE': 1e9}):
+            # A new client loads the middleware with the settings above
+            client = Client(HTTP_AUTHORIZATION=f'Token {token.key}',
+                            HTTP_HOST='localhost')
+            client.get(options['path'], secure=True)
+            start = time.perf_counter()
+            for _ in range(count):
+                response = client.get(options['path'], secure=True)
+                for metric in response['Server-Timing'].split(', '):
+                    name, _, duration = metric.partition(';dur=')
+                    totals[name] += float(duration)
+            elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f'\n{label}: {elapsed * 1000 / count:.3f} ms/request '
+            f'(status {response.status_code})')
+        for name, duration in totals.items():
+            self.stdout.write(f'  {name:<28} {duration / count:8.3f} ms')
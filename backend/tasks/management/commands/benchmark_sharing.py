@@ -0,0 +1,97 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from rest_framework.authtoken.models import Token
+
+from tasks.models import User, Category, CategoryMembership, Task
+
+
+class Rollback(Exception):
+    """Raised to discard the synthetic benchmark data"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark task list latency for a member of shared categories '
+        'holding thousands of tasks, compared with a user of their own'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--tasks', type=int, default=10000)
+        parser.add_argument('--own-tasks', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def create_user(self, name):
+        return User.objects.create_user(
+            username=f'benchmark-sharing-{name}',
+            email=f'benchmark-sharing-{name}@example.com')
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        owner = self.create_user('owner')
+        member = self.create_user('member')
+        solo = self.create_user('solo')
+
+        categories = [
+            Category.objects.create(name=f'Project {i}', user=owner)
+            for i in range(options['categories'])
+        ]
+        roles = [CategoryMembership.VIEWER, CategoryMembership.EDITOR]
+        CategoryMembership.objects.bulk_create([
+            CategoryMembership(category=category, user=member,
+                               role=rng.choice(roles))
+            for category in categories
+        ])
+
+        statuses = ['pending', 'in_progress', 'completed']
+        Task.objects.bulk_create([
+            Task(title=f'Shared {i}', user=owner,
+                 category=rng.choice(categories),
+                 status=rng.choice(statuses))
+            for i in range(options['tasks'])
+        ], batch_size=1000)
+        for user in (member, solo):
+            Task.objects.bulk_create([
+                Task(title=f'Own {i}', user=user,
+                     status=rng.choice(statuses))
+                for i in range(options['own_tasks'])
+            ], batch_size=1000)
+
+        self.stdout.write(
+            f'{options["tasks"]} shared tasks in {len(categories)} '
+            f'categories, {options["own_tasks"]} own tasks per user')
+        with override_settings(TASK_THROTTLE={'CAPACITY': 1e9, 'RATE': 1e9}):
+            for label, user in [('own tasks only', solo),
+                                ('member (shared)', member),
+                                ('owner (shared)', owner)]:
+                self.measure(label, user, options)
+
+    def measure(self, label, user, options):
+        token = Token.objects.create(user=user)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}',
+                        HTTP_HOST='localhost')
+        self.stdout.write(f'\n{label}')
+        for query in ['', '?status=pending', '?ordering=-updated_at',
+                      '?page=5']:
+            path = f'/api/tasks/{query}'
+            response = client.get(path, secure=True)
+            start = time.perf_counter()
+            for _ in range(options['requests']):
+                client.get(path, secure=True)
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stdout.write(
+                f'  {path:<32} {elapsed / options["requests"]:8.2f} ms '
+                f'(count {response.json().get("count")})')
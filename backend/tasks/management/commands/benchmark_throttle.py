@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from tasks.models import User
+from tasks.throttling import CostThrottle, get_bucket
+
+
+class BenchmarkView(APIView):
+    action = 'retrieve'
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-request overhead of the cost throttle'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=10000)
+        parser.add_argument(
+            '--keys', type=int, default=100,
+            help='Number of distinct clients to spread requests over')
+
+    def timed(self, label, count, func):
+        start = time.perf_counter()
+        for index in range(count):
+            func(index)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{label:<28} {elapsed * 1e6 / count:9.2f} us/request')
+
+    def handle(self, *args, **options):
+        count, keys = options['requests'], options['keys']
+        bucket = get_bucket()
+        self.stdout.write(
+            f'Cache backend: {bucket.cache.__class__.__name__}, '
+            f'{"Lua script" if bucket._script else "local lock"}')
+
+        # Large buckets so every request takes the "allowed" path
+        self.timed('bucket.consume', count, lambda index: bucket.consume(
+            f'throttle:benchmark:{index % keys}', 1e9, 1e9, 1))
+
+        factory = APIRequestFactory()
+        user = User(pk=0, username='benchmark-throttle')
+        view = BenchmarkView()
+        throttle = CostThrottle()
+
+        def make_request():
+            request = factory.get('/api/tasks/1/')
+            force_authenticate(request, user)
+            request = Request(request)
+            request.user = user
+            return request
+
+        requests = [make_request() for _ in range(min(count, 1000))]
+        self.timed('CostThrottle.allow_request', count,
+                   lambda index: throttle.allow_request(
+                       requests[index % len(requests)], view))
@@ -0,0 +1,120 @@
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from tasks.models import ArchivedTask, Task, TaskDailyStat
+
+# Archived tasks are part of the history too
+SOURCES = [Task.objects, ArchivedTask.objects]
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the daily task rollups from raw tasks. Run nightly: it '
+        'corrects any drift in the incrementally maintained counters, '
+        'records overdue counts and snapshots task counts by status.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=2,
+            help='Number of days up to today to rebuild (default: 2)')
+        parser.add_argument(
+            '--since', type=date.fromisoformat,
+            help='Rebuild from this date (YYYY-MM-DD) instead of --days')
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Rebuild the entire history')
+        parser.add_argument(
+            '--chunk-days', type=int, default=31,
+            help='Days rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['all']:
+            firsts = [tasks.order_by('created_at').values_list(
+                'created_at', flat=True).first() for tasks in SOURCES]
+            firsts = [first for first in firsts if first]
+            since = timezone.localdate(min(firsts)) if firsts else today
+        elif options['since']:
+            since = options['since']
+        else:
+            since = today - timedelta(days=options['days'] - 1)
+        if since > today:
+            raise CommandError('The start date is in the future')
+
+        chunk = timedelta(days=options['chunk_days'])
+        start = since
+        total = 0
+        while start <= today:
+            end = min(start + chunk - timedelta(days=1), today)
+            total += self.rebuild(start, end)
+            start = end + timedelta(days=1)
+        total += self.snapshot_statuses(today)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {total} rollup rows from {since} to {today}'))
+
+    def grouped(self, queryset, field):
+        """Count tasks per user, day, priority and category"""
+        return queryset.annotate(day=TruncDate(field)).values(
+            'user_id', 'day', 'priority', 'category_id'
+        ).annotate(count=Count('id')).order_by()
+
+    def rebuild(self, start, end):
+        counters = defaultdict(Counter)
+
+        def add(rows, counter):
+            for row in rows:
+                task = Task(priority=row['priority'],
+                            category_id=row['category_id'])
+                for dimension, key in TaskDailyStat.dimension_keys(task):
+                    counters[(row['user_id'], row['day'], dimension, key)][
+                        counter] += row['count']
+
+        for tasks in SOURCES:
+            add(self.grouped(tasks.filter(
+                created_at__date__range=(start, end)), 'created_at'),
+                'created_count')
+            add(self.grouped(tasks.filter(
+                status='completed', completed_at__date__range=(start, end)),
+                'completed_at'), 'completed_count')
+            # Overdue: due that day and not completed before the deadline
+            add(self.grouped(tasks.filter(
+                due_date__date__range=(start, end),
+                due_date__lt=timezone.now(),
+            ).filter(
+                ~Q(status='completed') | Q(completed_at__gt=F('due_date'))
+            ), 'due_date'), 'overdue_count')
+
+        with transaction.atomic():
+            TaskDailyStat.objects.filter(
+                date__range=(start, end)).exclude(dimension='status').delete()
+            TaskDailyStat.objects.bulk_create([
+                TaskDailyStat(user_id=user_id, date=day, dimension=dimension,
+                              key=key, **counts)
+                for (user_id, day, dimension, key), counts in counters.items()
+            ], batch_size=1000)
+        return len(counters)
+
+    def snapshot_statuses(self, day):
+        """Record how many tasks each user has per status at the end of day"""
+        counts = Counter()
+        for tasks in SOURCES:
+            for row in tasks.values('user_id', 'status').annotate(
+                    count=Count('id')).order_by():
+                counts[(row['user_id'], row['status'])] += row['count']
+        with transaction.atomic():
+            TaskDailyStat.objects.filter(date=day, dimension='status').delete()
+            TaskDailyStat.objects.bulk_create([
+                TaskDailyStat(user_id=user_id, date=day,
+                              dimension='status', key=task_status,
+                              task_count=count)
+                for (user_id, task_status), count in counts.items()
+            ], batch_size=1000)
+        return len(counts)
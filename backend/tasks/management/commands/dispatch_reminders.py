@@ -0,0 +1,42 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tasks.reminders import Dispatcher
+
+
+class Command(BaseCommand):
+    help = (
+        'Send due-date reminders as they fall due. Runs until stopped; '
+        'with --once it sends the reminders due now and exits, for cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Send the reminders due now and exit')
+
+    def handle(self, *args, **options):
+        dispatcher = Dispatcher()
+        if options['once']:
+            sent = dispatcher.step()
+            self.stdout.write(f'Sent {sent} reminders')
+            return
+
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+        self.stdout.write(
+            f'Dispatching reminders to '
+            f'{", ".join(type(sink).__name__ for sink in dispatcher.sinks)}')
+
+        def stop():
+            # Reconnect if the database dropped an idle connection
+            close_old_connections()
+            return bool(stopping)
+
+        try:
+            dispatcher.run(stop)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('Stopped')
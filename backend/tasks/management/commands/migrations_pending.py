@@ -0,0 +1,24 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from tasks.startup import pending_migrations
+
+
+class Command(BaseCommand):
+    help = (
+        'Exit with status 1 if there are unapplied migrations. Much '
+        'cheaper than migrate when there is nothing to do.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        pending = pending_migrations(options['database'])
+        if not pending:
+            self.stdout.write('No pending migrations')
+            return
+        for app_label, name in pending:
+            self.stdout.write(f'Pending: {app_label}.{name}')
+        sys.exit(1)
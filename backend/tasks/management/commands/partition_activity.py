@@ -0,0 +1,99 @@
+from datetime import date, datetime, time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from tasks.activity import get_setting
+from tasks.models import TaskActivity
+
+TABLE = TaskActivity._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Maintain the activity log: on PostgreSQL create its monthly '
+        'partitions ahead of time and drop the ones past the retention '
+        'period; elsewhere delete expired rows in batches. Run it on every '
+        'release and at least monthly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, default=get_setting('PARTITIONS_AHEAD'),
+            help='Months to create partitions for after the current one')
+        parser.add_argument(
+            '--retention-months', type=int,
+            default=get_setting('RETENTION_MONTHS'))
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        this_month = timezone.localdate().replace(day=1)
+        cutoff = add_months(this_month, -options['retention_months'])
+        if connection.vendor == 'postgresql':
+            for offset in range(options['ahead'] + 1):
+                self.create_partition(add_months(this_month, offset))
+            self.drop_partitions(cutoff)
+        else:
+            self.delete_rows(cutoff, options['batch_size'])
+
+    def partitions(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT c.relname FROM pg_inherits i '
+                'JOIN pg_class c ON c.oid = i.inhrelid '
+                'WHERE i.inhparent = %s::regclass', [TABLE])
+            return {row[0] for row in cursor.fetchall()}
+
+    def create_partition(self, month):
+        name = f'{TABLE}_p{month:%Y%m}'
+        if name in self.partitions():
+            return
+        start, end = month, add_months(month, 1)
+        bounds = f"FROM ('{start}') TO ('{end}')"
+        # Rows that landed in the default partition move to the new one,
+        # which can't be attached while they overlap it
+        in_range = f"created_at >= '{start}' AND created_at < '{end}'"
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)')
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+                f'WHERE {in_range} RETURNING *) '
+                f'INSERT INTO {name} SELECT * FROM moved')
+            moved = cursor.rowcount
+            cursor.execute(
+                f'ALTER TABLE {TABLE} ATTACH PARTITION {name} '
+                f'FOR VALUES {bounds}')
+        self.stdout.write(
+            f'Created partition {name}' +
+            (f', moved {moved} rows into it' if moved else ''))
+
+    def drop_partitions(self, cutoff):
+        for name in sorted(self.partitions()):
+            suffix = name[len(f'{TABLE}_p'):]
+            if not (name.startswith(f'{TABLE}_p') and suffix.isdigit()):
+                continue
+            month = date(int(suffix[:4]), int(suffix[4:]), 1)
+            if add_months(month, 1) <= cutoff:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DROP TABLE {name}')
+                self.stdout.write(f'Dropped partition {name}')
+
+    def delete_rows(self, cutoff, batch_size):
+        expired = TaskActivity.objects.filter(created_at__lt=(
+            timezone.make_aware(datetime.combine(cutoff, time.min))))
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            deleted += TaskActivity.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(
+            f'Deleted {deleted} activity entries before {cutoff}')
@@ -0,0 +1,277 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from tasks.models import Task
+
+TABLE = Task._meta.db_table
+NEW_TABLE = f'{TABLE}_partitioned'
+OLD_TABLE = f'{TABLE}_unpartitioned'
+TRIGGER = f'{TABLE}_partition_sync'
+
+
+class Command(BaseCommand):
+    help = (
+        'Migrate tasks_task online to a PostgreSQL table hash partitioned '
+        'by user_id. Run the phases in order: prepare, copy, swap. Indexes '
+        'and constraints keep their names; unique ones gain user_id, so a '
+        'new unique constraint on the table must include user_id too.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'phase', choices=['status', 'prepare', 'copy', 'swap'])
+        parser.add_argument('--partitions', type=int, default=16)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--sleep', type=float, default=0.0,
+            help='Seconds to pause between copy batches')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Table partitioning requires PostgreSQL')
+        getattr(self, f'handle_{options["phase"]}')(options)
+
+    # Helpers
+
+    def columns(self):
+        return [field.column for field in Task._meta.concrete_fields]
+
+    def is_partitioned(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_partitioned_table p "
+                "JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = %s", [table])
+            return cursor.fetchone() is not None
+
+    def table_exists(self, table):
+        return table in connection.introspection.table_names()
+
+    def inbound_foreign_keys(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+                "WHERE contype = 'f' AND confrelid = %s::regclass", [TABLE])
+            return cursor.fetchall()
+
+    def index_definitions(self, table):
+        """
+        Secondary index definitions of a table, keyed by index name.
+        Indexes backing a constraint come with their constraint.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT i.relname, pg_get_indexdef(i.oid) "
+                "FROM pg_index x "
+                "JOIN pg_class i ON i.oid = x.indexrelid "
+                "WHERE x.indrelid = %s::regclass AND NOT x.indisprimary "
+                "AND NOT EXISTS (SELECT 1 FROM pg_constraint c "
+                "WHERE c.conindid = x.indexrelid)", [table])
+            return dict(cursor.fetchall())
+
+    def unique_constraints(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE contype = 'u' AND conrelid = %s::regclass", [table])
+            return dict(cursor.fetchall())
+
+    def foreign_keys(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE contype = 'f' AND conrelid = %s::regclass", [table])
+            return dict(cursor.fetchall())
+
+    # Phases
+
+    def handle_status(self, options):
+        if self.is_partitioned(TABLE):
+            self.stdout.write(f'{TABLE} is partitioned')
+            return
+        if not self.table_exists(NEW_TABLE):
+            self.stdout.write(f'{TABLE} is not partitioned; run "prepare"')
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {TABLE}')
+            total = cursor.fetchone()[0]
+            cursor.execute(f'SELECT count(*) FROM {NEW_TABLE}')
+            copied = cursor.fetchone()[0]
+        self.stdout.write(
+            f'Prepared: {copied}/{total} rows copied to {NEW_TABLE}')
+
+    def handle_prepare(self, options):
+        if self.is_partitioned(TABLE):
+            raise CommandError(f'{TABLE} is already partitioned')
+        inbound = self.inbound_foreign_keys()
+        if inbound:
+            names = ', '.join(f'{table}.{name}' for table, name in inbound)
+            raise CommandError(
+                'Foreign keys to tasks_task must use db_constraint=False '
+                f'before partitioning: {names}')
+
+        columns = self.columns()
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'NEW.{column}' for column in columns)
+        updates = ', '.join(f'{column} = EXCLUDED.{column}'
+                            for column in columns)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # The primary key of a partitioned table must contain the
+            # partition key; id stays unique through its sequence
+            cursor.execute(
+                f'CREATE TABLE {NEW_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS '
+                f'INCLUDING IDENTITY INCLUDING CONSTRAINTS) '
+                f'PARTITION BY HASH (user_id)')
+            cursor.execute(
+                f'ALTER TABLE {NEW_TABLE} ADD CONSTRAINT {NEW_TABLE}_pkey '
+                f'PRIMARY KEY (id, user_id)')
+            for remainder in range(options['partitions']):
+                cursor.execute(
+                    f'CREATE TABLE {TABLE}_p{remainder} '
+                    f'PARTITION OF {NEW_TABLE} FOR VALUES WITH '
+                    f'(MODULUS {options["partitions"]}, '
+                    f'REMAINDER {remainder})')
+
+            for name, definition in self.index_definitions(TABLE).items():
+                definition = definition.replace(
+                    f' INDEX {name} ON ', f' INDEX {name}_p ON ', 1)
+                definition = re.sub(
+                    rf' ON (\w+\.)?{TABLE} ', f' ON {NEW_TABLE} ',
+                    definition, count=1)
+                if definition.startswith('CREATE UNIQUE INDEX'):
+                    # Unique indexes must include the partition key too
+                    definition = definition.replace(
+                        ' (', ' (user_id, ', 1)
+                cursor.execute(definition)
+
+            # Unique constraints stay constraints, so migrations that drop
+            # them by name (ALTER TABLE ... DROP CONSTRAINT) keep working.
+            # They also gain the partition key, which is no weaker: a
+            # task's occurrences belong to the task's user.
+            for name, definition in self.unique_constraints(TABLE).items():
+                if 'user_id' not in definition:
+                    definition = definition.replace('(', '(user_id, ', 1)
+                cursor.execute(
+                    f'ALTER TABLE {NEW_TABLE} ADD CONSTRAINT {name}_p '
+                    f'{definition}')
+
+            for name, definition in self.foreign_keys(TABLE).items():
+                cursor.execute(
+                    f'ALTER TABLE {NEW_TABLE} ADD CONSTRAINT {name}_p '
+                    f'{definition}')
+
+            # Mirror every write made during the copy into the new table
+            cursor.execute(f"""
+                CREATE FUNCTION {TRIGGER}() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP = 'DELETE' THEN
+                        DELETE FROM {NEW_TABLE}
+                        WHERE id = OLD.id AND user_id = OLD.user_id;
+                        RETURN OLD;
+                    END IF;
+                    IF TG_OP = 'UPDATE' AND NEW.user_id <> OLD.user_id THEN
+                        DELETE FROM {NEW_TABLE}
+                        WHERE id = OLD.id AND user_id = OLD.user_id;
+                    END IF;
+                    INSERT INTO {NEW_TABLE} ({column_list})
+                    VALUES ({new_values})
+                    ON CONFLICT (id, user_id) DO UPDATE SET {updates};
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql""")
+            cursor.execute(
+                f'CREATE TRIGGER {TRIGGER} AFTER INSERT OR UPDATE OR DELETE '
+                f'ON {TABLE} FOR EACH ROW EXECUTE FUNCTION {TRIGGER}()')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {NEW_TABLE} with {options["partitions"]} partitions; '
+            f'writes are now mirrored. Run "copy" next.'))
+
+    def handle_copy(self, options):
+        if not self.table_exists(NEW_TABLE):
+            raise CommandError('Run "prepare" first')
+        column_list = ', '.join(self.columns())
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT coalesce(max(id), 0) FROM {TABLE}')
+            max_id = cursor.fetchone()[0]
+
+        # Small transactions keep locks short; rows touched by the trigger
+        # meanwhile are newer and win over the copy (DO NOTHING)
+        start, copied = 0, 0
+        while start < max_id:
+            end = start + options['batch_size']
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {NEW_TABLE} ({column_list}) '
+                    f'SELECT {column_list} FROM {TABLE} '
+                    f'WHERE id > %s AND id <= %s '
+                    f'ON CONFLICT (id, user_id) DO NOTHING', [start, end])
+                copied += cursor.rowcount
+            start = end
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Copied {copied} rows. Run "swap" to switch over.'))
+
+    def handle_swap(self, options):
+        if not self.table_exists(NEW_TABLE):
+            raise CommandError('Run "prepare" and "copy" first')
+        old_indexes = self.index_definitions(TABLE)
+        old_unique = self.unique_constraints(TABLE)
+        old_foreign_keys = self.foreign_keys(TABLE)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(
+                f'SELECT (SELECT count(*) FROM {TABLE}), '
+                f'(SELECT count(*) FROM {NEW_TABLE})')
+            old_count, new_count = cursor.fetchone()
+            if old_count != new_count:
+                raise CommandError(
+                    f'Row counts differ ({old_count} vs {new_count}); '
+                    f'run "copy" again')
+
+            cursor.execute(f'DROP TRIGGER {TRIGGER} ON {TABLE}')
+            cursor.execute(f'DROP FUNCTION {TRIGGER}()')
+            cursor.execute(
+                f'SELECT coalesce(max(id), 0) + 1 FROM {TABLE}')
+            next_id = cursor.fetchone()[0]
+            cursor.execute(
+                f'ALTER TABLE {NEW_TABLE} ALTER COLUMN id '
+                f'RESTART WITH {next_id}')
+
+            # Keep the original index names on the live table so later
+            # Django migrations can still find them
+            for name in old_indexes:
+                cursor.execute(
+                    f'ALTER INDEX {name} RENAME TO {name[:56]}_unpart')
+                cursor.execute(f'ALTER INDEX {name}_p RENAME TO {name}')
+            for name in old_unique:
+                cursor.execute(
+                    f'ALTER TABLE {TABLE} RENAME CONSTRAINT {name} '
+                    f'TO {name[:56]}_unpart')
+                cursor.execute(
+                    f'ALTER TABLE {NEW_TABLE} RENAME CONSTRAINT {name}_p '
+                    f'TO {name}')
+            cursor.execute(
+                f'ALTER TABLE {TABLE} RENAME CONSTRAINT {TABLE}_pkey '
+                f'TO {OLD_TABLE}_pkey')
+            cursor.execute(
+                f'ALTER TABLE {NEW_TABLE} RENAME CONSTRAINT {NEW_TABLE}_pkey '
+                f'TO {TABLE}_pkey')
+            # The old copy must not block deletes of users and categories
+            for name in old_foreign_keys:
+                cursor.execute(f'ALTER TABLE {TABLE} DROP CONSTRAINT {name}')
+                cursor.execute(
+                    f'ALTER TABLE {NEW_TABLE} RENAME CONSTRAINT {name}_p '
+                    f'TO {name}')
+            cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}')
+            cursor.execute(f'ALTER TABLE {NEW_TABLE} RENAME TO {TABLE}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{TABLE} is now partitioned. The old table was kept as '
+            f'{OLD_TABLE}; drop it once you are satisfied.'))
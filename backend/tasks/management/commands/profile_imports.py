@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from tasks.startup import import_times, startup_time
+
+DEFAULT_PREFIXES = ['tasks', 'rest_framework', 'django_filters']
+
+
+class Command(BaseCommand):
+    help = (
+        'Report the slowest imports when a fresh process loads the '
+        'application, for tasks and the DRF stack by default'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--prefix', action='append', dest='prefixes',
+            help=f'Module prefix to report (default: '
+                 f'{", ".join(DEFAULT_PREFIXES)}); may be repeated')
+        parser.add_argument(
+            '--sort', choices=['self', 'cumulative'], default='cumulative')
+
+    def handle(self, *args, **options):
+        prefixes = tuple(options['prefixes'] or DEFAULT_PREFIXES)
+        times = import_times()
+        total = sum(self_us for module, self_us, cumulative_us in times)
+        matching = [row for row in times
+                    if row[0].startswith(prefixes)]
+        column = 1 if options['sort'] == 'self' else 2
+        matching.sort(key=lambda row: row[column], reverse=True)
+
+        self.stdout.write(
+            f'Startup: {startup_time() * 1000:.0f} ms wall clock, '
+            f'{total / 1000:.0f} ms in {len(times)} imports')
+        self.stdout.write(f'{"self ms":>9} {"cumulative ms":>14}  module')
+        for module, self_us, cumulative_us in matching[:options['limit']]:
+            self.stdout.write(
+                f'{self_us / 1000:9.1f} {cumulative_us / 1000:14.1f}  '
+                f'{module}')
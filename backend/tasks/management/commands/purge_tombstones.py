@@ -0,0 +1,75 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from tasks.models import Category, Task, TaskDependency
+
+
+class Command(BaseCommand):
+    help = (
+        'Permanently remove soft-deleted tasks and categories older than '
+        'the retention period. Rows are deleted in small batches, each in '
+        'its own transaction, so it can run alongside normal traffic.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            default=getattr(settings, 'TOMBSTONE_RETENTION_DAYS', 30),
+            help='Only purge rows deleted at least this many days ago')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--sleep', type=float, default=0.0,
+            help='Seconds to pause between batches')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many rows would be purged')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        tasks = Task.all_objects.filter(deleted_at__lt=cutoff)
+        categories = Category.all_objects.filter(deleted_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(
+                f'Would purge {tasks.count()} tasks and '
+                f'{categories.count()} categories deleted before {cutoff}')
+            return
+
+        purged_tasks = self.purge(tasks, self.delete_tasks, options)
+        purged_categories = self.purge(
+            categories, self.delete_categories, options)
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {purged_tasks} tasks and {purged_categories} categories '
+            f'deleted before {cutoff}'))
+
+    def purge(self, queryset, delete, options):
+        """Delete matching rows batch by batch, oldest tombstones first"""
+        total = 0
+        while True:
+            ids = list(queryset.order_by('deleted_at').values_list(
+                'pk', flat=True)[:options['batch_size']])
+            if not ids:
+                return total
+            with transaction.atomic():
+                total += delete(ids)
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+    def delete_tasks(self, ids):
+        # Remove edges in bulk first so the collector has nothing to fetch;
+        # subtasks and occurrences were tombstoned with their parent
+        TaskDependency.objects.filter(task_id__in=ids).delete()
+        TaskDependency.objects.filter(depends_on_id__in=ids).delete()
+        deleted = Task.all_objects.filter(pk__in=ids).delete()[1]
+        return deleted.get(Task._meta.label, 0)
+
+    def delete_categories(self, ids):
+        # Tasks still filed under a purged category lose the category
+        Task.all_objects.filter(category_id__in=ids).update(category=None)
+        deleted = Category.all_objects.filter(pk__in=ids).delete()[1]
+        return deleted.get(Category._meta.label, 0)
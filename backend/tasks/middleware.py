@@ -0,0 +1,208 @@
+"""
+HTTP middleware for the API.
+
+``CompressionMiddleware`` compresses API responses with the best encoding
+both sides support: zstd and brotli when their packages are installed,
+gzip otherwise. Small bodies are sent as is; streamed exports are
+compressed chunk by chunk. ``CachePolicyMiddleware`` sets Cache-Control
+and Vary on API responses per URL name. Both read ``API_HTTP``.
+"""
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULTS = {
+    'PATH_PREFIX': '/api/',
+    'COMPRESS_MIN_SIZE': 1024,
+    'COMPRESS_TYPES': ['application/json', 'text/plain', 'text/csv'],
+    'ENCODINGS': ['zstd', 'br', 'gzip'],
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 4,
+    'ZSTD_LEVEL': 3,
+    'CACHE_CONTROL': {'DEFAULT': 'private, no-cache'},
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'API_HTTP', {}).get(name, DEFAULTS[name])
+
+
+class GzipCompressor:
+    def __init__(self):
+        # wbits=31 writes a gzip header and trailer
+        self._compressor = zlib.compressobj(get_setting('GZIP_LEVEL'),
+                                            zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self):
+        self._compressor = brotli.Compressor(
+            quality=get_setting('BROTLI_QUALITY'))
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(
+            level=get_setting('ZSTD_LEVEL')).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+def available_compressors():
+    """Supported Content-Encoding values mapped to compressor classes"""
+    compressors = {'gzip': GzipCompressor}
+    if brotli is not None:
+        compressors['br'] = BrotliCompressor
+    if zstandard is not None:
+        compressors['zstd'] = ZstdCompressor
+    return compressors
+
+
+def compress(encoding, data):
+    compressor = available_compressors()[encoding]()
+    return compressor.compress(data) + compressor.flush()
+
+
+def accepted_encodings(header):
+    """Encodings from an Accept-Encoding header, with q=0 ones removed"""
+    accepted = set()
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def negotiate_encoding(header):
+    """Best encoding both the client and the server support, if any"""
+    accepted = accepted_encodings(header)
+    compressors = available_compressors()
+    for encoding in get_setting('ENCODINGS'):
+        if encoding in compressors and (encoding in accepted
+                                        or '*' in accepted):
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """Content-negotiated compression of API responses"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not request.path.startswith(get_setting('PATH_PREFIX')):
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        if response.status_code == 304:
+            # Validates the compressed body the client holds
+            if negotiate_encoding(
+                    request.META.get('HTTP_ACCEPT_ENCODING', '')):
+                self._weaken_etag(response)
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0]
+        # Server-sent events must reach the client unbuffered
+        if content_type not in get_setting('COMPRESS_TYPES'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            compressor = available_compressors()[encoding]()
+            response.streaming_content = self._compress_stream(
+                compressor, response.streaming_content)
+            del response['Content-Length']
+        else:
+            if len(response.content) < get_setting('COMPRESS_MIN_SIZE'):
+                return response
+            compressed = compress(encoding, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        self._weaken_etag(response)
+        response['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def _weaken_etag(response):
+        # The body differs from the identity encoding, so a strong ETag
+        # would no longer be valid; views compare If-None-Match weakly
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'W/{etag}'
+
+    @staticmethod
+    def _compress_stream(compressor, chunks):
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class CachePolicyMiddleware:
+    """
+    Cache-Control and Vary for API responses.
+
+    ``API_HTTP['CACHE_CONTROL']`` maps URL names to Cache-Control values,
+    with ``DEFAULT`` for the rest. Responses are per user, so they vary
+    on the credentials. Views that set Cache-Control themselves win.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not request.path.startswith(get_setting('PATH_PREFIX')):
+            return response
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        if not response.has_header('Cache-Control'):
+            policies = get_setting('CACHE_CONTROL')
+            match = request.resolver_match
+            url_name = match.url_name if match else None
+            policy = policies.get(url_name, policies.get('DEFAULT'))
+            if policy:
+                response['Cache-Control'] = policy
+        return response
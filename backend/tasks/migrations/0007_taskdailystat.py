@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_task_fk_without_db_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('dimension', models.CharField(choices=[('all', 'All'), ('priority', 'Priority'), ('category', 'Category'), ('status', 'Status')], default='all', max_length=10)),
+                ('key', models.CharField(blank=True, default='', max_length=32)),
+                ('created_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('overdue_count', models.PositiveIntegerField(default=0)),
+                ('task_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='taskdailystat',
+            constraint=models.UniqueConstraint(fields=('user', 'dimension', 'date', 'key'), name='unique_task_daily_stat'),
+        ),
+    ]
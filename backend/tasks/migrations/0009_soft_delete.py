@@ -0,0 +1,79 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_task_version'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='tasks_task_user_id_c0fce1_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='tasks_task_user_id_13ec9e_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='tasks_task_user_id_075050_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='tasks_task_user_id_3fa5de_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='tasks_task_recurring_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='category',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), _negated=True), fields=['deleted_at'], name='category_tombstone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'status'], name='task_active_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'priority'], name='task_active_user_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'due_date'], name='task_active_user_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'category'], name='task_active_user_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(models.Q(('recurrence', ''), _negated=True), ('deleted_at__isnull', True)), fields=['user'], name='tasks_task_recurring_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), _negated=True), fields=['deleted_at'], name='task_tombstone_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='category',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('name', 'user'), name='unique_active_category_name'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_owners(apps, schema_editor):
+    """Every existing category gets its owner as a member"""
+    Category = apps.get_model('tasks', 'Category')
+    CategoryMembership = apps.get_model('tasks', 'CategoryMembership')
+    CategoryMembership.objects.bulk_create([
+        CategoryMembership(category_id=pk, user_id=user_id, role='owner')
+        for pk, user_id in Category.objects.values_list('pk', 'user_id')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0013_saved_views'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('viewer', 'Viewer'), ('editor', 'Editor'), ('owner', 'Owner')], default='viewer', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['category'], name='task_active_category_idx'),
+        ),
+        migrations.AddField(
+            model_name='categorymembership',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='tasks.category'),
+        ),
+        migrations.AddField(
+            model_name='categorymembership',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_memberships', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='categorymembership',
+            index=models.Index(fields=['user', 'role', 'category'], name='membership_user_role_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='categorymembership',
+            constraint=models.UniqueConstraint(fields=('category', 'user'), name='unique_category_member'),
+        ),
+        migrations.RunPython(backfill_owners, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def partition_by_month(apps, schema_editor):
+    """
+    On PostgreSQL, recreate the new (empty) table range partitioned on
+    created_at. Rows go to a default partition until partition_activity
+    creates the monthly ones.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = 'tasks_taskactivity'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT indexdef FROM pg_indexes '
+            'WHERE tablename = %s AND indexname <> %s',
+            [table, f'{table}_pkey'])
+        index_definitions = [row[0] for row in cursor.fetchall()]
+    statements = [
+        f'ALTER TABLE {table} RENAME TO {table}_plain',
+        f'CREATE TABLE {table} (LIKE {table}_plain INCLUDING DEFAULTS) '
+        f'PARTITION BY RANGE (created_at)',
+        f'DROP TABLE {table}_plain',
+        # The partition key must be part of the primary key
+        f'CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id',
+        f"ALTER TABLE {table} ALTER COLUMN id "
+        f"SET DEFAULT nextval('{table}_id_seq')",
+        f'ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)',
+        f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT',
+        *index_definitions,
+    ]
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0015_task_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.PositiveSmallIntegerField(choices=[(1, 'created'), (2, 'updated'), (3, 'status_changed'), (4, 'deleted'), (5, 'restored')])),
+                ('changes', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('category', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='tasks.category')),
+                ('owner', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('task', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='activity', to='tasks.task')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'id'], name='activity_owner_idx'), models.Index(condition=models.Q(('category__isnull', False)), fields=['category', 'id'], name='activity_category_idx'), models.Index(fields=['task', 'id'], name='activity_task_idx')],
+            },
+        ),
+        migrations.RunPython(partition_by_month, migrations.RunPython.noop),
+    ]
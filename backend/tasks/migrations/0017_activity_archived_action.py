@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0016_task_activity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskactivity',
+            name='action',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'created'), (2, 'updated'), (3, 'status_changed'), (4, 'deleted'), (5, 'restored'), (6, 'archived')]),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+from django.db.models import F, OuterRef, Subquery
+
+
+def key_entries_by_tag_owner(apps, schema_editor):
+    """Entries a member put on a shared task were keyed by its owner"""
+    Tag = apps.get_model('tasks', 'Tag')
+    TaskTag = apps.get_model('tasks', 'TaskTag')
+    TaskTag.objects.exclude(user_id=F('tag__user_id')).update(
+        user_id=Subquery(Tag.objects.filter(
+            pk=OuterRef('tag_id')).values('user_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0017_activity_archived_action'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            key_entries_by_tag_owner, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0018_tasktag_tag_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtask',
+            name='tags',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
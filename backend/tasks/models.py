@@ -1,7 +1,19 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import ExpressionWrapper, F, Value
+from django.db.models.functions import Concat, Greatest, Substr
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
+# Rows that have not been soft deleted
+ACTIVE = models.Q(deleted_at__isnull=True)
+
+
+class ActiveManager(models.Manager):
+    """Default manager that hides soft-deleted (tombstoned) rows"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(ACTIVE)
+
 
 class User(AbstractUser):
     """Extended user model with additional fields"""
@@ -19,15 +31,136 @@ class Category(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='categories')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set when soft deleted; purge_tombstones removes the row later
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
 
     class Meta:
-        unique_together = ['name', 'user']
         verbose_name_plural = 'Categories'
+        constraints = [
+            # Tombstones must not block reusing a name
+            models.UniqueConstraint(
+                fields=['name', 'user'], condition=ACTIVE,
+                name='unique_active_category_name'),
+        ]
+        indexes = [
+            models.Index(fields=['deleted_at'], name='category_tombstone_idx',
+                         condition=~ACTIVE),
+            # Prefix search in the admin
+            models.Index(fields=['name'], name='category_name_prefix_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
+
+    def save(self, *args, **kwargs):
+        """The creator becomes the owning member of a new category"""
+        creating = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if creating:
+                CategoryMembership.objects.create(
+                    category=self, user_id=self.user_id,
+                    role=CategoryMembership.OWNER)
+
+    def soft_delete(self):
+        """Tombstone the category; its tasks keep pointing at it"""
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at'])
+
+    def restore(self):
+        """Undo soft_delete()"""
+        self.deleted_at = None
+        self.save(update_fields=['deleted_at'])
 
     def __str__(self):
         return self.name
 
 
+class CategoryMembership(models.Model):
+    """
+    Access of a user to a shared category and its tasks.
+
+    This is the sharing ACL: every category has an ``owner`` row for its
+    creator plus one row per member, so "tasks I can see" is a single
+    semi-join on (user, role, category) whatever the number of shared
+    tasks (see tasks/sharing.py).
+    """
+    VIEWER = 'viewer'
+    EDITOR = 'editor'
+    OWNER = 'owner'
+    ROLE_CHOICES = [
+        (VIEWER, 'Viewer'),
+        (EDITOR, 'Editor'),
+        (OWNER, 'Owner'),
+    ]
+
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='category_memberships')
+    role = models.CharField(
+        max_length=10, choices=ROLE_CHOICES, default=VIEWER)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['category', 'user'], name='unique_category_member'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'role', 'category'],
+                         name='membership_user_role_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.role} of {self.category}'
+
+
+class Tag(models.Model):
+    """Task tag; a task can carry any number of them"""
+    name = models.CharField(max_length=50)
+    color = models.CharField(max_length=7, default='#95a5a6')
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='tags')
+    # Live tasks carrying the tag, kept in step with the TaskTag index so
+    # the tag list never counts rows
+    task_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='unique_tag_name'),
+        ]
+
+    @classmethod
+    def adjust_task_counts(cls, task_ids, delta):
+        """Add ``delta`` to the counts of every tag on the given tasks"""
+        entries = TaskTag.objects.filter(task_id__in=task_ids)
+        per_tag = entries.filter(tag=models.OuterRef('pk')).values(
+            'tag').annotate(count=models.Count('id')).values('count')
+        cls.objects.filter(pk__in=entries.values('tag_id')).update(
+            task_count=Greatest(
+                F('task_count') + delta * models.Subquery(per_tag), 0))
+
+    def __str__(self):
+        return self.name
+
+
+class StaleTaskError(Exception):
+    """Raised when a task changed since it was loaded"""
+
+
+# Columns maintained by the Task tree helpers, never by a regular save()
+TREE_FIELDS = {'path', 'depth', 'child_count', 'descendant_count',
+               'completed_descendant_count'}
+
+
+# Foreign keys pointing at Task use db_constraint=False (Django still
+# emulates the cascades) so tasks_task can be hash partitioned by user,
+# see the partition_tasks management command.
 class Task(models.Model):
     """Core task model"""
 
@@ -43,6 +176,13 @@ class Task(models.Model):
         (3, 'High'),
     ]
 
+    RECURRENCE_CHOICES = [
+        ('', 'None'),
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ]
+
     # Basic fields
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -62,16 +202,112 @@ class Task(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    # Recurrence fields - a recurring task is a single template row whose
+    # occurrences are expanded on read (see tasks/recurrence.py). Rows are
+    # only created for occurrences that get completed or edited.
+    recurrence = models.CharField(
+        max_length=10, choices=RECURRENCE_CHOICES, blank=True, default='')
+    recurrence_interval = models.PositiveSmallIntegerField(default=1)
+    recurrence_until = models.DateTimeField(null=True, blank=True)
+    recurrence_parent = models.ForeignKey(
+        'self', on_delete=models.CASCADE, null=True, blank=True,
+        related_name='occurrences', db_constraint=False)
+    occurrence_date = models.DateTimeField(null=True, blank=True)
+
+    # Hierarchy fields - ``path`` is the materialized path of ancestor ids
+    # ("1/5/9/") so a subtree is one prefix query. Rollup counters are
+    # maintained on write rather than by walking the tree on read.
+    parent = models.ForeignKey(
+        'self', on_delete=models.CASCADE, null=True, blank=True,
+        related_name='children', db_constraint=False)
+    path = models.CharField(max_length=255, blank=True, default='')
+    depth = models.PositiveSmallIntegerField(default=0)
+    child_count = models.PositiveIntegerField(default=0)
+    descendant_count = models.PositiveIntegerField(default=0)
+    completed_descendant_count = models.PositiveIntegerField(default=0)
+
+    # Tags live in the TaskTag inverted index (see tasks/tags.py)
+    tags = models.ManyToManyField(
+        Tag, through='TaskTag', related_name='tasks', blank=True)
+
+    # Incremented on every write, used for optimistic concurrency
+    version = models.PositiveIntegerField(default=1)
+
+    # Set when soft deleted. ``objects`` hides tombstones; they stay
+    # restorable until purge_tombstones removes them in the background.
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
+
     class Meta:
         ordering = ['-priority', 'due_date', '-created_at']
 
+        # Per-user indexes only cover live rows, so tombstones neither bloat
+        # them nor slow down the viewset queries
         indexes = [
-            models.Index(fields=['user', 'status']),
-            models.Index(fields=['user', 'priority']),
-            models.Index(fields=['user', 'due_date']),
-            models.Index(fields=['user', 'category']),
+            models.Index(fields=['user', 'status'],
+                         name='task_active_user_status_idx', condition=ACTIVE),
+            models.Index(fields=['user', 'priority'],
+                         name='task_active_user_priority_idx',
+                         condition=ACTIVE),
+            models.Index(fields=['user', 'due_date'],
+                         name='task_active_user_due_idx', condition=ACTIVE),
+            models.Index(fields=['user', 'category'],
+                         name='task_active_user_category_idx',
+                         condition=ACTIVE),
+            # Tasks of shared categories, whoever created them
+            models.Index(fields=['category'],
+                         name='task_active_category_idx', condition=ACTIVE),
             models.Index(fields=['created_at']),
             models.Index(fields=['status', 'due_date']),
+            models.Index(fields=['user'], name='tasks_task_recurring_idx',
+                         condition=~models.Q(recurrence='') & ACTIVE),
+            models.Index(fields=['path'], name='tasks_task_path_idx',
+                         opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['deleted_at'], name='task_tombstone_idx',
+                         condition=~ACTIVE),
+            # Prefix search in the admin
+            models.Index(fields=['title'], name='task_title_prefix_idx',
+                         opclasses=['varchar_pattern_ops'], condition=ACTIVE),
+        ]
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recurrence_parent', 'occurrence_date'],
+                name='unique_task_occurrence'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember loaded values so save() can write only what changed"""
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_values()
+        return instance
+
+    def _remember_loaded_values(self):
+        self._loaded_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    def _loaded(self, attname):
+        return getattr(self, '_loaded_values', {}).get(
+            attname, getattr(self, attname))
+
+    def changed_fields(self):
+        """Names of fields modified since the task was loaded"""
+        loaded = getattr(self, '_loaded_values', None)
+        fields = [field for field in self._meta.concrete_fields
+                  if not field.primary_key and field.name not in TREE_FIELDS]
+        if loaded is None:
+            return [field.name for field in fields]
+        return [
+            field.name for field in fields
+            if field.attname in self.__dict__ and (
+                field.attname not in loaded
+                or self.__dict__[field.attname] != loaded[field.attname])
         ]
 
     def save(self, *args, **kwargs):
@@ -80,7 +316,249 @@ class Task(models.Model):
             self.completed_at = timezone.now()
         elif self.status != 'completed':
             self.completed_at = None
-        super().save(*args, **kwargs)
+
+        creating = self._state.adding
+        loaded_status = self._loaded('status')
+        loaded_parent_id = self._loaded('parent_id')
+        loaded_due_date = self._loaded('due_date')
+        self._expected_version = None
+        if not creating:
+            if kwargs.get('update_fields') is None:
+                # Only write changed columns; never write back possibly
+                # stale tree counters
+                changed = self.changed_fields()
+                if not changed:
+                    return
+                kwargs['update_fields'] = set(changed) | {'updated_at'}
+            # Optimistic concurrency: the UPDATE only matches the version
+            # this instance was loaded with (see _do_update)
+            self._expected_version = self._loaded('version')
+            self.version = self._expected_version + 1
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'version'}
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if creating:
+                self._insert_into_tree()
+            elif self.parent_id != loaded_parent_id:
+                self._move_in_tree(loaded_status, loaded_parent_id)
+            else:
+                self._update_ancestor_completion(loaded_status)
+            self._record_daily_stats(creating, loaded_status)
+            if not creating and self.due_date != loaded_due_date:
+                TaskReminder.reschedule(self)
+
+        self._remember_loaded_values()
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields,
+                   forced_update):
+        expected_version = getattr(self, '_expected_version', None)
+        if expected_version is not None:
+            base_qs = base_qs.filter(version=expected_version)
+        updated = super()._do_update(
+            base_qs, using, pk_val, values, update_fields, forced_update)
+        if expected_version is not None and not updated:
+            self.version = expected_version
+            raise StaleTaskError(
+                f'Task {pk_val} was modified by another request')
+        return updated
+
+    def set_status(self, status, expected_version=None):
+        """
+        Change status with a single conditional UPDATE.
+
+        The UPDATE only matches if the row still has the status (and version,
+        when given) this instance was loaded with; it raises StaleTaskError
+        otherwise. Rollups and change events are updated as in save().
+        """
+        loaded_status = self._loaded('status')
+        if status == loaded_status:
+            return False
+        now = timezone.now()
+        completed_at = now if status == 'completed' else None
+        version = self._loaded('version')
+
+        matching = Task.objects.filter(pk=self.pk, status=loaded_status)
+        if expected_version is not None:
+            matching = matching.filter(version=expected_version)
+        with transaction.atomic():
+            if not matching.update(status=status, completed_at=completed_at,
+                                   updated_at=now, version=F('version') + 1):
+                raise StaleTaskError(
+                    f'Task {self.pk} was modified by another request')
+            self.status = status
+            self.completed_at = completed_at
+            self.updated_at = now
+            self.version = version + 1
+            self._update_ancestor_completion(loaded_status)
+            self._record_daily_stats(False, loaded_status)
+            models.signals.post_save.send(
+                sender=Task, instance=self, created=False,
+                update_fields={'status', 'completed_at', 'updated_at',
+                               'version'},
+                raw=False, using=self._state.db)
+
+        self._remember_loaded_values()
+        return True
+
+    def _update_ancestor_completion(self, loaded_status):
+        if (self.status == 'completed') != (loaded_status == 'completed'):
+            delta = 1 if self.status == 'completed' else -1
+            Task.objects.filter(pk__in=self.ancestor_ids()).update(
+                completed_descendant_count=(
+                    F('completed_descendant_count') + delta))
+
+    def delete(self, *args, **kwargs):
+        """Remove the whole subtree from the ancestors' rollups"""
+        with transaction.atomic():
+            # Tombstones already left the rollups when they were deleted
+            if self.deleted_at is None:
+                self._detach_from_ancestors(self._subtree_counts())
+            Tag.adjust_task_counts(list(self._tombstone_group().filter(
+                ACTIVE).values_list('pk', flat=True)), -1)
+            return super().delete(*args, **kwargs)
+
+    def _tombstone_group(self):
+        """This task, its subtree and its materialized occurrences"""
+        return Task.all_objects.filter(user_id=self.user_id).filter(
+            models.Q(pk=self.pk)
+            | models.Q(path__startswith=self.tree_path())
+            | models.Q(recurrence_parent=self.pk))
+
+    def _send_deleted_at_changed(self):
+        models.signals.post_save.send(
+            sender=Task, instance=self, created=False,
+            update_fields={'deleted_at'}, raw=False, using=self._state.db)
+
+    def soft_delete(self):
+        """
+        Tombstone this task together with its subtree and occurrences.
+
+        One UPDATE instead of a cascading DELETE; the rows share the same
+        ``deleted_at`` so restore() can bring back exactly this group.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            self._detach_from_ancestors(self._subtree_counts())
+            group = self._tombstone_group().filter(ACTIVE)
+            Tag.adjust_task_counts(list(group.values_list('pk', flat=True)),
+                                   -1)
+            group.update(deleted_at=now)
+            self.deleted_at = now
+            self._send_deleted_at_changed()
+        self._remember_loaded_values()
+
+    def restore(self):
+        """Undo soft_delete() for the rows deleted together with this task"""
+        if self.parent_id and Task.all_objects.filter(
+                pk=self.parent_id, deleted_at__isnull=False).exists():
+            raise ValueError('Restore the parent task first')
+        with transaction.atomic():
+            group = self._tombstone_group().filter(deleted_at=self.deleted_at)
+            task_ids = list(group.values_list('pk', flat=True))
+            group.update(deleted_at=None)
+            Tag.adjust_task_counts(task_ids, 1)
+            self.deleted_at = None
+            self._attach_to_ancestors(self._subtree_counts())
+            self._send_deleted_at_changed()
+        self._remember_loaded_values()
+
+    def _record_daily_stats(self, creating, loaded_status):
+        """Keep the daily trend rollups in step with this write"""
+        was_completed = not creating and loaded_status == 'completed'
+        is_completed = self.status == 'completed'
+        if creating:
+            TaskDailyStat.record(self, self.created_at, created=1)
+        if is_completed and not was_completed:
+            TaskDailyStat.record(self, self.completed_at, completed=1)
+        elif was_completed and not is_completed:
+            completed_at = self._loaded('completed_at')
+            if completed_at:
+                TaskDailyStat.record(self, completed_at, completed=-1)
+
+    def tree_path(self):
+        """Materialized path, falling back for rows saved via bulk_create"""
+        return self.path or f'{self.pk}/'
+
+    def ancestor_ids(self):
+        """Ids of all ancestors, root first"""
+        return [int(part) for part in self.tree_path().split('/')[:-2]]
+
+    def completion_percentage(self):
+        """Share of completed descendants, from the maintained rollups"""
+        if not self.descendant_count:
+            return 100.0 if self.status == 'completed' else 0.0
+        return round(
+            self.completed_descendant_count / self.descendant_count * 100, 2)
+
+    def _subtree_counts(self):
+        """(size, completed) of this subtree, read fresh from the database"""
+        row = Task.all_objects.filter(pk=self.pk).values(
+            'status', 'descendant_count', 'completed_descendant_count').get()
+        completed = row['completed_descendant_count']
+        if row['status'] == 'completed':
+            completed += 1
+        return row['descendant_count'] + 1, completed
+
+    def _attach_to_ancestors(self, counts):
+        size, completed = counts
+        Task.objects.filter(pk__in=self.ancestor_ids()).update(
+            descendant_count=F('descendant_count') + size,
+            completed_descendant_count=(
+                F('completed_descendant_count') + completed))
+        if self.parent_id:
+            Task.objects.filter(pk=self.parent_id).update(
+                child_count=F('child_count') + 1)
+
+    def _detach_from_ancestors(self, counts):
+        size, completed = counts
+        Task.objects.filter(pk__in=self.ancestor_ids()).update(
+            descendant_count=F('descendant_count') - size,
+            completed_descendant_count=(
+                F('completed_descendant_count') - completed))
+        if self.parent_id:
+            Task.objects.filter(pk=self.parent_id).update(
+                child_count=F('child_count') - 1)
+
+    def _parent_path(self):
+        if not self.parent_id:
+            return ''
+        return Task.objects.filter(pk=self.parent_id).values_list(
+            'path', flat=True).get() or f'{self.parent_id}/'
+
+    def _insert_into_tree(self):
+        self.path = f'{self._parent_path()}{self.pk}/'
+        self.depth = self.path.count('/') - 1
+        Task.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+        self._attach_to_ancestors(
+            (1, 1 if self.status == 'completed' else 0))
+
+    def _move_in_tree(self, loaded_status, loaded_parent_id):
+        """Re-root this subtree under a new parent"""
+        old_path = self.tree_path()
+        new_path = f'{self._parent_path()}{self.pk}/'
+        if new_path.startswith(old_path):
+            raise ValueError('A task cannot be moved under its own subtree')
+
+        size, completed = self._subtree_counts()
+        was_completed = loaded_status == 'completed'
+        is_completed = self.status == 'completed'
+        old_counts = (size, completed - is_completed + was_completed)
+
+        new_parent_id = self.parent_id
+        self.parent_id = loaded_parent_id
+        self._detach_from_ancestors(old_counts)
+        self.parent_id = new_parent_id
+
+        Task.all_objects.filter(path__startswith=old_path).update(
+            path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+            depth=F('depth') + (new_path.count('/') - old_path.count('/')))
+        self.path = new_path
+        self.depth = new_path.count('/') - 1
+        self._attach_to_ancestors((size, completed))
+
+    # True on tasks built from the archive (see ArchivedTask.as_task)
+    is_archived = False
 
     def is_overdue(self):
         """Check if task is overdue"""
@@ -88,5 +566,350 @@ class Task(models.Model):
             return timezone.now() > self.due_date
         return False
 
+    def is_recurring(self):
+        """Check if task is a recurrence template"""
+        return bool(self.recurrence)
+
     def __str__(self):
         return self.title
+
+
+class ArchivedTask(models.Model):
+    """
+    Cold storage for tasks completed long ago.
+
+    The archive_tasks command moves old completed tasks here so tasks_task
+    and its per-user indexes stay proportional to active work. Rows keep
+    the original task id. Archived subtasks still count towards the
+    rollups of their (live) ancestors.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    status = models.CharField(
+        max_length=20, choices=Task.STATUS_CHOICES, default='completed')
+    priority = models.IntegerField(choices=Task.PRIORITY_CHOICES, default=2)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='archived_tasks')
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='archived_tasks')
+    # Ids of the original parent and recurring template, not foreign keys:
+    # either may be archived or deleted independently
+    parent = models.BigIntegerField(null=True, blank=True)
+    recurrence_parent = models.BigIntegerField(null=True, blank=True)
+    occurrence_date = models.DateTimeField(null=True, blank=True)
+    due_date = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+    # The tags the task carried, as {"user": owner id, "name": tag name};
+    # its TaskTag entries are dropped when it moves here
+    tags = models.JSONField(default=list, blank=True)
+
+    # Task fields copied verbatim into the archive
+    COPIED_FIELDS = ['id', 'title', 'description', 'status', 'priority',
+                     'user_id', 'category_id', 'occurrence_date', 'due_date',
+                     'created_at', 'updated_at', 'completed_at']
+
+    class Meta:
+        ordering = ['-priority', 'due_date', '-created_at']
+        indexes = [
+            models.Index(fields=['user', 'completed_at']),
+            models.Index(fields=['user', 'priority']),
+            models.Index(fields=['user', 'category']),
+        ]
+
+    @classmethod
+    def from_task(cls, task):
+        archived = cls(parent=task.parent_id,
+                       recurrence_parent=task.recurrence_parent_id)
+        for name in cls.COPIED_FIELDS:
+            setattr(archived, name, getattr(task, name))
+        return archived
+
+    def as_task(self):
+        """Unsaved, read-only Task for serializing alongside live tasks"""
+        task = Task(parent_id=self.parent,
+                    recurrence_parent_id=self.recurrence_parent)
+        for name in self.COPIED_FIELDS:
+            setattr(task, name, getattr(self, name))
+        for field in ('user', 'category'):
+            if self._meta.get_field(field).is_cached(self):
+                setattr(task, field, getattr(self, field))
+        task.is_archived = True
+        return task
+
+    def __str__(self):
+        return self.title
+
+
+class TaskDependency(models.Model):
+    """Dependency edge: ``task`` is blocked until ``depends_on`` is completed"""
+    task = models.ForeignKey(
+        Task, on_delete=models.CASCADE, related_name='dependencies',
+        db_constraint=False)
+    depends_on = models.ForeignKey(
+        Task, on_delete=models.CASCADE, related_name='dependents',
+        db_constraint=False)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='task_dependencies')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'Task dependencies'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['task', 'depends_on'], name='unique_task_dependency'),
+            models.CheckConstraint(
+                check=~models.Q(task=models.F('depends_on')),
+                name='task_dependency_not_self'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'task']),
+        ]
+
+    def __str__(self):
+        return f'{self.task} -> {self.depends_on}'
+
+
+class TaskReminder(models.Model):
+    """
+    A notification some time (``offset``) before a task is due.
+
+    ``remind_at`` is the due date minus the offset, stored so the
+    dispatcher finds upcoming reminders with a range scan of the pending
+    index (see tasks/reminders.py). It is null while the task has no due
+    date.
+    """
+    task = models.ForeignKey(
+        Task, on_delete=models.CASCADE, related_name='reminders',
+        db_constraint=False)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='reminders')
+    offset = models.DurationField()
+    remind_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # Set whenever remind_at changes, so a running dispatcher picks up
+    # reminders moved into the window it already loaded
+    scheduled_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['task', 'user', 'offset'],
+                name='unique_task_reminder'),
+        ]
+        # Only unsent reminders are indexed; sent ones drop out
+        indexes = [
+            models.Index(fields=['remind_at'], name='reminder_pending_idx',
+                         condition=models.Q(sent_at__isnull=True)),
+            models.Index(fields=['scheduled_at'],
+                         name='reminder_scheduled_idx',
+                         condition=models.Q(sent_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f'{self.task_id} - {self.offset} before'
+
+    @classmethod
+    def reschedule(cls, task):
+        """Move the reminders of a task to its current due date"""
+        now = timezone.now()
+        reminders = cls.objects.filter(task_id=task.pk)
+        if task.due_date is None:
+            reminders.update(remind_at=None, scheduled_at=now)
+            return
+        reminders.update(
+            remind_at=ExpressionWrapper(
+                Value(task.due_date, output_field=models.DateTimeField())
+                - F('offset'), output_field=models.DateTimeField()),
+            scheduled_at=now)
+        # Sent reminders that moved into the future go off again
+        reminders.filter(sent_at__isnull=False, remind_at__gt=now).update(
+            sent_at=None)
+
+
+class TaskTag(models.Model):
+    """
+    Inverted index entry: ``task`` carries ``tag``.
+
+    ``user``, the tag's owner, is denormalized so multi-tag queries only
+    read the (user, tag, task) index, and entries of soft-deleted tasks
+    are kept so that restoring a task restores its tags.
+    """
+    tag = models.ForeignKey(
+        Tag, on_delete=models.CASCADE, related_name='entries')
+    task = models.ForeignKey(
+        Task, on_delete=models.CASCADE, related_name='tag_entries',
+        db_constraint=False)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='task_tags')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tag', 'task'], name='unique_task_tag'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'tag', 'task'],
+                         name='tasktag_user_tag_task_idx'),
+            models.Index(fields=['task'], name='tasktag_task_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} #{self.tag}'
+
+
+class SavedView(models.Model):
+    """
+    Named set of task list query parameters ("smart list").
+
+    Opened through the task list with ``?view=<id>``; the resulting task
+    ids are cached, see tasks/saved_views.py.
+    """
+    name = models.CharField(max_length=100)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='saved_views')
+    # Query parameters of /api/tasks/, e.g. {"status": "pending"}
+    query = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='unique_saved_view_name'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class TaskDailyStat(models.Model):
+    """
+    Per-user daily task counters backing the trends endpoint.
+
+    One row per user, day and dimension value: ``dimension='all'`` holds the
+    day's totals, the others break them down by priority, category or
+    status. Created/completed counts are incremented on write; overdue
+    counts and status snapshots come from the compact_task_stats command.
+    """
+
+    DIMENSION_CHOICES = [
+        ('all', 'All'),
+        ('priority', 'Priority'),
+        ('category', 'Category'),
+        ('status', 'Status'),
+    ]
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    dimension = models.CharField(
+        max_length=10, choices=DIMENSION_CHOICES, default='all')
+    key = models.CharField(max_length=32, blank=True, default='')
+    created_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    overdue_count = models.PositiveIntegerField(default=0)
+    # End-of-day number of tasks, only used by the status dimension
+    task_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'dimension', 'date', 'key'],
+                name='unique_task_daily_stat'),
+        ]
+
+    @staticmethod
+    def dimension_keys(task):
+        """(dimension, key) pairs a task's counters are recorded under"""
+        keys = [('all', ''), ('priority', str(task.priority))]
+        if task.category_id:
+            keys.append(('category', str(task.category_id)))
+        return keys
+
+    @classmethod
+    def record(cls, task, when, **deltas):
+        """Atomically add deltas (e.g. created=1) to a task's day counters"""
+        date = timezone.localdate(when)
+        updates = {
+            f'{name}_count': Greatest(F(f'{name}_count') + delta, 0)
+            for name, delta in deltas.items()
+        }
+        for dimension, key in cls.dimension_keys(task):
+            lookup = {'user_id': task.user_id, 'date': date,
+                      'dimension': dimension, 'key': key}
+            if cls.objects.filter(**lookup).update(**updates):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(**lookup, **{
+                        f'{name}_count': max(delta, 0)
+                        for name, delta in deltas.items()
+                    })
+            except IntegrityError:
+                # Another request created the row first
+                cls.objects.filter(**lookup).update(**updates)
+
+    def __str__(self):
+        return f'{self.user} {self.date} {self.dimension}={self.key}'
+
+
+class TaskActivity(models.Model):
+    """
+    One entry of the append-only task activity log (see tasks/activity.py).
+
+    Rows are never updated. References are plain ids without database
+    constraints, so the history outlives the tasks, categories and users
+    it mentions. On PostgreSQL the table is range partitioned by month on
+    ``created_at`` (see the partition_activity command).
+    """
+    CREATED = 1
+    UPDATED = 2
+    STATUS_CHANGED = 3
+    DELETED = 4
+    RESTORED = 5
+    ARCHIVED = 6
+    ACTION_CHOICES = [
+        (CREATED, 'created'),
+        (UPDATED, 'updated'),
+        (STATUS_CHANGED, 'status_changed'),
+        (DELETED, 'deleted'),
+        (RESTORED, 'restored'),
+        (ARCHIVED, 'archived'),
+    ]
+
+    task = models.ForeignKey(
+        Task, on_delete=models.DO_NOTHING, related_name='activity',
+        db_constraint=False, db_index=False)
+    # The task's owner and category at the time, for the feed
+    owner = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, related_name='+',
+        db_constraint=False, db_index=False)
+    category = models.ForeignKey(
+        Category, on_delete=models.DO_NOTHING, null=True, blank=True,
+        related_name='+', db_constraint=False, db_index=False)
+    # Null for changes made outside a request
+    actor = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, null=True, blank=True,
+        related_name='+', db_constraint=False, db_index=False)
+    action = models.PositiveSmallIntegerField(choices=ACTION_CHOICES)
+    changes = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # The feed pages backwards through ids (keyset pagination)
+        indexes = [
+            models.Index(fields=['owner', 'id'], name='activity_owner_idx'),
+            models.Index(fields=['category', 'id'],
+                         name='activity_category_idx',
+                         condition=models.Q(category__isnull=False)),
+            models.Index(fields=['task', 'id'], name='activity_task_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task_id} {self.get_action_display()}'
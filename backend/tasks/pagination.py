@@ -0,0 +1,145 @@
+import heapq
+import json
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import StreamingHttpResponse
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import activity
+from .tags import attach_tag_ids
+
+# Rows fetched per round trip when streaming a full result set
+STREAM_CHUNK_SIZE = 500
+
+_FAR_FUTURE = datetime.max.replace(tzinfo=dt_timezone.utc)
+
+
+class BoundedPageNumberPagination(PageNumberPagination):
+    """Page number pagination with a client-selectable, capped page size"""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ActivityCursorPagination(CursorPagination):
+    """
+    Keyset pagination of the activity feed, newest first.
+
+    Each page continues from the last id seen, so deep pages cost the
+    same as the first and new entries never shift the pages.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        self.page_size = activity.get_setting('PAGE_SIZE')
+        return super().get_page_size(request)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the planner's row estimate for large result sets.
+
+    An exact COUNT(*) over millions of rows takes seconds on PostgreSQL;
+    the EXPLAIN estimate is instant. Small results are still counted
+    exactly, and other databases always are.
+    """
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            sql, params = queryset.order_by().query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+            if estimate > self.exact_count_limit:
+                return estimate
+        return super().count
+
+
+def task_sort_key(priority, due_date, created_at):
+    """Sort key matching Task.Meta.ordering: -priority, due_date, -created_at"""
+    created = -(created_at or _FAR_FUTURE).timestamp()
+    return (-priority, due_date or _FAR_FUTURE, created)
+
+
+class MergedTaskSequence:
+    """
+    Lazily merge a task queryset with in-memory recurring occurrences.
+
+    Behaves like a sliceable sequence so Django's Paginator can page through
+    it. A page only fetches the sort keys of the rows before it and the full
+    rows on it, instead of materializing the whole result set.
+    """
+
+    def __init__(self, queryset, occurrences):
+        self.queryset = queryset
+        self.occurrences = sorted(occurrences, key=self._occurrence_key)
+
+    @staticmethod
+    def _occurrence_key(task):
+        return task_sort_key(task.priority, task.due_date, task.created_at)
+
+    def count(self):
+        return self.queryset.count() + len(self.occurrences)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        keys = self.queryset.values_list(
+            'pk', 'priority', 'due_date', 'created_at')
+        if stop is not None:
+            keys = keys[:stop]
+        rows = ((task_sort_key(*key[1:]), key[0]) for key in keys)
+        virtual = ((self._occurrence_key(task), task)
+                   for task in self.occurrences)
+        merged = heapq.merge(rows, virtual, key=lambda item: item[0])
+        page = [item for _, item in islice(merged, start, stop)]
+
+        tasks = self.queryset.in_bulk(
+            [item for item in page if isinstance(item, int)])
+        return [tasks[item] if isinstance(item, int) else item
+                for item in page]
+
+
+def stream_tasks(queryset, occurrences, serializer_class, context):
+    """
+    Stream a whole task result set as a JSON array.
+
+    Rows are read with a server-side cursor and serialized one at a time,
+    so memory use does not depend on the number of tasks.
+    """
+    encoder = JSONEncoder()
+    key = MergedTaskSequence._occurrence_key
+    merged = heapq.merge(
+        queryset.iterator(chunk_size=STREAM_CHUNK_SIZE),
+        sorted(occurrences, key=key), key=key)
+
+    def generate():
+        yield '['
+        position = 0
+        for chunk in iter(lambda: list(islice(merged, STREAM_CHUNK_SIZE)), []):
+            # One query for the tags of the whole chunk
+            attach_tag_ids(chunk)
+            for task in chunk:
+                data = serializer_class(task, context=context).data
+                yield (',' if position else '') + encoder.encode(data)
+                position += 1
+        yield ']'
+
+    return StreamingHttpResponse(generate(), content_type='application/json')
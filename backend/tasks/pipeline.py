@@ -0,0 +1,167 @@
+"""
+Request pipelines.
+
+``RequestPipelineMiddleware`` sits first in ``MIDDLEWARE`` and routes
+token-authenticated API requests and event streams opened with a ticket
+around the middleware they don't use: sessions, CSRF, messages, the
+session-backed user and static files (``API_PIPELINE['SKIP']``). The
+admin, the browsable API and session logins keep the full stack, and
+``MIDDLEWARE`` itself is unchanged so Django's system checks still see
+every middleware.
+
+Django links each middleware to the next through its ``get_response``
+attribute. On startup the pipeline middleware walks that chain and points
+the ``get_response`` of the middleware before a skipped one at a router
+that jumps over it for API requests. The router can also time each
+middleware; with ``TIMING`` on, the time spent in each one is reported in
+a ``Server-Timing`` response header.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'PATH_PREFIX': '/api/',
+    # Endpoints that may start a session stay on the full stack
+    'FULL_STACK_PATHS': ['/api/auth/login/', '/api/auth/register/'],
+    'SKIP': [
+        'whitenoise.middleware.WhiteNoiseMiddleware',
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    ],
+    'TIMING': False,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'API_PIPELINE', {}).get(name, DEFAULTS[name])
+
+
+def is_api_request(request):
+    """Whether a request can take the lean API pipeline"""
+    if not get_setting('ENABLED'):
+        return False
+    path = request.path_info
+    if (not path.startswith(get_setting('PATH_PREFIX'))
+            or path in get_setting('FULL_STACK_PATHS')):
+        return False
+    # The browsable API renders pages for a session user
+    if 'text/html' in request.META.get('HTTP_ACCEPT', ''):
+        return False
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    # Event streams authenticate with a ticket in the query string
+    return (authorization.startswith('Token ')
+            or bool(request.GET.get('ticket')))
+
+
+def middleware_path(instance):
+    cls = type(instance)
+    return f'{cls.__module__}.{cls.__qualname__}'
+
+
+def middleware_chain(get_response):
+    """
+    Handlers and middleware instances below ``get_response``.
+
+    Returns ``(handlers, instances)``: ``instances[i]`` is called through
+    ``handlers[i]``, and the last handler resolves and runs the view.
+    Django wraps every middleware with ``convert_exception_to_response``,
+    whose ``__wrapped__`` is the middleware instance.
+    """
+    handlers, instances = [get_response], []
+    while True:
+        instance = getattr(handlers[-1], '__wrapped__', None)
+        if instance is None or not hasattr(instance, 'get_response'):
+            return handlers, instances
+        instances.append(instance)
+        handlers.append(instance.get_response)
+
+
+def router(name, full, lean, timing):
+    """get_response that skips ahead for API requests, optionally timed"""
+    def get_response(request):
+        handler = lean if getattr(request, 'api_pipeline', False) else full
+        if not timing:
+            return handler(request)
+        start = time.perf_counter()
+        try:
+            return handler(request)
+        finally:
+            request.pipeline_timings.append(
+                (name, time.perf_counter() - start))
+    return get_response
+
+
+class RequestPipelineMiddleware:
+    """Route token-authenticated API requests through a lean stack"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.timing = get_setting('TIMING')
+        skip = set(get_setting('SKIP'))
+        handlers, instances = middleware_chain(get_response)
+
+        # lean[i]: the handler API requests take instead of handlers[i],
+        # the first one that doesn't lead into a skipped middleware
+        lean = handlers[-1:]
+        for handler, instance in zip(reversed(handlers[:-1]),
+                                     reversed(instances)):
+            lean.insert(0, lean[0] if middleware_path(instance) in skip
+                        else handler)
+        self.lean_response = lean[0]
+        self.skipped = [middleware_path(instance) for instance in instances
+                        if middleware_path(instance) in skip]
+
+        for index, instance in enumerate(instances):
+            if middleware_path(instance) in skip and not self.timing:
+                continue
+            full, lean_next = handlers[index + 1], lean[index + 1]
+            if full is not lean_next or self.timing:
+                instance.get_response = router(
+                    type(instance).__name__, full, lean_next, self.timing)
+
+    def __call__(self, request):
+        request.api_pipeline = is_api_request(request)
+        if request.api_pipeline:
+            # Set by DRF's authentication; AuthenticationMiddleware is
+            # skipped as it needs a session
+            request.user = AnonymousUser()
+        handler = (self.lean_response if request.api_pipeline
+                   else self.get_response)
+        if not self.timing:
+            return handler(request)
+
+        request.pipeline_timings = []
+        start = time.perf_counter()
+        response = handler(request)
+        response['Server-Timing'] = self.server_timing(
+            request, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def server_timing(request, total):
+        """
+        Server-Timing header value from the routers' measurements.
+
+        Each router records the time spent below its middleware, innermost
+        first, so a middleware's own time is the time below the one above
+        it minus the time below itself.
+        """
+        metrics = []
+        inclusive = total
+        for name, below in reversed(request.pipeline_timings):
+            metrics.append((name, inclusive - below))
+            inclusive = below
+        metrics.append(('view', inclusive))
+        metrics.append(('total', total))
+        logger.debug('%s %s %s', request.method, request.path, ', '.join(
+            f'{name}={seconds * 1000:.3f}ms' for name, seconds in metrics))
+        return ', '.join(f'{name};dur={seconds * 1000:.3f}'
+                         for name, seconds in metrics)
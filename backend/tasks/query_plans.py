@@ -0,0 +1,257 @@
+"""
+Query plan audit.
+
+``replay`` sends the app's canonical API requests (task lists and their
+filters, statistics, the dashboard) as one user and records the SQL they
+run; ``explain`` asks the database how it executes each query. From the
+plans, ``audit`` reports the indexes no query uses, indexes made
+redundant by a longer one with the same leading columns, and the scans
+of whole tables a missing index would avoid. Used by the audit_indexes
+command and the query plan regression test; SQLite and PostgreSQL are
+supported.
+"""
+import json
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from .dashboard import Dashboard
+
+# (path, hot). Hot requests must never scan a large table; searches
+# match substrings and can't use an index.
+CANONICAL_REQUESTS = [
+    ('/api/tasks/', True),
+    ('/api/tasks/?status=pending', True),
+    ('/api/tasks/?priority=3', True),
+    ('/api/tasks/?category={category}', True),
+    ('/api/tasks/?tags={tag}', True),
+    ('/api/tasks/?ordering=due_date', True),
+    ('/api/tasks/?page=3', True),
+    ('/api/tasks/overdue/', True),
+    ('/api/tasks/today/', True),
+    ('/api/tasks/this_week/', True),
+    ('/api/tasks/statistics/', True),
+    ('/api/tasks/trends/', True),
+    ('/api/dashboard/', True),
+    (f'/api/dashboard/?sections={",".join(Dashboard.SECTIONS)}', True),
+    ('/api/categories/', True),
+    ('/api/tags/', True),
+    ('/api/tasks/?search=report', False),
+]
+
+ALIAS_RE = re.compile(r'"(\w+)" ([A-Z]\d+)\b')
+SQLITE_STEP_RE = re.compile(r'^(SCAN|SEARCH) (\S+)(?: AS (\S+))?(.*)$')
+SQLITE_INDEX_RE = re.compile(
+    r'USING (AUTOMATIC )?(?:PARTIAL )?(?:COVERING )?INDEX (\S+)')
+
+
+@dataclass
+class Plan:
+    """How the database runs one query of a replayed request"""
+    label: str
+    sql: str
+    hot: bool
+    indexes: set = field(default_factory=set)
+    # Tables read in full, and tables the database built an index for
+    scans: set = field(default_factory=set)
+    automatic: set = field(default_factory=set)
+    lines: list = field(default_factory=list)
+
+
+def explain(sql, label='', hot=True):
+    plan = Plan(label, sql, hot)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            _read_sqlite_plan(plan, cursor.fetchall())
+        elif connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+            _read_postgres_plan(plan, cursor.fetchone()[0][0]['Plan'])
+        else:
+            raise NotImplementedError(
+                f'Query plans are not supported on {connection.vendor}')
+    return plan
+
+
+def _read_sqlite_plan(plan, rows):
+    aliases = {alias: table for table, alias in ALIAS_RE.findall(plan.sql)}
+    for _, _, _, detail in rows:
+        plan.lines.append(detail)
+        match = SQLITE_STEP_RE.match(detail)
+        if not match:
+            continue
+        kind, table, _, rest = match.groups()
+        table = aliases.get(table, table)
+        index = SQLITE_INDEX_RE.search(rest)
+        if index and index.group(1):
+            plan.automatic.add(table)
+        elif index:
+            plan.indexes.add(index.group(2))
+        elif kind == 'SCAN' and 'USING' not in rest:
+            plan.scans.add(table)
+
+
+def _read_postgres_plan(plan, node, depth=0):
+    plan.lines.append('  ' * depth + node['Node Type'] + (
+        f' on {node["Relation Name"]}' if 'Relation Name' in node else '') + (
+        f' using {node["Index Name"]}' if 'Index Name' in node else ''))
+    if 'Index Name' in node:
+        plan.indexes.add(node['Index Name'])
+    if node['Node Type'] == 'Seq Scan':
+        plan.scans.add(node['Relation Name'])
+    for child in node.get('Plans', []):
+        _read_postgres_plan(plan, child, depth + 1)
+
+
+def replay(user, requests=CANONICAL_REQUESTS, **values):
+    """
+    Send the requests as ``user`` and explain the queries they run.
+
+    ``values`` fill the placeholders of the paths; requests with a
+    placeholder that has no value are skipped.
+    """
+    token, _ = Token.objects.get_or_create(user=user)
+    client = Client(HTTP_AUTHORIZATION=f'Token {token.key}',
+                    HTTP_HOST='localhost')
+    plans = []
+    # A bucket large enough to never throttle the replay
+    with override_settings(TASK_THROTTLE={'CAPACITY': 1e9, 'RATE': 1e9}):
+        for path, hot in requests:
+            try:
+                path = path.format(**values)
+            except KeyError:
+                continue
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(path, secure=True)
+            if response.status_code != 200:
+                raise RuntimeError(
+                    f'GET {path} returned {response.status_code}')
+            seen = set()
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if (sql in seen or '"tasks_' not in sql
+                        or not sql.lstrip().upper().startswith('SELECT')):
+                    continue
+                seen.add(sql)
+                plans.append(explain(sql, f'GET {path}', hot))
+    return plans
+
+
+def app_indexes(app_label='tasks'):
+    """
+    Non-unique indexes of the app's tables.
+
+    Maps index names to (table, columns, condition). Conditions come
+    from the models; indexes the database adds on its own (foreign keys)
+    have none.
+    """
+    conditions = {}
+    tables = []
+    for model in apps.get_app_config(app_label).get_models():
+        tables.append(model._meta.db_table)
+        for index in model._meta.indexes:
+            conditions[index.name] = (
+                str(index.condition) if index.condition else None)
+    indexes = {}
+    with connection.cursor() as cursor:
+        for table in sorted(set(tables)):
+            constraints = connection.introspection.get_constraints(
+                cursor, table)
+            for name, info in constraints.items():
+                if (info['index'] and not info['unique']
+                        and not info['primary_key']):
+                    indexes[name] = (table, info['columns'],
+                                     conditions.get(name))
+    return indexes
+
+
+def redundant_indexes(indexes):
+    """
+    (index, covering index) pairs where the columns of the first are a
+    prefix of the columns of the second, or the same columns
+    """
+    pairs = []
+    for name, (table, columns, condition) in sorted(indexes.items()):
+        for other, (other_table, other_columns, other_condition) in sorted(
+                indexes.items()):
+            # Of two identical indexes only the second is reported
+            longer = len(other_columns) > len(columns) or (
+                other_columns == columns and other < name)
+            if (other != name and other_table == table and longer
+                    and other_columns[:len(columns)] == columns
+                    and other_condition in (None, condition)):
+                pairs.append((name, other))
+                break
+    return pairs
+
+
+def table_rows(table):
+    """Row count, estimated where counting would be slow"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [table])
+            row = cursor.fetchone()
+            return max(row[0], 0) if row else 0
+        cursor.execute(
+            f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+        return cursor.fetchone()[0]
+
+
+def audit(plans, min_rows=1000):
+    """
+    Summarize replayed plans.
+
+    Full scans and automatic indexes only count on tables with at least
+    ``min_rows`` rows; small tables are cheaper to read whole.
+    """
+    indexes = app_indexes()
+    usage = defaultdict(set)
+    for plan in plans:
+        for name in plan.indexes:
+            usage[name].add(plan.label)
+    rows = {}
+    # Plans also scan subqueries and temporary tables
+    tables = set(connection.introspection.table_names())
+
+    def large(table):
+        if table not in tables:
+            return False
+        if table not in rows:
+            rows[table] = table_rows(table)
+        return rows[table] >= min_rows
+
+    full_scans = [
+        (plan, table) for plan in plans
+        for table in sorted(plan.scans | plan.automatic) if large(table)
+    ]
+    return {
+        'indexes': indexes,
+        'usage': usage,
+        'unused': sorted(name for name in indexes if name not in usage),
+        'redundant': redundant_indexes(indexes),
+        'full_scans': full_scans,
+        'regressions': [(plan, table) for plan, table in full_scans
+                        if plan.hot],
+        'rows': rows,
+    }
+
+
+def analyze():
+    """Refresh the planner statistics"""
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def plans_as_json(plans):
+    return json.dumps([
+        {'request': plan.label, 'sql': plan.sql, 'plan': plan.lines}
+        for plan in plans
+    ], indent=2)
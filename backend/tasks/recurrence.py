@@ -0,0 +1,161 @@
+"""
+Lazy expansion of recurring tasks.
+
+A recurring task is stored once, as a template row with ``recurrence`` set
+and ``due_date`` holding the first occurrence. Occurrences inside a requested
+window are generated in memory as unsaved ``Task`` instances. A row is only
+written (materialized) when an occurrence is completed or edited, so the
+table grows with real work rather than with the calendar.
+"""
+import calendar
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Task
+from .pagination import MergedTaskSequence
+from .tags import get_tag_ids, set_tags
+
+RECURRENCE_STEPS = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+}
+
+# Overdue occurrences are only expanded this far back; older missed ones
+# are not listed (the overdue action reports the cutoff)
+OVERDUE_LOOKBACK_DAYS = getattr(
+    settings, 'RECURRENCE_OVERDUE_LOOKBACK_DAYS', 7)
+
+
+def _add_months(value, months):
+    """Shift a datetime by whole months, clamping the day of month"""
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def iter_occurrence_dates(task, start, end):
+    """Yield occurrence datetimes of a recurring task within [start, end)"""
+    dtstart = task.due_date
+    if not task.recurrence or dtstart is None:
+        return
+    until = task.recurrence_until
+    interval = max(task.recurrence_interval, 1)
+
+    if task.recurrence in RECURRENCE_STEPS:
+        step = RECURRENCE_STEPS[task.recurrence] * interval
+        # Jump straight to the first occurrence at or after start
+        skipped = 0 if start <= dtstart else -((dtstart - start) // step)
+        current = dtstart + skipped * step
+        while current < end and (until is None or current <= until):
+            yield current
+            current += step
+    elif task.recurrence == 'monthly':
+        months = (start.year - dtstart.year) * 12 + start.month - dtstart.month
+        count = max(0, months // interval - 1)
+        while True:
+            # Always offset from dtstart so clamped days don't drift
+            current = _add_months(dtstart, count * interval)
+            if current >= end or (until is not None and current > until):
+                break
+            if current >= start:
+                yield current
+            count += 1
+
+
+def is_occurrence_date(task, value):
+    """Check if a datetime is one of the task's occurrences"""
+    return any(iter_occurrence_dates(
+        task, value, value + timedelta(microseconds=1)))
+
+
+def build_occurrence(template, occurrence_date):
+    """Build an unsaved task for one occurrence of a template"""
+    return Task(
+        title=template.title,
+        description=template.description,
+        status='pending',
+        priority=template.priority,
+        user=template.user,
+        category=template.category,
+        due_date=occurrence_date,
+        recurrence_parent=template,
+        occurrence_date=occurrence_date,
+    )
+
+
+def expand_occurrences(templates, start, end):
+    """
+    Expand pending occurrences of the given templates within [start, end).
+
+    Issues two queries regardless of the number of occurrences: one for the
+    templates and one for the occurrences that already have rows.
+    """
+    # Occurrences copy their template's fields, whatever the listing selects
+    templates = list(templates.defer(None).filter(
+        due_date__lt=end
+    ).exclude(
+        recurrence=''
+    ).exclude(
+        status='completed'
+    ).select_related('user', 'category'))
+    if not templates:
+        return []
+
+    # Tombstoned occurrences count too: deleting an occurrence skips it
+    materialized = set(Task.all_objects.filter(
+        recurrence_parent__in=templates,
+        occurrence_date__gte=start,
+        occurrence_date__lt=end,
+    ).values_list('recurrence_parent_id', 'occurrence_date'))
+
+    occurrences = []
+    for template in templates:
+        for occurrence_date in iter_occurrence_dates(template, start, end):
+            if (template.pk, occurrence_date) not in materialized:
+                occurrences.append(build_occurrence(template, occurrence_date))
+    return occurrences
+
+
+def materialize_occurrence(template, occurrence_date):
+    """Create (or fetch) the row backing one occurrence of a template"""
+    occurrence = build_occurrence(template, occurrence_date)
+    task, created = Task.all_objects.get_or_create(
+        recurrence_parent=template,
+        occurrence_date=occurrence_date,
+        defaults={
+            'title': occurrence.title,
+            'description': occurrence.description,
+            'priority': occurrence.priority,
+            'user': occurrence.user,
+            'category': occurrence.category,
+            'due_date': occurrence.due_date,
+        },
+    )
+    if created:
+        set_tags(task, get_tag_ids(template), touch=False)
+    elif task.deleted_at:
+        task.restore()
+    return task
+
+
+def day_window(day, days=1):
+    """Return the aware [start, end) datetimes covering whole days"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=days)
+
+
+def window_tasks(tasks, stored, start, end):
+    """
+    Stored tasks of a window merged lazily with recurring occurrences.
+
+    ``tasks`` are the tasks being listed, with the caller's visibility
+    and filters applied; the occurrences in [start, end) of the recurring
+    templates among them are merged with ``stored``, the ones of them the
+    window shows as rows.
+    """
+    return MergedTaskSequence(stored.filter(recurrence=''),
+                              expand_occurrences(tasks, start, end))
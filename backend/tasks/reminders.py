@@ -0,0 +1,323 @@
+"""
+Due-date reminders.
+
+A ``TaskReminder`` row stores when it should go off (``remind_at``). The
+long-running ``dispatch_reminders`` command loads the reminders due in
+the next ``WINDOW_SECONDS`` with a range scan of the pending index into
+an in-memory timing wheel, and only loads the next window as time moves
+on, so memory and query cost depend on the reminders due soon, not on
+all pending ones. Every ``RESCAN_SECONDS`` it fetches reminders changed
+since the last scan (edited due dates, new reminders) through the
+``scheduled_at`` index and moves them in the wheel.
+
+Due reminders are re-checked and marked sent in batches of
+``BATCH_SIZE`` and handed to every configured sink. Settings live in
+``TASK_REMINDERS``.
+"""
+import json
+import logging
+import time
+import urllib.request
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import TaskReminder
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SINKS': [{'BACKEND': 'tasks.reminders.LocalSink'}],
+    'TICK_SECONDS': 1,
+    'WINDOW_SECONDS': 300,
+    'RESCAN_SECONDS': 5,
+    'BATCH_SIZE': 500,
+    # Reminders per task and user
+    'MAX_REMINDERS': 5,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'TASK_REMINDERS', {}).get(name, DEFAULTS[name])
+
+
+def set_reminders(task, user, offsets):
+    """
+    Replace a user's reminders of a task with the given offsets.
+
+    Reminders whose offset is kept are left alone, including whether
+    they were sent.
+    """
+    offsets = set(offsets)
+    with transaction.atomic():
+        reminders = TaskReminder.objects.filter(task=task, user=user)
+        reminders.exclude(offset__in=offsets).delete()
+        existing = set(reminders.values_list('offset', flat=True))
+        TaskReminder.objects.bulk_create([
+            TaskReminder(
+                task=task, user=user, offset=offset,
+                remind_at=task.due_date - offset if task.due_date else None)
+            for offset in offsets - existing
+        ])
+    return reminders.order_by('offset')
+
+
+class TimingWheel:
+    """
+    Hashed timing wheel: ``slots`` buckets of ``tick`` seconds each.
+
+    Scheduling, cancelling and advancing by one tick take constant time
+    whatever the number of entries. Entries further than one turn of the
+    wheel (``span`` seconds) from its current tick wait in ``overflow``
+    and move into their slots as the wheel advances.
+    """
+
+    def __init__(self, tick, slots, start):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]
+        self.current = int(start // tick)
+        self.overflow = {}
+        self._slot_of = {}
+
+    @property
+    def span(self):
+        return self.tick * len(self.slots)
+
+    @property
+    def end(self):
+        """Timestamp up to which entries go straight into their slots"""
+        return (self.current + len(self.slots)) * self.tick
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, key):
+        return key in self._slot_of
+
+    def schedule(self, key, when):
+        """(Re)schedule ``key`` at timestamp ``when``; past times fire next"""
+        self.cancel(key)
+        tick = max(int(when // self.tick), self.current)
+        if tick >= self.current + len(self.slots):
+            self.overflow[key] = when
+            self._slot_of[key] = None
+            return
+        slot = tick % len(self.slots)
+        self.slots[slot][key] = when
+        self._slot_of[key] = slot
+
+    def cancel(self, key):
+        if key not in self._slot_of:
+            return
+        slot = self._slot_of.pop(key)
+        if slot is None:
+            del self.overflow[key]
+        else:
+            del self.slots[slot][key]
+
+    def advance(self, now):
+        """Remove and return the keys due at or before timestamp ``now``"""
+        target = int(now // self.tick)
+        steps = min(target - self.current + 1, len(self.slots))
+        due = []
+        for offset in range(max(steps, 0)):
+            bucket = self.slots[(self.current + offset) % len(self.slots)]
+            if bucket:
+                due.extend(bucket)
+                for key in bucket:
+                    del self._slot_of[key]
+                bucket.clear()
+        self.current = max(self.current, target + 1)
+        if self.overflow:
+            waiting, self.overflow = self.overflow, {}
+            for key, when in waiting.items():
+                del self._slot_of[key]
+                self.schedule(key, when)
+        return due
+
+
+def notification(reminder):
+    task = reminder.task
+    return {
+        'reminder': reminder.pk,
+        'task': task.pk,
+        'title': task.title,
+        'due_date': task.due_date.isoformat() if task.due_date else None,
+        'user': reminder.user_id,
+        'email': reminder.user.email,
+        'minutes_before': int(reminder.offset.total_seconds() // 60),
+    }
+
+
+class BaseSink:
+    """Delivers a batch of reminder notifications"""
+
+    def __init__(self, **options):
+        pass
+
+    def send(self, notifications):
+        raise NotImplementedError
+
+
+class LocalSink(BaseSink):
+    """Logs notifications and keeps them in ``outbox``, for development"""
+    outbox = []
+
+    def send(self, notifications):
+        for item in notifications:
+            logger.info('Reminder: task %s "%s" due %s for user %s',
+                        item['task'], item['title'], item['due_date'],
+                        item['user'])
+        self.outbox.extend(notifications)
+
+
+class EmailSink(BaseSink):
+    """One email per notification, sent over a single connection"""
+
+    def __init__(self, from_email=None, subject='Reminder: {title}',
+                 **options):
+        super().__init__(**options)
+        self.from_email = from_email
+        self.subject = subject
+
+    def send(self, notifications):
+        messages = [
+            EmailMessage(
+                self.subject.format(**item),
+                f'"{item["title"]}" is due {item["due_date"]}.',
+                self.from_email, [item['email']])
+            for item in notifications if item['email']
+        ]
+        if messages:
+            get_connection().send_messages(messages)
+
+
+class WebhookSink(BaseSink):
+    """POSTs each batch as one JSON document to ``url``"""
+
+    def __init__(self, url, timeout=10, headers=None, **options):
+        super().__init__(**options)
+        self.url = url
+        self.timeout = timeout
+        self.headers = {'Content-Type': 'application/json', **(headers or {})}
+
+    def send(self, notifications):
+        request = urllib.request.Request(
+            self.url, data=json.dumps({'reminders': notifications}).encode(),
+            headers=self.headers, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def get_sinks():
+    return [import_string(sink['BACKEND'])(**sink.get('OPTIONS', {}))
+            for sink in get_setting('SINKS')]
+
+
+class Dispatcher:
+    """Fires due reminders from a timing wheel loaded window by window"""
+
+    def __init__(self, sinks=None, now=None):
+        now = now or timezone.now()
+        self.sinks = get_sinks() if sinks is None else sinks
+        self.tick = get_setting('TICK_SECONDS')
+        self.window = timedelta(seconds=get_setting('WINDOW_SECONDS'))
+        self.rescan = timedelta(seconds=get_setting('RESCAN_SECONDS'))
+        self.batch_size = get_setting('BATCH_SIZE')
+        # Room for a full window ahead of the current tick
+        slots = int(self.window.total_seconds() // self.tick) + 2
+        self.wheel = TimingWheel(self.tick, slots, now.timestamp())
+        # Reminders due before the horizon are in the wheel
+        self.horizon = None
+        self.changed_since = now
+        self.next_rescan = now + self.rescan
+
+    def load_window(self, now):
+        """Add the reminders due before ``now`` + window not loaded yet"""
+        # Never past the end of the wheel, which a late step leaves behind
+        until = min(now + self.window, datetime.fromtimestamp(
+            self.wheel.end, tz=dt_timezone.utc))
+        if self.horizon is not None and until <= self.horizon:
+            return 0
+        pending = TaskReminder.objects.filter(
+            sent_at__isnull=True, remind_at__lt=until)
+        if self.horizon is not None:
+            pending = pending.filter(remind_at__gte=self.horizon)
+        count = 0
+        for pk, remind_at in pending.values_list(
+                'pk', 'remind_at').iterator(chunk_size=self.batch_size):
+            self.wheel.schedule(pk, remind_at.timestamp())
+            count += 1
+        self.horizon = until
+        return count
+
+    def pick_up_changes(self, now):
+        """Move reminders scheduled or rescheduled since the last scan"""
+        changed = TaskReminder.objects.filter(
+            sent_at__isnull=True, scheduled_at__gte=self.changed_since)
+        # Overlap the scans so rows committed late are not missed
+        self.changed_since = now - self.rescan
+        self.next_rescan = now + self.rescan
+        for pk, remind_at in changed.values_list('pk', 'remind_at'):
+            if remind_at is None or remind_at >= self.horizon:
+                # Loaded with its window, if it still has one
+                self.wheel.cancel(pk)
+            else:
+                self.wheel.schedule(pk, remind_at.timestamp())
+
+    def step(self, now=None):
+        """Load, rescan and fire as due at ``now``; returns the fired count"""
+        now = now or timezone.now()
+        # Catch up on the ticks a late step missed before loading, so the
+        # window fits in the wheel; what loads as due fires below
+        due = self.wheel.advance(now.timestamp() - self.tick)
+        if self.horizon is None or self.horizon - now < self.window / 2:
+            self.load_window(now)
+        if now >= self.next_rescan:
+            self.pick_up_changes(now)
+        due += self.wheel.advance(now.timestamp())
+        return sum(self.fire(due[start:start + self.batch_size], now)
+                   for start in range(0, len(due), self.batch_size))
+
+    def fire(self, reminder_ids, now):
+        """Mark a batch of reminders sent and deliver them"""
+        with transaction.atomic():
+            # Re-checked, as they may have been moved or sent meanwhile;
+            # locked rows belong to another dispatcher
+            reminders = list(TaskReminder.objects.select_related(
+                'task', 'user').select_for_update(
+                skip_locked=True, of=('self',)).filter(
+                pk__in=reminder_ids, sent_at__isnull=True,
+                remind_at__lte=now))
+            TaskReminder.objects.filter(
+                pk__in=[reminder.pk for reminder in reminders]).update(
+                sent_at=now)
+        notifications = [
+            notification(reminder) for reminder in reminders
+            if reminder.task.deleted_at is None
+            and reminder.task.status != 'completed'
+        ]
+        if notifications:
+            for sink in self.sinks:
+                try:
+                    sink.send(notifications)
+                except Exception:
+                    logger.exception('Reminder sink %s failed for %d '
+                                     'reminders', type(sink).__name__,
+                                     len(notifications))
+        return len(notifications)
+
+    def run(self, stop=lambda: False):
+        while not stop():
+            try:
+                self.step()
+            except Exception:
+                logger.exception('Dispatching reminders failed')
+                # Reload everything pending, including reminders taken off
+                # the wheel but not sent
+                self.horizon = None
+            time.sleep(self.tick)
@@ -0,0 +1,14 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF negotiate ``text/event-stream`` for streaming views"""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only used for error responses; streams bypass rendering
+        return json.dumps(data).encode(self.charset)
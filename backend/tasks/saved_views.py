@@ -0,0 +1,126 @@
+"""
+Cached result sets of saved views.
+
+Opening a saved view runs its query through TaskViewSet's filters once
+and caches the ordered list of matching task ids. Later opens only fetch
+the tasks of the requested page by primary key.
+
+Cached lists are invalidated per user: every committed change to one of
+a user's tasks or tags bumps that user's generation number, which is part
+of the cache key, so other users' lists survive. Editing a view changes
+its ``updated_at``, also part of the key. Views with a date-relative
+``status_filter`` additionally expire after ``TIME_DEPENDENT_TIMEOUT``
+seconds. Settings live in ``SAVED_VIEWS``.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import QueryDict
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'TIMEOUT': 600,
+    'TIME_DEPENDENT_TIMEOUT': 60,
+    # Larger result sets are recomputed on every open
+    'MAX_IDS': 5000,
+}
+
+# Task list parameters a saved view can store
+QUERY_PARAMS = ['status', 'priority', 'category', 'parent', 'status_filter',
+                'search', 'ordering', 'tags', 'tag_match']
+# Parameters of the request that opens a view that still apply
+PASS_THROUGH_PARAMS = ['page', 'page_size', 'fields', 'omit', 'compact']
+
+
+def get_setting(name):
+    return getattr(settings, 'SAVED_VIEWS', {}).get(name, DEFAULTS[name])
+
+
+def get_cache():
+    return caches[get_setting('CACHE')]
+
+
+def _increment(key):
+    """Increment a counter, starting it from ``time.time_ns()`` if missing"""
+    cache = get_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # A fresh start value can't collide with one evicted earlier
+        cache.add(key, time.time_ns(), timeout=None)
+        return cache.get(key)
+
+
+def generation(user_id):
+    key = f'saved_views:generation:{user_id}'
+    value = get_cache().get(key)
+    return _increment(key) if value is None else value
+
+
+def invalidate(user_id):
+    """Invalidate the cached lists of all saved views of a user"""
+    _increment(f'saved_views:generation:{user_id}')
+
+
+def query_params(query):
+    """A saved query as task list parameters"""
+    params = QueryDict(mutable=True)
+    for name, value in query.items():
+        params[name] = str(value)
+    return params
+
+
+def view_params(saved_view, request_params):
+    """Query parameters to run a saved view with"""
+    params = query_params(saved_view.query)
+    for name in PASS_THROUGH_PARAMS:
+        if name in request_params:
+            params[name] = request_params[name]
+    return params
+
+
+def cached_task_ids(saved_view, compute):
+    """
+    Ordered task ids of a saved view and whether they came from the cache.
+
+    ``compute`` runs the query when the list isn't cached.
+    """
+    cache = get_cache()
+    key = (f'saved_views:ids:{saved_view.pk}:'
+           f'{saved_view.updated_at.timestamp()}:'
+           f'{generation(saved_view.user_id)}')
+    ids = cache.get(key)
+    hit = ids is not None
+    if not hit:
+        ids = compute()
+        if len(ids) <= get_setting('MAX_IDS'):
+            timeout = get_setting(
+                'TIME_DEPENDENT_TIMEOUT'
+                if saved_view.query.get('status_filter') else 'TIMEOUT')
+            cache.set(key, ids, timeout)
+    _record(hit)
+    return ids, hit
+
+
+def _record(hit):
+    key = 'saved_views:hits' if hit else 'saved_views:misses'
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def metrics():
+    """Cache hits, misses and hit rate since the counters started"""
+    counts = get_cache().get_many(['saved_views:hits', 'saved_views:misses'])
+    hits = counts.get('saved_views:hits', 0)
+    misses = counts.get('saved_views:misses', 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
@@ -1,6 +1,16 @@
+from datetime import timedelta
+
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from .models import User, Category, Task
+from django.db import transaction
+from django.utils import timezone
+from .models import (
+    User, Category, CategoryMembership, SavedView, Tag, Task, TaskDailyStat,
+    TaskActivity, TaskDependency, TaskReminder
+)
+from .saved_views import QUERY_PARAMS
+from .sharing import can_edit_task, can_use_category, visible_tasks
+from .tags import attach_tag_ids, get_tag_ids, set_tags
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -17,12 +27,15 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-        """Create user with encrypted password"""
-        password = validated_data.pop('password')
-        user = User.objects.create_user(**validated_data)
-        user.set_password(password)
-        user.save()
-        return user
+        """Create user with encrypted password, hashing it once"""
+        return User.objects.create_user(**validated_data)
+
+    def update(self, instance, validated_data):
+        """Hash a changed password instead of storing it as given"""
+        password = validated_data.pop('password', None)
+        if password:
+            instance.set_password(password)
+        return super().update(instance, validated_data)
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -42,13 +55,9 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        """Create new user"""
+        """Create new user, hashing the password once"""
         validated_data.pop('password_confirm')
-        password = validated_data.pop('password')
-        user = User.objects.create_user(**validated_data)
-        user.set_password(password)
-        user.save()
-        return user
+        return User.objects.create_user(**validated_data)
 
 
 class UserLoginSerializer(serializers.Serializer):
@@ -79,11 +88,44 @@ class UserLoginSerializer(serializers.Serializer):
         return data
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Serializer that can render a subset of its fields.
+
+    Pass ``fields=[...]`` to keep only those fields; ``model_fields()``
+    names the model columns they read, for ``QuerySet.only()``.
+    """
+    # Serializer field -> model fields it reads, where they differ
+    field_sources = {}
+    # Field set of the compact list representation
+    compact_fields = []
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def model_fields(cls, names):
+        """Model fields needed to render the given serializer fields"""
+        columns = {'id'}
+        for name in names:
+            columns.update(cls.field_sources.get(name, [name]))
+        return sorted(columns)
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Category serializer"""
     user = serializers.StringRelatedField(read_only=True)
     task_count = serializers.SerializerMethodField()
 
+    field_sources = {
+        'user': ['user', 'user__username'],
+        'task_count': [],
+    }
+    compact_fields = ['id', 'name', 'color']
+
     class Meta:
         model = Category
         fields = ['id', 'name', 'color', 'user', 'task_count', 'created_at']
@@ -91,13 +133,89 @@ class CategorySerializer(serializers.ModelSerializer):
 
     def get_task_count(self, obj):
         """Get number of tasks in this category"""
+        if hasattr(obj, 'annotated_task_count'):
+            return obj.annotated_task_count
         try:
             return obj.task_set.count()
         except:
             return 0
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class CategoryMembershipSerializer(serializers.ModelSerializer):
+    """Member of a shared category, addressed by username"""
+    username = serializers.SlugRelatedField(
+        source='user', slug_field='username', queryset=User.objects.all())
+
+    class Meta:
+        model = CategoryMembership
+        fields = ['id', 'user', 'username', 'role', 'created_at']
+        read_only_fields = ['user', 'created_at']
+
+
+class TagSerializer(serializers.ModelSerializer):
+    """Tag serializer; counts come from the maintained task_count"""
+
+    class Meta:
+        model = Tag
+        fields = ['id', 'name', 'color', 'task_count', 'created_at']
+        read_only_fields = ['task_count', 'created_at']
+
+    def validate_name(self, value):
+        """Ensure tag names are unique per user"""
+        request = self.context.get('request')
+        tags = Tag.objects.filter(user=request.user, name=value)
+        if self.instance:
+            tags = tags.exclude(pk=self.instance.pk)
+        if tags.exists():
+            raise serializers.ValidationError(
+                "You already have a tag with this name")
+        return value
+
+
+class SavedViewSerializer(serializers.ModelSerializer):
+    """Saved view serializer"""
+
+    class Meta:
+        model = SavedView
+        fields = ['id', 'name', 'query', 'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+
+    def validate_name(self, value):
+        """Ensure view names are unique per user"""
+        request = self.context.get('request')
+        views = SavedView.objects.filter(user=request.user, name=value)
+        if self.instance:
+            views = views.exclude(pk=self.instance.pk)
+        if views.exists():
+            raise serializers.ValidationError(
+                "You already have a view with this name")
+        return value
+
+    def validate_query(self, value):
+        """Only task list filters, with scalar values"""
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Expected an object")
+        unknown = sorted(set(value) - set(QUERY_PARAMS))
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown parameter(s): {', '.join(unknown)}")
+        if any(isinstance(item, (dict, list)) for item in value.values()):
+            raise serializers.ValidationError(
+                "Parameter values must be strings or numbers")
+        return value
+
+
+class TaskListSerializer(serializers.ListSerializer):
+    """Loads the tags of all tasks in one query"""
+
+    def to_representation(self, data):
+        tasks = list(data.all() if hasattr(data, 'all') else data)
+        if 'tags' in self.child.fields:
+            attach_tag_ids(tasks)
+        return super().to_representation(tasks)
+
+
+class TaskSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Task serializer - simplified version"""
     user = serializers.StringRelatedField(read_only=True)
     category_name = serializers.CharField(
@@ -106,50 +224,221 @@ class TaskSerializer(serializers.ModelSerializer):
         source='get_status_display', read_only=True)
     priority_display = serializers.CharField(
         source='get_priority_display', read_only=True)
+    completion_percentage = serializers.FloatField(read_only=True)
+    archived = serializers.BooleanField(source='is_archived', read_only=True)
+    tags = serializers.SerializerMethodField()
+
+    field_sources = {
+        'user': ['user', 'user__username'],
+        'category_name': ['category', 'category__name'],
+        'status_display': ['status'],
+        'priority_display': ['priority'],
+        'completion_percentage': ['status', 'descendant_count',
+                                  'completed_descendant_count'],
+        'archived': [],
+        'tags': ['recurrence_parent'],
+    }
+    # No description: it is most of the bytes of a task
+    compact_fields = ['id', 'title', 'status', 'priority', 'category',
+                      'tags', 'due_date', 'parent', 'version']
 
     class Meta:
         model = Task
         fields = [
             'id', 'title', 'description', 'status', 'status_display',
             'priority', 'priority_display', 'user', 'category', 'category_name',
-            'due_date', 'created_at', 'updated_at', 'completed_at'
+            'due_date', 'created_at', 'updated_at', 'completed_at',
+            'recurrence', 'recurrence_interval', 'recurrence_until',
+            'recurrence_parent', 'occurrence_date', 'parent', 'depth',
+            'child_count', 'descendant_count', 'completed_descendant_count',
+            'completion_percentage', 'version', 'archived', 'tags'
         ]
-        read_only_fields = ['user', 'created_at', 'updated_at', 'completed_at']
+        read_only_fields = ['user', 'created_at', 'updated_at', 'completed_at',
+                            'recurrence_parent', 'occurrence_date', 'parent',
+                            'depth', 'child_count', 'descendant_count',
+                            'completed_descendant_count', 'version']
+        list_serializer_class = TaskListSerializer
+
+    def get_tags(self, obj):
+        return get_tag_ids(obj)
+
+
+def validate_recurrence(data, instance=None):
+    """Ensure recurring tasks have an anchor date and are not occurrences"""
+    recurrence = data.get(
+        'recurrence', instance.recurrence if instance else '')
+    if not recurrence:
+        return data
+    if instance and instance.recurrence_parent_id:
+        raise serializers.ValidationError(
+            "An occurrence of a recurring task cannot recur itself")
+    due_date = data.get('due_date', instance.due_date if instance else None)
+    if due_date is None:
+        raise serializers.ValidationError(
+            "Recurring tasks need a due date for the first occurrence")
+    return data
 
 
-class TaskCreateSerializer(serializers.ModelSerializer):
+class TaskTagsMixin(serializers.Serializer):
+    """Writable list of tag ids, stored in the TaskTag index"""
+    tags = serializers.PrimaryKeyRelatedField(
+        many=True, queryset=Tag.objects.all(), required=False)
+
+    def validate_tags(self, value):
+        """Ensure tags belong to current user"""
+        request = self.context.get('request')
+        if any(tag.user_id != request.user.id for tag in value):
+            raise serializers.ValidationError(
+                "You can only use your own tags")
+        return value
+
+    def create(self, validated_data):
+        tags = validated_data.pop('tags', None)
+        with transaction.atomic():
+            task = super().create(validated_data)
+            if tags:
+                set_tags(task, [tag.pk for tag in tags],
+                         self.context['request'].user, touch=False)
+        return task
+
+    def update(self, instance, validated_data):
+        tags = validated_data.pop('tags', None)
+        with transaction.atomic():
+            task = super().update(instance, validated_data)
+            if tags is not None:
+                set_tags(task, [tag.pk for tag in tags],
+                         self.context['request'].user)
+        return task
+
+
+class TaskCreateSerializer(TaskTagsMixin, serializers.ModelSerializer):
     """Task creation serializer with minimal fields"""
 
     class Meta:
         model = Task
         fields = ['title', 'description', 'status',
-                  'priority', 'category', 'due_date']
+                  'priority', 'category', 'due_date', 'parent',
+                  'recurrence', 'recurrence_interval', 'recurrence_until',
+                  'tags']
 
     def validate_category(self, value):
-        """Ensure category belongs to current user"""
+        """Ensure the current user owns or can edit in the category"""
+        request = self.context.get('request')
+        if value and not can_use_category(request.user, value):
+            raise serializers.ValidationError(
+                "You can only assign tasks to your own or shared categories")
+        return value
+
+    def validate_parent(self, value):
+        """Ensure parent task is editable and is not a descendant"""
         request = self.context.get('request')
-        if value and value.user != request.user:
+        if value and not can_edit_task(request.user, value):
+            raise serializers.ValidationError(
+                "You can only nest tasks under tasks you can edit")
+        if value and self.instance and value.tree_path().startswith(
+                self.instance.tree_path()):
             raise serializers.ValidationError(
-                "You can only assign tasks to your own categories")
+                "A task cannot be nested under itself or its subtasks")
         return value
 
+    def validate(self, data):
+        """Validate recurrence rule"""
+        return validate_recurrence(data, self.instance)
+
 
-class TaskUpdateSerializer(serializers.ModelSerializer):
+class TaskUpdateSerializer(TaskTagsMixin, serializers.ModelSerializer):
     """Task update serializer"""
 
     class Meta:
         model = Task
         fields = ['title', 'description', 'status',
-                  'priority', 'category', 'due_date']
+                  'priority', 'category', 'due_date', 'parent',
+                  'recurrence', 'recurrence_interval', 'recurrence_until',
+                  'tags', 'version']
+        read_only_fields = ['version']
 
     def validate_category(self, value):
-        """Ensure category belongs to current user"""
+        """Ensure the current user owns or can edit in the category"""
         request = self.context.get('request')
-        if value and value.user != request.user:
+        if value and not can_use_category(request.user, value):
             raise serializers.ValidationError(
-                "You can only assign tasks to your own categories")
+                "You can only assign tasks to your own or shared categories")
         return value
 
+    def validate_parent(self, value):
+        """Ensure parent task is editable and is not a descendant"""
+        request = self.context.get('request')
+        if value and not can_edit_task(request.user, value):
+            raise serializers.ValidationError(
+                "You can only nest tasks under tasks you can edit")
+        if value and self.instance and value.tree_path().startswith(
+                self.instance.tree_path()):
+            raise serializers.ValidationError(
+                "A task cannot be nested under itself or its subtasks")
+        return value
+
+    def validate(self, data):
+        """Validate recurrence rule"""
+        return validate_recurrence(data, self.instance)
+
+
+class TaskDependencySerializer(serializers.ModelSerializer):
+    """Task dependency serializer"""
+    depends_on_title = serializers.CharField(
+        source='depends_on.title', read_only=True)
+    depends_on_status = serializers.CharField(
+        source='depends_on.status', read_only=True)
+
+    class Meta:
+        model = TaskDependency
+        fields = ['id', 'task', 'depends_on', 'depends_on_title',
+                  'depends_on_status', 'created_at']
+        read_only_fields = ['task', 'created_at']
+
+    def validate_depends_on(self, value):
+        """Ensure the current user can see the blocking task"""
+        request = self.context.get('request')
+        if not visible_tasks(request.user).filter(pk=value.pk).exists():
+            raise serializers.ValidationError(
+                "You can only depend on tasks you can see")
+        return value
+
+
+class TaskReminderSerializer(serializers.ModelSerializer):
+    """A reminder, with its offset in minutes before the due date"""
+    minutes_before = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TaskReminder
+        fields = ['id', 'minutes_before', 'remind_at', 'sent_at']
+
+    def get_minutes_before(self, obj):
+        return int(obj.offset.total_seconds() // 60)
+
+
+class TaskRemindersSerializer(serializers.Serializer):
+    """The minutes before the due date to remind the current user at"""
+    minutes_before = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=60 * 24 * 365))
+
+    def validate_minutes_before(self, value):
+        limit = self.context['max_reminders']
+        if len(set(value)) > limit:
+            raise serializers.ValidationError(
+                f"At most {limit} reminders per task")
+        return [timedelta(minutes=minutes) for minutes in set(value)]
+
+
+class TaskActivitySerializer(serializers.ModelSerializer):
+    """Activity log entry"""
+    action = serializers.CharField(source='get_action_display')
+    actor = serializers.StringRelatedField()
+
+    class Meta:
+        model = TaskActivity
+        fields = ['id', 'task', 'category', 'action', 'changes', 'actor',
+                  'created_at']
+
 
 class TaskStatisticsSerializer(serializers.Serializer):
     """Task statistics serializer"""
@@ -161,3 +450,22 @@ class TaskStatisticsSerializer(serializers.Serializer):
     completion_rate = serializers.FloatField()
     tasks_by_priority = serializers.DictField()
     tasks_by_category = serializers.DictField()
+
+
+class TaskTrendQuerySerializer(serializers.Serializer):
+    """Query parameters of the task trends endpoint"""
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    bucket = serializers.ChoiceField(
+        choices=['day', 'week', 'month'], default='day')
+    dimension = serializers.ChoiceField(
+        choices=TaskDailyStat.DIMENSION_CHOICES, default='all')
+
+    def validate(self, data):
+        """Default to the last 30 days and check the range"""
+        data.setdefault('end', timezone.localdate())
+        data.setdefault('start', data['end'] - timedelta(days=29))
+        if data['start'] > data['end']:
+            raise serializers.ValidationError(
+                "Start date must be before end date")
+        return data
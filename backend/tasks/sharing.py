@@ -0,0 +1,52 @@
+"""
+Shared categories (projects).
+
+Who may see or change what is stored in ``CategoryMembership``: the
+owner of a category and each member have a row with their role. Task
+lists are the user's own tasks plus the tasks of every category they are
+a member of, which is one ``category_id IN (subquery)`` over the
+membership index, so list queries stay index driven however many tasks
+are shared. Write checks test a single task or category.
+"""
+from django.db.models import Q
+
+from .models import CategoryMembership, Task
+
+EDIT_ROLES = [CategoryMembership.OWNER, CategoryMembership.EDITOR]
+
+
+def member_category_ids(user, roles=None):
+    """Subquery of the live categories a user is a member of"""
+    memberships = CategoryMembership.objects.filter(
+        user=user, category__deleted_at__isnull=True)
+    if roles is not None:
+        memberships = memberships.filter(role__in=roles)
+    return memberships.values('category_id')
+
+
+def visible_tasks(user):
+    """Live tasks a user owns or can see through a shared category"""
+    return Task.objects.filter(
+        Q(user=user) | Q(category__in=member_category_ids(user)))
+
+
+def can_edit_task(user, task):
+    if task.user_id == user.pk:
+        return True
+    return task.category_id is not None and member_category_ids(
+        user, EDIT_ROLES).filter(category_id=task.category_id).exists()
+
+
+def can_use_category(user, category):
+    """Whether a user may file tasks under a category"""
+    return member_category_ids(user, EDIT_ROLES).filter(
+        category_id=category.pk).exists()
+
+
+def audience(task):
+    """Ids of the users a change of a task concerns"""
+    user_ids = {task.user_id}
+    if task.category_id:
+        user_ids.update(CategoryMembership.objects.filter(
+            category_id=task.category_id).values_list('user_id', flat=True))
+    return user_ids
@@ -0,0 +1,107 @@
+"""
+Signal handlers publishing change events for server-push notifications.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import activity, saved_views
+from .archive import is_archiving
+from .events import get_broker
+from .models import Category, CategoryMembership, Tag, Task, TaskActivity
+from .sharing import audience
+
+
+def publish_on_commit(user_id, event_type, payload):
+    """Publish once the surrounding transaction commits"""
+    transaction.on_commit(
+        lambda: get_broker().publish(user_id, event_type, payload))
+
+
+def invalidate_saved_views_on_commit(user_id):
+    """Drop cached saved view results once the change is visible"""
+    transaction.on_commit(lambda: saved_views.invalidate(user_id))
+
+
+def save_event_type(prefix, instance, created, update_fields):
+    """Event type of a save; soft deletes and restores are saves too"""
+    if created:
+        return f'{prefix}.created'
+    if update_fields and 'deleted_at' in update_fields:
+        action = 'deleted' if instance.deleted_at else 'restored'
+        return f'{prefix}.{action}'
+    return f'{prefix}.updated'
+
+
+def task_payload(task):
+    return {
+        'id': task.pk,
+        'status': task.status,
+        'parent': task.parent_id,
+        'updated_at': task.updated_at.isoformat() if task.updated_at else None,
+    }
+
+
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if raw:
+        return
+    activity.record_save(instance, created, update_fields)
+    event_type = save_event_type('task', instance, created, update_fields)
+    payload = task_payload(instance)
+    for user_id in audience(instance):
+        publish_on_commit(user_id, event_type, payload)
+        invalidate_saved_views_on_commit(user_id)
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted(sender, instance, **kwargs):
+    user_ids = audience(instance)
+    for user_id in user_ids:
+        invalidate_saved_views_on_commit(user_id)
+    if instance.deleted_at:
+        return  # Announced when it was soft deleted
+    if is_archiving():
+        activity.record(instance, TaskActivity.ARCHIVED)
+        event_type = 'task.archived'
+    else:
+        activity.record(instance, TaskActivity.DELETED, {'permanent': True})
+        event_type = 'task.deleted'
+    for user_id in user_ids:
+        publish_on_commit(user_id, event_type, {'id': instance.pk})
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, raw=False, update_fields=None,
+                   **kwargs):
+    if raw:
+        return
+    event_type = save_event_type('category', instance, created, update_fields)
+    publish_on_commit(instance.user_id, event_type, {'id': instance.pk})
+    if update_fields and 'deleted_at' in update_fields:
+        # Members lose or regain the category's tasks
+        for user_id in instance.memberships.values_list('user_id', flat=True):
+            invalidate_saved_views_on_commit(user_id)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    if instance.deleted_at:
+        return  # Announced when it was soft deleted
+    publish_on_commit(
+        instance.user_id, 'category.deleted', {'id': instance.pk})
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    # Views filtering by the tag no longer match its tasks
+    invalidate_saved_views_on_commit(instance.user_id)
+
+
+@receiver(post_save, sender=CategoryMembership)
+@receiver(post_delete, sender=CategoryMembership)
+def membership_changed(sender, instance, raw=False, **kwargs):
+    # The member now sees more or fewer tasks
+    if not raw:
+        invalidate_saved_views_on_commit(instance.user_id)
@@ -0,0 +1,112 @@
+"""
+Startup performance helpers.
+
+``warm_up`` imports everything the first request would (URLconf, views,
+serializers, DRF), so a preloading server does it once before forking
+instead of once per worker on its first request. ``pending_migrations``
+is a cheap check for unapplied migrations, used at boot instead of
+running ``migrate``. ``import_times`` and ``startup_time`` measure a
+fresh interpreter, for the profile_imports command and the startup
+budget test.
+"""
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Loads the application like a server worker handling its first request
+STARTUP_CODE = (
+    'import os; '
+    'os.environ.setdefault("DJANGO_SETTINGS_MODULE", '
+    '"taskflow_backend.settings"); '
+    'from django.core.wsgi import get_wsgi_application; '
+    'get_wsgi_application(); '
+    'from tasks.startup import warm_up; warm_up()'
+)
+
+
+def warm_up():
+    """Import the URLconf and with it every view, serializer and DRF"""
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+
+
+def migration_files(app_config):
+    """Names of the migration files of an app, without importing them"""
+    module_name, _ = MigrationLoader.migrations_module(app_config.label)
+    if module_name is None:
+        return set()
+    if not module_name.startswith(app_config.name + '.'):
+        return None
+    relative = module_name[len(app_config.name) + 1:]
+    directory = Path(app_config.path, *relative.split('.'))
+    if not directory.is_dir():
+        return set()
+    return {path.stem for path in directory.glob('*.py')
+            if path.stem != '__init__'}
+
+
+def pending_migrations(using=DEFAULT_DB_ALIAS):
+    """
+    Unapplied migrations as (app_label, name) pairs.
+
+    The migration files on disk are compared with the django_migrations
+    table first, which takes one query and no imports. Only when that
+    finds a difference (or can't tell, for squashed or relocated
+    migrations) is the full migration graph loaded.
+    """
+    connection = connections[using]
+    recorder = MigrationRecorder(connection)
+    if not recorder.has_table():
+        return [('*', '*')]
+    applied = set(recorder.applied_migrations())
+
+    for app_config in apps.get_app_configs():
+        files = migration_files(app_config)
+        if files is None or any((app_config.label, name) not in applied
+                                 for name in files):
+            break
+    else:
+        return []
+
+    loader = MigrationLoader(connection)
+    return sorted(key for key in loader.graph.nodes
+                  if key not in loader.applied_migrations)
+
+
+def run_python(code, *options):
+    """Run code in a fresh interpreter from the backend directory"""
+    return subprocess.run(
+        [sys.executable, *options, '-c', code], cwd=BASE_DIR,
+        capture_output=True, text=True, check=True)
+
+
+def startup_time(code=STARTUP_CODE):
+    """Wall-clock seconds for a fresh interpreter to run ``code``"""
+    start = time.perf_counter()
+    run_python(code)
+    return time.perf_counter() - start
+
+
+def import_times(code=STARTUP_CODE):
+    """
+    Per-module import times of ``code`` from ``python -X importtime``.
+
+    Returns (module, self_us, cumulative_us) tuples in import order.
+    """
+    output = run_python(code, '-X', 'importtime').stderr
+    times = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split(
+            '|')
+        times.append((module.strip(), int(self_us), int(cumulative_us)))
+    return times
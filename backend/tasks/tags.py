@@ -0,0 +1,106 @@
+"""
+Task tags and their inverted index.
+
+Each ``TaskTag`` row maps a tag to one task carrying it, with the tag's
+owner denormalized. Tags are personal: members of a shared category put
+their own tags on its tasks. Filtering by several tags is then a single
+scan of the (user, tag, task) index: tasks with *any* of the tags are
+the task ids found, tasks with *all* of them are the ids found once per
+tag. The cost grows with the number of matching entries, not with one
+join per tag.
+``Tag.task_count`` is maintained on every change, so tag lists and
+counts never group rows.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .models import Tag, Task, TaskTag
+
+MATCH_MODES = ['all', 'any']
+
+
+def matching_task_ids(user, tag_ids, match='all'):
+    """Subquery of the ids of the tasks carrying the user's tags"""
+    tag_ids = set(tag_ids)
+    entries = TaskTag.objects.filter(user=user, tag_id__in=tag_ids)
+    if match == 'any' or len(tag_ids) == 1:
+        return entries.values('task_id')
+    return entries.values('task_id').annotate(
+        matched=Count('tag_id')).filter(matched=len(tag_ids)).values(
+        'task_id')
+
+
+def filter_by_tags(queryset, user, tag_ids, match='all'):
+    return queryset.filter(pk__in=matching_task_ids(user, tag_ids, match))
+
+
+def attach_tag_ids(tasks):
+    """
+    Load the tag ids of many tasks in one query, for serialization.
+
+    Occurrences that have no row yet show the tags of their template.
+    """
+    tasks = [task for task in tasks if not hasattr(task, 'tag_ids')]
+    keys = {task.pk or task.recurrence_parent_id for task in tasks} - {None}
+    tag_ids = {}
+    for task_id, tag_id in TaskTag.objects.filter(
+            task_id__in=keys).values_list('task_id', 'tag_id'):
+        tag_ids.setdefault(task_id, []).append(tag_id)
+    for task in tasks:
+        task.tag_ids = sorted(tag_ids.get(
+            task.pk or task.recurrence_parent_id, []))
+    return tasks
+
+
+def get_tag_ids(task):
+    if not hasattr(task, 'tag_ids'):
+        attach_tag_ids([task])
+    return task.tag_ids
+
+
+def set_tags(task, tag_ids, user=None, touch=True):
+    """
+    Replace the tags of a task, keeping tag counts in step.
+
+    With ``user`` only that user's tags are replaced and the tags other
+    members put on the task stay. With ``touch`` a change bumps the
+    task's version and ``updated_at`` and is announced like any other
+    task update.
+    """
+    tag_ids = set(tag_ids)
+    with transaction.atomic():
+        current, others = set(), set()
+        for tag_id, owner_id in TaskTag.objects.filter(
+                task=task).values_list('tag_id', 'user_id'):
+            mine = user is None or owner_id == user.pk
+            (current if mine else others).add(tag_id)
+        added, removed = tag_ids - current, current - tag_ids
+        if not added and not removed:
+            return False
+        TaskTag.objects.filter(task=task, tag_id__in=removed).delete()
+        TaskTag.objects.bulk_create([
+            TaskTag(task=task, tag_id=tag_id, user_id=owner_id)
+            for tag_id, owner_id in Tag.objects.filter(
+                pk__in=added).values_list('pk', 'user_id')
+        ])
+        if task.deleted_at is None:
+            Tag.objects.filter(pk__in=added).update(
+                task_count=F('task_count') + 1)
+            Tag.objects.filter(pk__in=removed).update(
+                task_count=F('task_count') - 1)
+        task.tag_ids = sorted(tag_ids | others)
+
+        if touch:
+            task.updated_at = timezone.now()
+            Task.all_objects.filter(pk=task.pk).update(
+                updated_at=task.updated_at, version=F('version') + 1)
+            task.version += 1
+            task._remember_loaded_values()
+            # 'tags' tells the activity log what changed
+            post_save.send(
+                sender=Task, instance=task, created=False,
+                update_fields={'updated_at', 'version', 'tags'}, raw=False,
+                using=task._state.db)
+    return True
@@ -1,3 +1,1285 @@
-from django.test import TestCase
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import time
+from datetime import datetime, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from . import checks, saved_views
+from .activity import ActivityBuffer, record
+from .authentication import stream_ticket
+from .dependencies import DependencyCycleError, add_dependency
+from .archive import archive_batch, archive_cutoff
+from .events import get_broker
+from .hashers import TunedScryptPasswordHasher
+from .log import JSONFormatter, QueueListenerHandler, SamplingFilter
+from .models import (
+    ArchivedTask, Category, SavedView, StaleTaskError, Tag, Task,
+    TaskActivity, TaskDependency, TaskReminder, User
+)
+from .recurrence import (
+    OVERDUE_LOOKBACK_DAYS, day_window, expand_occurrences,
+    iter_occurrence_dates, materialize_occurrence
+)
+from .reminders import Dispatcher, TimingWheel
+from .serializers import TaskSerializer
+from .throttling import RateLimitHeadersMiddleware, TokenBucket, get_bucket
+from .startup import (
+    STARTUP_CODE, pending_migrations, run_python, startup_time
+)
+
+# Seconds a fresh process may take to load and warm up the application.
+# Override with STARTUP_BUDGET_SECONDS on slow CI machines.
+STARTUP_BUDGET = float(os.environ.get('STARTUP_BUDGET_SECONDS', 2.0))
+
+
+class StartupBudgetTests(SimpleTestCase):
+    def test_startup_within_budget(self):
+        # The best of three runs, so a busy machine doesn't fail the test
+        elapsed = min(startup_time() for _ in range(3))
+        self.assertLess(
+            elapsed, STARTUP_BUDGET,
+            f'Startup took {elapsed:.2f}s, over the {STARTUP_BUDGET}s '
+            f'budget; see "manage.py profile_imports"')
+
+    def test_settings_import_is_silent(self):
+        self.assertEqual(run_python(STARTUP_CODE).stdout, '')
+
+
+class StructuredLoggingTests(SimpleTestCase):
+    def record(self, name='tasks', level=logging.INFO, **extra):
+        logger = logging.getLogger(name)
+        return logger.makeRecord(
+            name, level, __file__, 1, 'Task %s saved', (7,), None,
+            extra=extra)
+
+    def test_json_formatter_includes_extra_fields(self):
+        payload = json.loads(
+            JSONFormatter().format(self.record(task_id=7, user='owner')))
+        self.assertEqual(payload['message'], 'Task 7 saved')
+        self.assertEqual(payload['level'], 'INFO')
+        self.assertEqual((payload['task_id'], payload['user']), (7, 'owner'))
+
+    def test_sampling_by_logger(self):
+        sampler = SamplingFilter({'django.server': 0, 'django.db': 0.5})
+        self.assertFalse(sampler.filter(self.record('django.server')))
+        self.assertTrue(sampler.filter(
+            self.record('django.server', logging.WARNING)))
+        self.assertTrue(sampler.filter(self.record('tasks')))
+        with mock.patch('tasks.log.random.random', side_effect=[0.4, 0.6]):
+            self.assertTrue(sampler.filter(self.record('django.db.backends')))
+            self.assertFalse(
+                sampler.filter(self.record('django.db.backends')))
+
+    def test_queue_handler_formats_on_the_listener(self):
+        target = logging.handlers.BufferingHandler(10)
+        target.setFormatter(JSONFormatter())
+        handler = QueueListenerHandler([target])
+        self.addCleanup(handler.close)
+        handler.handle(self.record(task_id=7))
+        handler._stop()  # Drains the queue
+        self.assertEqual(
+            [json.loads(target.format(record))['task_id']
+             for record in target.buffer], [7])
+
+    def test_full_queue_drops_and_reports(self):
+        handler = QueueListenerHandler([logging.NullHandler()], queue_size=2)
+        self.addCleanup(handler.close)
+        handler._stop()
+        for _ in range(4):
+            handler.handle(self.record())
+        self.assertEqual(handler.dropped, 2)
+        while not handler.queue.empty():
+            handler.queue.get_nowait()
+        handler.handle(self.record())
+        messages = [handler.queue.get_nowait().getMessage()
+                    for _ in range(2)]
+        self.assertEqual(messages, [
+            'Task 7 saved', '2 log records dropped, the queue was full'])
+
+
+class PendingMigrationsTests(TestCase):
+    def test_no_pending_migrations_after_migrate(self):
+        self.assertEqual(pending_migrations(), [])
+
+    def test_unapplied_migration_is_reported(self):
+        from django.db.migrations.recorder import MigrationRecorder
+
+        MigrationRecorder.Migration.objects.filter(
+            app='tasks', name='0001_initial').delete()
+        self.assertIn(('tasks', '0001_initial'), pending_migrations())
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        # Fails with the offending requests when one scans a large table
+        call_command('audit_indexes', check=True, tasks=5000, users=10,
+                     stdout=open(os.devnull, 'w'))
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Partitioning requires PostgreSQL')
+class PartitionTasksTests(TestCase):
+    def test_partitioned_table_keeps_constraint_names(self):
+        user = User.objects.create_user('owner', 'owner@example.com')
+        Task.objects.create(title='Task', user=user)
+        for phase in ('prepare', 'copy', 'swap'):
+            call_command('partition_tasks', phase, partitions=4,
+                         stdout=open(os.devnull, 'w'))
+        self.assertEqual(Task.objects.filter(user=user).count(), 1)
+
+        # What later migrations run against the table
+        constraint, = (constraint for constraint in Task._meta.constraints
+                       if constraint.name == 'unique_task_occurrence')
+        with connection.schema_editor() as editor:
+            editor.remove_constraint(Task, constraint)
+            editor.remove_index(Task, Task._meta.indexes[0])
+            editor.add_index(Task, Task._meta.indexes[0])
+
+
+class SharedCacheChecksTests(SimpleTestCase):
+    def test_throttle_buckets_need_a_shared_cache(self):
+        self.assertEqual(checks.check_throttle_cache(None), [])
+        with self.settings(WEB_WORKERS=4):
+            self.assertEqual(
+                [message.id for message in checks.check_throttle_cache(None)],
+                ['tasks.W003'])
+        with self.settings(WEB_WORKERS=4, CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': 'redis://localhost:6379'}}):
+            self.assertEqual(checks.check_throttle_cache(None), [])
+
+    def test_production_cors_must_be_restricted(self):
+        with self.settings(DEBUG=False, CORS_ALLOW_ALL_ORIGINS=True):
+            self.assertEqual(
+                [message.id for message in checks.check_cors_origins(None)],
+                ['tasks.W004'])
+        with self.settings(DEBUG=False, CORS_ALLOW_ALL_ORIGINS=False):
+            self.assertEqual(checks.check_cors_origins(None), [])
+
+
+# Requests are made over plain HTTP whatever DEBUG is
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TaskAPITestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'owner', 'owner@example.com', 'owner-password')
+        self.client.force_authenticate(self.user)
+
+
+THROTTLE = {'CAPACITY': 20, 'RATE': 1, 'ANON_CAPACITY': 5, 'ANON_RATE': 1,
+            'COSTS': {'list': 2, 'search': 5, 'statistics': 10,
+                      'login_user': 2}}
+
+
+@override_settings(TASK_THROTTLE=THROTTLE)
+class ThrottleTests(TaskAPITestCase):
+    def setUp(self):
+        super().setUp()
+        # User pks repeat across tests; don't leave them a drained bucket
+        key = f'throttle:user:{self.user.pk}'
+        get_bucket().cache.delete(key)
+        self.addCleanup(get_bucket().cache.delete, key)
+
+    def rate_limit(self, response):
+        return {name: int(response[header]) for name, header
+                in RateLimitHeadersMiddleware.HEADERS.items()}
+
+    def test_requests_spend_their_cost(self):
+        expected = [('/api/tasks/', 2, 18), ('/api/tasks/?search=x', 5, 13),
+                    ('/api/tasks/statistics/', 10, 3)]
+        for url, cost, remaining in expected:
+            rate_limit = self.rate_limit(self.client.get(url))
+            self.assertEqual(
+                (rate_limit['limit'], rate_limit['cost'],
+                 rate_limit['remaining']), (20, cost, remaining), url)
+        self.assertEqual(rate_limit['reset'], 17)
+
+    def test_drained_bucket_is_throttled(self):
+        for _ in range(2):
+            response = self.client.get('/api/tasks/statistics/')
+            self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/tasks/statistics/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '10')
+        self.assertEqual(self.rate_limit(response)['remaining'], 0)
+        # Cheaper requests still fit in what is left
+        self.assertEqual(self.client.get('/api/tasks/').status_code, 429)
+
+    def test_tokens_refill(self):
+        start = time.time()
+        with mock.patch('tasks.throttling.time') as clock:
+            clock.time.return_value = start
+            for _ in range(2):
+                self.client.get('/api/tasks/statistics/')
+            self.assertEqual(
+                self.client.get('/api/tasks/statistics/').status_code, 429)
+            clock.time.return_value = start + 9
+            self.assertEqual(
+                self.client.get('/api/tasks/statistics/').status_code, 429)
+            clock.time.return_value = start + 10
+            response = self.client.get('/api/tasks/statistics/')
+            self.assertEqual(response.status_code, 200)
+            # Never more than the capacity
+            clock.time.return_value = start + 3600
+            response = self.client.get('/api/tasks/')
+            self.assertEqual(self.rate_limit(response)['remaining'], 18)
+
+    def test_anonymous_clients_have_their_own_bucket(self):
+        self.client.force_authenticate(None)
+        get_bucket().cache.delete('throttle:anon:127.0.0.1')
+        self.addCleanup(get_bucket().cache.delete, 'throttle:anon:127.0.0.1')
+        statuses = [self.client.post('/api/auth/login/', {
+            'username': 'owner', 'password': 'wrong'}).status_code
+            for _ in range(3)]
+        self.assertEqual(statuses, [400, 400, 429])
+        # The user's bucket is untouched
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/tasks/')
+        self.assertEqual(self.rate_limit(response)['remaining'], 18)
+
+
+@skipUnless(os.environ.get('REDIS_URL'), 'Needs a Redis server (REDIS_URL)')
+class RedisTokenBucketTests(SimpleTestCase):
+    def test_lua_script_spends_and_refills(self):
+        with self.settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': os.environ['REDIS_URL']}}):
+            bucket = TokenBucket('default')
+            self.assertIsNotNone(bucket._script)
+            key = f'throttle:test:{time.time_ns()}'
+            self.assertEqual(bucket.consume(key, 10, 100, 6)[0], True)
+            allowed, remaining = bucket.consume(key, 10, 100, 6)
+            self.assertFalse(allowed)
+            self.assertLess(remaining, 6)
+            time.sleep(0.1)
+            allowed, remaining = bucket.consume(key, 10, 100, 6)
+            self.assertTrue(allowed)
+            self.assertLessEqual(remaining, 4)
+            bucket.cache.delete(key)
+
+
+class CompressionTests(TaskAPITestCase):
+    def setUp(self):
+        super().setUp()
+        Task.objects.bulk_create(
+            Task(title=f'Task {number}', description='x' * 100,
+                 user=self.user)
+            for number in range(20))
+        self.url = '/api/dashboard/?sections=tasks,statistics'
+
+    def test_responses_are_compressed_when_accepted(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertEqual(
+            json.loads(gzip.decompress(response.content))['sections'].keys(),
+            {'tasks', 'statistics'})
+        for header in ('', 'gzip;q=0, identity'):
+            response = self.client.get(
+                self.url, HTTP_ACCEPT_ENCODING=header)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertTrue(response['ETag'].startswith('"'))
+
+    def test_compressed_etag_revalidates(self):
+        etag = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        response = self.client.get(
+            self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        for header in (f'"other", {etag}', '*'):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(response.status_code, 304, header)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_weak_if_match_is_accepted(self):
+        url = f'/api/tasks/{Task.objects.first().pk}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.patch(
+            url, {'title': 'Renamed'}, format='json',
+            HTTP_IF_MATCH=f'W/{etag}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_control_per_endpoint(self):
+        response = self.client.get('/api/tasks/')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertIn('Authorization', response['Vary'])
+        response = self.client.get('/api/tasks/trends/')
+        self.assertEqual(response['Cache-Control'], 'private, max-age=300')
+        response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response['Cache-Control'], 'no-store')
+
+
+class RecurrenceTests(TaskAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+
+    def template(self, recurrence='daily', due_date=None, **fields):
+        return Task.objects.create(
+            title='Recurring', user=self.user, recurrence=recurrence,
+            due_date=due_date or self.now - timedelta(days=10, hours=1),
+            **fields)
+
+    def titles_and_dates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [(task['title'], task['due_date'])
+                          for task in response.data['results']]
+
+    def test_daily_and_weekly_rules(self):
+        start = timezone.make_aware(datetime(2026, 1, 1, 9))
+        daily = Task(recurrence='daily', recurrence_interval=2,
+                     due_date=start)
+        self.assertEqual(
+            [value.day for value in iter_occurrence_dates(
+                daily, start + timedelta(days=3), start + timedelta(days=9))],
+            [5, 7, 9])
+        weekly = Task(recurrence='weekly', due_date=start,
+                      recurrence_until=start + timedelta(weeks=2))
+        self.assertEqual(
+            list(iter_occurrence_dates(weekly, start - timedelta(days=7),
+                                       start + timedelta(days=60))),
+            [start, start + timedelta(weeks=1), start + timedelta(weeks=2)])
+        monthly = Task(recurrence='monthly',
+                       due_date=start.replace(day=31))
+        self.assertEqual(
+            [value.date().isoformat() for value in iter_occurrence_dates(
+                monthly, start, start.replace(month=4))],
+            ['2026-01-31', '2026-02-28', '2026-03-31'])
+
+    def test_changed_and_deleted_occurrences_are_exceptions(self):
+        template = self.template()
+        start, end = day_window(timezone.localdate(self.now) +
+                                timedelta(days=1), days=3)
+        first, second, third = iter_occurrence_dates(template, start, end)
+        materialize_occurrence(template, first).soft_delete()
+        edited = materialize_occurrence(template, second)
+        self.assertEqual(
+            [task.occurrence_date for task in expand_occurrences(
+                Task.objects.all(), start, end)], [third])
+        self.assertEqual(materialize_occurrence(template, second), edited)
+
+    def test_today_lists_occurrences(self):
+        today, _ = day_window(timezone.localdate(self.now))
+        self.template(due_date=today + timedelta(days=-10, hours=12))
+        Task.objects.create(title='Stored', user=self.user,
+                            due_date=today + timedelta(hours=12))
+        _, tasks = self.titles_and_dates('/api/tasks/today/')
+        self.assertEqual(sorted(title for title, _ in tasks),
+                         ['Recurring', 'Stored'])
+
+    def test_occurrences_follow_the_filters(self):
+        category = Category.objects.create(name='Home', user=self.user)
+        self.template(category=category)
+        _, tasks = self.titles_and_dates(
+            f'/api/tasks/overdue/?category={category.pk}')
+        self.assertEqual(len(tasks), OVERDUE_LOOKBACK_DAYS)
+        other = Category.objects.create(name='Work', user=self.user)
+        _, tasks = self.titles_and_dates(
+            f'/api/tasks/overdue/?category={other.pk}')
+        self.assertEqual(tasks, [])
+
+    def test_shared_templates_are_expanded(self):
+        category = Category.objects.create(name='Shared', user=self.user)
+        self.template(category=category)
+        member = User.objects.create_user('member', 'member@example.com')
+        category.memberships.create(user=member, role='viewer')
+        self.client.force_authenticate(member)
+        _, tasks = self.titles_and_dates('/api/tasks/overdue/')
+        self.assertEqual(len(tasks), OVERDUE_LOOKBACK_DAYS)
+
+    def test_overdue_window(self):
+        template = self.template()
+        response, tasks = self.titles_and_dates('/api/tasks/overdue/')
+        # One missed occurrence a day within the lookback, newest last
+        self.assertEqual(len(tasks), OVERDUE_LOOKBACK_DAYS)
+        since = datetime.fromisoformat(
+            response['X-Recurring-Overdue-Since'])
+        self.assertAlmostEqual(
+            (self.now - since).total_seconds(),
+            OVERDUE_LOOKBACK_DAYS * 86400, delta=60)
+        self.assertTrue(all(datetime.fromisoformat(due_date) >= since
+                            for _, due_date in tasks))
+        # Completing an occurrence takes it off the list
+        occurrence = materialize_occurrence(
+            template, datetime.fromisoformat(tasks[0][1]))
+        occurrence.set_status('completed')
+        self.assertEqual(
+            len(self.titles_and_dates('/api/tasks/overdue/')[1]),
+            OVERDUE_LOOKBACK_DAYS - 1)
+
+
+class WindowPaginationTests(TaskAPITestCase):
+    def setUp(self):
+        super().setUp()
+        today, _ = day_window(timezone.localdate())
+        # Eight daily occurrences between stored tasks of every priority
+        Task.objects.create(
+            title='Daily', user=self.user, recurrence='daily', priority=2,
+            due_date=today + timedelta(days=-3, hours=12))
+        for day in range(8):
+            for priority in (1, 3):
+                Task.objects.create(
+                    title=f'Stored {day}/{priority}', user=self.user,
+                    priority=priority,
+                    due_date=today + timedelta(days=day, hours=day % 3 * 6))
+        self.url = '/api/tasks/this_week/'
+
+    def keys(self, tasks):
+        return [(task['title'], task['due_date']) for task in tasks]
+
+    def test_pages_merge_occurrences_in_order(self):
+        response = self.client.get(f'{self.url}?page_size=100')
+        everything = response.data['results']
+        self.assertEqual(response.data['count'], 24)
+        self.assertEqual(
+            [task['priority'] for task in everything],
+            [3] * 8 + [2] * 8 + [1] * 8)
+        self.assertEqual(
+            sum(task['title'] == 'Daily' for task in everything), 8)
+
+        paged, url = [], f'{self.url}?page_size=5'
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data['results']), 5)
+            paged += response.data['results']
+            url = response.data['next']
+        self.assertEqual(self.keys(paged), self.keys(everything))
+
+    def test_page_size_is_capped(self):
+        Task.objects.bulk_create(
+            Task(title='Extra', user=self.user, due_date=timezone.now())
+            for _ in range(120))
+        response = self.client.get(f'{self.url}?page_size=1000')
+        self.assertEqual(response.data['count'], 144)
+        self.assertEqual(len(response.data['results']), 100)
+
+    def test_stream_with_sparse_fields(self):
+        expected = self.client.get(f'{self.url}?page_size=100')
+        response = self.client.get(
+            f'{self.url}?stream=1&fields=title,due_date')
+        self.assertTrue(response.streaming)
+        streamed = json.loads(b''.join(response.streaming_content))
+        self.assertEqual({tuple(task) for task in streamed},
+                         {('title', 'due_date')})
+        self.assertEqual(self.keys(streamed),
+                         self.keys(expected.data['results']))
+
+
+class SparseFieldsTests(TaskAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(
+            title='Task', description='Long text', user=self.user)
+
+    def test_fields_omit_and_compact(self):
+        response = self.client.get('/api/tasks/?fields=id,title')
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title'])
+        response = self.client.get('/api/tasks/?omit=description,tags')
+        task = response.data['results'][0]
+        self.assertNotIn('description', task)
+        self.assertIn('title', task)
+        response = self.client.get('/api/tasks/?compact=1')
+        self.assertEqual(set(response.data['results'][0]),
+                         set(TaskSerializer.compact_fields))
+        response = self.client.get('/api/tasks/?fields=id,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', str(response.data['fields']))
+
+    def test_sparse_fields_narrow_the_select(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/tasks/?fields=id,title')
+        select = next(query['sql'] for query in queries
+                      if 'FROM "tasks_task"' in query['sql']
+                      and 'LIMIT' in query['sql'])
+        self.assertNotIn('"description"', select)
+
+    def test_sparse_detail_keeps_its_etag(self):
+        url = f'/api/tasks/{self.task.pk}/'
+        response = self.client.get(f'{url}?fields=title')
+        self.assertEqual(response.data, {'title': 'Task'})
+        self.assertEqual(response['ETag'], f'"{self.task.version}"')
+        response = self.client.patch(
+            url, {'title': 'Renamed'}, format='json',
+            HTTP_IF_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PasswordHashingTests(APITestCase):
+    def setUp(self):
+        self.hasher = get_hasher()
+        encode = type(self.hasher).encode
+        patcher = mock.patch.object(
+            type(self.hasher), 'encode', autospec=True, side_effect=encode)
+        self.encode = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_signup_hashes_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/auth/register/', {
+                'username': 'new', 'email': 'new@example.com',
+                'password': 'long-password', 'password_confirm':
+                'long-password'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.encode.call_count, 1)
+        writes = [query['sql'] for query in queries
+                  if '"tasks_user"' in query['sql']
+                  and query['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(writes), 1)
+        password = User.objects.get(username='new').password
+        self.assertTrue(password.startswith(f'{self.hasher.algorithm}$'))
+
+    def test_login_upgrades_outdated_hashes(self):
+        user = User.objects.create_user('old', password='old-password')
+        User.objects.filter(pk=user.pk).update(password=make_password(
+            'old-password', hasher='pbkdf2_sha256'))
+        response = self.client.post('/api/auth/login/', {
+            'username': 'old', 'password': 'old-password'})
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(
+            user.password.startswith(f'{self.hasher.algorithm}$'))
+
+    def test_hasher_parameters_come_from_settings(self):
+        hasher = TunedScryptPasswordHasher()
+        encoded = hasher.encode('password', hasher.salt())
+        self.assertEqual(hasher.decode(encoded)['work_factor'], 2 ** 14)
+        with override_settings(PASSWORD_HASHING={
+                'SCRYPT_WORK_FACTOR': 2 ** 12}):
+            self.assertTrue(hasher.must_update(encoded))
+            encoded = hasher.encode('password', hasher.salt())
+            self.assertEqual(hasher.decode(encoded)['work_factor'], 2 ** 12)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RequestPipelineTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'owner', 'owner@example.com', 'owner-password')
+        self.token = Token.objects.create(user=self.user)
+
+    def test_token_requests_skip_the_session_stack(self):
+        response = self.client.get(
+            '/api/tasks/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(response.status_code, 200)
+        request = response.wsgi_request
+        self.assertTrue(request.api_pipeline)
+        self.assertFalse(hasattr(request, 'session'))
+        self.assertNotIn('Set-Cookie', response)
+
+    def test_other_requests_keep_the_full_stack(self):
+        for path, headers in (
+                ('/api/tasks/', {'HTTP_ACCEPT': 'text/html'}),
+                ('/api/auth/login/', {}),
+                ('/api/tasks/', {'HTTP_AUTHORIZATION': 'Basic x'})):
+            headers.setdefault(
+                'HTTP_AUTHORIZATION', f'Token {self.token.key}')
+            request = self.client.get(path, **headers).wsgi_request
+            self.assertFalse(request.api_pipeline, path)
+            self.assertTrue(hasattr(request, 'session'), path)
+
+    @override_settings(API_PIPELINE={'TIMING': True})
+    def test_server_timing_lists_the_middleware_run(self):
+        response = self.client.get(
+            '/api/tasks/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        metrics = [metric.split(';')[0]
+                   for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual(metrics[-2:], ['view', 'total'])
+        self.assertIn('CorsMiddleware', metrics)
+        self.assertNotIn('SessionMiddleware', metrics)
+        response = self.client.get('/api/tasks/', HTTP_ACCEPT='text/html')
+        self.assertIn('SessionMiddleware', response['Server-Timing'])
+
+
+class DependencyTests(TaskAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.blocker = Task.objects.create(title='Blocker', user=self.user)
+        self.task = Task.objects.create(title='Blocked', user=self.user)
+        TaskDependency.objects.create(
+            task=self.task, depends_on=self.blocker, user=self.user)
+        self.url = f'/api/tasks/{self.task.pk}/dependencies/'
+
+    def test_remove_dependency(self):
+        response = self.client.delete(
+            self.url, {'depends_on': self.blocker.pk}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(self.task.dependencies.exists())
+
+    def test_remove_requires_an_id(self):
+        for data in ({}, {'depends_on': 'abc'}):
+            response = self.client.delete(self.url, data, format='json')
+            self.assertEqual(response.status_code, 400, data)
+        self.assertTrue(self.task.dependencies.exists())
+
+    def test_remove_missing_dependency(self):
+        response = self.client.delete(
+            self.url, {'depends_on': self.task.pk}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+class SharedDependencyTests(TaskAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.editor = User.objects.create_user('editor', 'editor@example.com')
+        category = Category.objects.create(name='Shared', user=self.user)
+        category.memberships.create(user=self.editor, role='editor')
+        self.shared = Task.objects.create(
+            title='Shared', user=self.user, category=category)
+        self.own = Task.objects.create(title='Own', user=self.editor)
+
+    def depend(self, user, task, depends_on):
+        self.client.force_authenticate(user)
+        return self.client.post(
+            f'/api/tasks/{task.pk}/dependencies/',
+            {'depends_on': depends_on.pk}, format='json')
+
+    def test_cycle_across_owners_is_rejected(self):
+        response = self.depend(self.editor, self.shared, self.own)
+        self.assertEqual(response.status_code, 201)
+        response = self.depend(self.editor, self.own, self.shared)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cycle', response.data['depends_on'][0])
+
+    def test_cycle_through_a_third_owner_is_rejected(self):
+        third = User.objects.create_user('third', 'third@example.com')
+        theirs = Task.objects.create(title='Theirs', user=third)
+        add_dependency(self.shared, self.own)
+        add_dependency(self.own, theirs)
+        # theirs -> shared closes shared -> own -> theirs, whose middle
+        # edge belongs to neither end's owner
+        with self.assertRaises(DependencyCycleError):
+            add_dependency(theirs, self.shared)
+
+    def test_blockers_must_be_visible(self):
+        response = self.depend(self.user, self.shared, self.own)
+        self.assertEqual(response.status_code, 400)
+
+
+class EventStreamTests(TaskAPITestCase):
+    def setUp(self):
+        super().setUp()
+        ticket = self.client.post('/api/events/ticket/').data['ticket']
+        self.client.force_authenticate(None)
+        self.url = f'/api/events/?ticket={ticket}'
+
+    def test_ticket_opens_the_stream(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.wsgi_request.api_pipeline)
+        response.close()
+
+    def test_api_token_is_not_accepted_in_the_url(self):
+        key = Token.objects.create(user=self.user).key
+        response = self.client.get(
+            f'/api/events/?token={key}', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 403)
+        # Not taken for a token-authenticated request either
+        self.assertFalse(response.wsgi_request.api_pipeline)
+        response = self.client.get(
+            f'/api/events/?ticket={key}', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 403)
+
+    def test_tickets_expire(self):
+        with mock.patch('time.time', return_value=time.time() - 120):
+            ticket = stream_ticket(self.user)
+        response = self.client.get(
+            f'/api/events/?ticket={ticket}', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['detail'], 'Expired ticket.')
+
+    @override_settings(TASK_EVENTS={
+        'STREAM_SECONDS': 0.1, 'KEEPALIVE_SECONDS': 0.1, 'MAX_STREAMS': 1})
+    def test_streams_are_limited_per_process(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 200)
+        # The open stream holds the only slot until it is closed
+        busy = self.client.get(self.url, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(busy.status_code, 503)
+        b''.join(response.streaming_content)
+        response = self.client.get(self.url, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_several_workers_need_a_shared_broker(self):
+        with self.settings(WEB_WORKERS=4, TASK_EVENTS={
+                'BACKEND': 'tasks.events.InProcessBroker'}):
+            self.assertEqual(
+                [message.id for message in checks.check_event_broker(None)],
+                ['tasks.W001'])
+        with self.settings(WEB_WORKERS=4, TASK_EVENTS={
+                'BACKEND': 'tasks.events.CacheBroker'}):
+            self.assertEqual(
+                [message.id for message in checks.check_event_broker(None)],
+                ['tasks.W002'])
+        self.assertEqual(checks.check_event_broker(None), [])
+
+
+class OptimisticConcurrencyTests(TaskAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(title='Task', user=self.user)
+        self.url = f'/api/tasks/{self.task.pk}/'
+
+    def test_update_with_current_version(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(
+            self.url, {'title': 'Renamed'}, format='json',
+            HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{self.task.version + 1}"')
+
+    def test_stale_if_match_is_rejected(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(self.url, {'title': 'First'}, format='json')
+        for method, path in (('patch', self.url),
+                             ('post', f'{self.url}mark_completed/')):
+            response = getattr(self.client, method)(
+                path, {'title': 'Second'}, format='json',
+                HTTP_IF_MATCH=etag)
+            self.assertEqual(response.status_code, 412, path)
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.title, self.task.status),
+                         ('First', 'pending'))
+
+    def test_malformed_if_match_is_rejected(self):
+        response = self.client.patch(
+            self.url, {'title': 'Renamed'}, format='json',
+            HTTP_IF_MATCH='"abc"')
+        self.assertEqual(response.status_code, 412)
+
+    def test_concurrent_save_raises(self):
+        first = Task.objects.get(pk=self.task.pk)
+        second = Task.objects.get(pk=self.task.pk)
+        first.title = 'First'
+        first.save()
+        second.title = 'Second'
+        with self.assertRaises(StaleTaskError):
+            second.save()
+        self.assertEqual(second.version, first.version - 1)
+        self.assertEqual(Task.objects.get(pk=self.task.pk).title, 'First')
+
+    def test_concurrent_status_change_raises(self):
+        first = Task.objects.get(pk=self.task.pk)
+        second = Task.objects.get(pk=self.task.pk)
+        self.assertTrue(first.set_status('completed'))
+        with self.assertRaises(StaleTaskError):
+            second.set_status('in_progress')
+        self.assertEqual(
+            Task.objects.get(pk=self.task.pk).status, 'completed')
+
+    def test_save_writes_only_changed_fields(self):
+        # Changed behind the instance's back without a version bump
+        Task.objects.filter(pk=self.task.pk).update(description='Kept')
+        self.task.title = 'Renamed'
+        with CaptureQueriesContext(connection) as queries:
+            self.task.save()
+        update, = (query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE "tasks_task"'))
+        self.assertNotIn('"description"', update)
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.title, self.task.description),
+                         ('Renamed', 'Kept'))
+
+    def test_unchanged_save_writes_nothing(self):
+        with self.assertNumQueries(0):
+            self.task.save()
+
+
+class SoftDeleteTests(TaskAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = Task.objects.create(title='Root', user=self.user)
+        self.child = Task.objects.create(
+            title='Child', user=self.user, parent=self.root)
+        self.grandchild = Task.objects.create(
+            title='Grandchild', user=self.user, parent=self.child,
+            status='completed')
+
+    def rollups(self):
+        self.root.refresh_from_db()
+        return (self.root.child_count, self.root.descendant_count,
+                self.root.completed_descendant_count)
+
+    def test_delete_tombstones_the_subtree(self):
+        response = self.client.delete(f'/api/tasks/{self.child.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(Task.objects.values_list('title', flat=True)),
+                         ['Root'])
+        self.assertEqual(Task.all_objects.filter(
+            deleted_at__isnull=False).count(), 2)
+        self.assertEqual(self.rollups(), (0, 0, 0))
+        response = self.client.get(f'/api/tasks/{self.child.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_restore_brings_back_the_subtree(self):
+        self.client.delete(f'/api/tasks/{self.child.pk}/')
+        response = self.client.post(f'/api/tasks/{self.child.pk}/restore/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Task.objects.count(), 3)
+        self.assertEqual(self.rollups(), (1, 2, 1))
+
+    def test_restore_keeps_separately_deleted_tasks(self):
+        self.client.delete(f'/api/tasks/{self.grandchild.pk}/')
+        self.client.delete(f'/api/tasks/{self.child.pk}/')
+        self.client.post(f'/api/tasks/{self.child.pk}/restore/')
+        self.assertEqual(list(Task.objects.order_by('pk').values_list(
+            'title', flat=True)), ['Root', 'Child'])
+        self.assertEqual(self.rollups(), (1, 1, 0))
+
+    def test_restore_requires_the_parent(self):
+        self.client.delete(f'/api/tasks/{self.grandchild.pk}/')
+        self.client.delete(f'/api/tasks/{self.child.pk}/')
+        response = self.client.post(
+            f'/api/tasks/{self.grandchild.pk}/restore/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_hard_delete_of_a_tombstone(self):
+        self.child.soft_delete()
+        Task.all_objects.get(pk=self.child.pk).delete()
+        self.assertEqual(Task.all_objects.count(), 1)
+        # The rollups were adjusted when the subtree was tombstoned
+        self.assertEqual(self.rollups(), (0, 0, 0))
+
+
+class ArchiveTests(TaskAPITestCase):
+    def test_archived_tasks_are_not_reported_as_deleted(self):
+        task = Task.objects.create(
+            title='Done', user=self.user, status='completed')
+        Task.objects.filter(pk=task.pk).update(
+            completed_at=timezone.now() - timedelta(days=365))
+        last_event_id = get_broker().last_id(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive_batch(archive_cutoff(), 100), 1)
+        self.assertTrue(ArchivedTask.objects.filter(pk=task.pk).exists())
+        self.assertEqual(
+            list(TaskActivity.objects.filter(task_id=task.pk).exclude(
+                action=TaskActivity.CREATED).values_list('action', 'changes')),
+            [(TaskActivity.ARCHIVED, None)])
+        events, _ = get_broker().read(self.user.pk, last_event_id)
+        self.assertEqual([event['type'] for event in events],
+                         ['task.archived'])
+
+
+class SavedViewTests(TaskAPITestCase):
+    def setUp(self):
+        super().setUp()
+        saved_views.get_cache().clear()
+        self.urgent = Task.objects.create(
+            title='Urgent', user=self.user, priority=3)
+        Task.objects.create(title='Later', user=self.user, priority=1)
+
+    def create_view(self, query):
+        return self.client.post('/api/views/', {
+            'name': 'Urgent', 'query': query}, format='json')
+
+    def open_view(self, view_id):
+        response = self.client.get(f'/api/tasks/?view={view_id}')
+        self.assertEqual(response.status_code, 200)
+        return ([task['id'] for task in response.data['results']],
+                response['X-Saved-View-Cache'])
+
+    def test_create_and_open(self):
+        response = self.create_view(
+            {'priority': 3, 'ordering': '-created_at'})
+        self.assertEqual(response.status_code, 201)
+        view_id = response.data['id']
+        self.assertEqual(self.open_view(view_id), ([self.urgent.pk], 'miss'))
+        self.assertEqual(self.open_view(view_id), ([self.urgent.pk], 'hit'))
+
+    def test_invalid_queries_are_rejected(self):
+        for query in ({'status': 'nope'}, {'priority': 'x'},
+                      {'tags': 'abc'}, {'tags': '1', 'tag_match': 'some'},
+                      {'ordering': 'title'}, {'status_filter': 'someday'},
+                      {'category': 999}, {'colour': 'red'}):
+            response = self.create_view(query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn('query', response.data)
+        self.assertFalse(SavedView.objects.exists())
+
+        view_id = self.create_view({'priority': 3}).data['id']
+        response = self.client.patch(
+            f'/api/views/{view_id}/', {'query': {'status': 'nope'}},
+            format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.open_view(view_id)[0], [self.urgent.pk])
+
+    def test_changes_invalidate_the_cached_list(self):
+        view_id = self.create_view({'priority': 3}).data['id']
+        self.open_view(view_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(
+                title='Also urgent', user=self.user, priority=3)
+        self.assertEqual(self.open_view(view_id),
+                         ([task.pk, self.urgent.pk], 'miss'))
+        # Editing the view starts a new list too
+        self.client.patch(f'/api/views/{view_id}/', {
+            'query': {'priority': 1}}, format='json')
+        ids, cache = self.open_view(view_id)
+        self.assertEqual((len(ids), cache), (1, 'miss'))
+
+    def test_other_users_changes_keep_the_cached_list(self):
+        view_id = self.create_view({'priority': 3}).data['id']
+        self.open_view(view_id)
+        other = User.objects.create_user('other', 'other@example.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(title='Theirs', user=other, priority=3)
+        self.assertEqual(self.open_view(view_id), ([self.urgent.pk], 'hit'))
+
+
+class RecordingSink:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, notifications):
+        self.sent.extend(item['reminder'] for item in notifications)
+
+
+class ReminderTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        user = User.objects.create_user('owner', 'owner@example.com')
+        self.task = Task.objects.create(
+            title='Task', user=user, due_date=self.now + timedelta(days=1))
+        self.sink = RecordingSink()
+        self.dispatcher = Dispatcher(sinks=[self.sink], now=self.now)
+
+    def remind(self, seconds, offset=timedelta(hours=1)):
+        return TaskReminder.objects.create(
+            task=self.task, user=self.task.user, offset=offset,
+            remind_at=self.now + timedelta(seconds=seconds))
+
+    def step(self, seconds):
+        return self.dispatcher.step(self.now + timedelta(seconds=seconds))
+
+    def test_due_reminders_fire_once(self):
+        reminder = self.remind(10)
+        self.assertEqual(self.step(0), 0)
+        self.assertEqual(self.step(10), 1)
+        self.assertEqual(self.step(11), 0)
+        self.assertEqual(self.sink.sent, [reminder.pk])
+
+    def test_late_step_loads_the_next_window(self):
+        reminder = self.remind(455)
+        # A slow sink or a pause delays the step that reloads the window
+        for seconds in (0, 149, 156):
+            self.assertEqual(self.step(seconds), 0)
+        self.assertEqual(self.step(455), 1)
+        self.assertEqual(self.sink.sent, [reminder.pk])
+
+    def test_steps_later_than_the_window_catch_up(self):
+        first = self.remind(10)
+        second = self.remind(400, offset=timedelta(hours=2))
+        self.assertEqual(self.step(0), 0)
+        self.assertEqual(self.step(900), 2)
+        self.assertEqual(sorted(self.sink.sent), [first.pk, second.pk])
+
+    def test_wheel_keeps_entries_beyond_its_span(self):
+        wheel = TimingWheel(1, 10, 0)
+        wheel.schedule('late', 25)
+        self.assertIn('late', wheel)
+        self.assertEqual(wheel.advance(20), [])
+        self.assertEqual(wheel.advance(25), ['late'])
+        wheel.schedule('cancelled', 40)
+        wheel.cancel('cancelled')
+        self.assertEqual((len(wheel), wheel.advance(60)), (0, []))
+
+
+class TagTests(TaskAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.home, self.work = (Tag.objects.create(name=name, user=self.user)
+                                for name in ('home', 'work'))
+        self.both, self.home_only, self.untagged = (
+            Task.objects.create(title=title, user=self.user)
+            for title in ('Both', 'Home only', 'Untagged'))
+        self.tag(self.both, self.home, self.work)
+        self.tag(self.home_only, self.home)
+
+    def tag(self, task, *tags):
+        response = self.client.patch(
+            f'/api/tasks/{task.pk}/', {'tags': [tag.pk for tag in tags]},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def counts(self):
+        return dict(Tag.objects.values_list('name', 'task_count'))
+
+    def listed(self, query):
+        response = self.client.get(f'/api/tasks/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return sorted(task['title'] for task in response.data['results'])
+
+    def test_all_and_any_matches(self):
+        tags = f'{self.home.pk},{self.work.pk}'
+        self.assertEqual(self.listed(f'tags={tags}'), ['Both'])
+        self.assertEqual(self.listed(f'tags={tags}&tag_match=all'), ['Both'])
+        self.assertEqual(self.listed(f'tags={tags}&tag_match=any'),
+                         ['Both', 'Home only'])
+        self.assertEqual(self.listed(f'tags={self.work.pk}'), ['Both'])
+
+    def test_counts_follow_tagging(self):
+        self.assertEqual(self.counts(), {'home': 2, 'work': 1})
+        self.tag(self.both, self.work)
+        self.tag(self.untagged, self.home, self.work)
+        self.assertEqual(self.counts(), {'home': 2, 'work': 2})
+        response = self.client.get('/api/tags/')
+        self.assertEqual([(tag['name'], tag['task_count'])
+                          for tag in response.data['results']],
+                         [('home', 2), ('work', 2)])
+
+    def test_counts_follow_soft_delete_restore_and_purge(self):
+        self.client.delete(f'/api/tasks/{self.both.pk}/')
+        self.assertEqual(self.counts(), {'home': 1, 'work': 0})
+        self.client.post(f'/api/tasks/{self.both.pk}/restore/')
+        self.assertEqual(self.counts(), {'home': 2, 'work': 1})
+        self.client.delete(f'/api/tasks/{self.both.pk}/')
+        Task.all_objects.filter(pk=self.both.pk).update(
+            deleted_at=timezone.now() - timedelta(days=365))
+        call_command('purge_tombstones', stdout=open(os.devnull, 'w'))
+        self.assertFalse(Task.all_objects.filter(pk=self.both.pk).exists())
+        self.assertEqual(self.counts(), {'home': 1, 'work': 0})
+        # Hard deleting a live task
+        self.home_only.delete()
+        self.assertEqual(self.counts(), {'home': 0, 'work': 0})
+
+    def test_archived_tasks_keep_their_tag_names(self):
+        self.both.set_status('completed')
+        Task.objects.filter(pk=self.both.pk).update(
+            completed_at=timezone.now() - timedelta(days=365))
+        self.assertEqual(archive_batch(archive_cutoff(), 100), 1)
+        self.assertEqual(self.counts(), {'home': 1, 'work': 0})
+        self.assertEqual(ArchivedTask.objects.get(pk=self.both.pk).tags, [
+            {'user': self.user.pk, 'name': 'home'},
+            {'user': self.user.pk, 'name': 'work'}])
+
+
+class SharingTests(TaskAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Shared', user=self.user)
+        self.task = Task.objects.create(
+            title='Shared task', user=self.user, category=self.category)
+        self.members_url = f'/api/categories/{self.category.pk}/members/'
+        self.task_url = f'/api/tasks/{self.task.pk}/'
+        self.viewer, self.editor, self.outsider = (
+            User.objects.create_user(name, f'{name}@example.com')
+            for name in ('viewer', 'editor', 'outsider'))
+        for member, role in ((self.viewer, 'viewer'),
+                             (self.editor, 'editor')):
+            response = self.client.post(
+                self.members_url,
+                {'username': member.username, 'role': role}, format='json')
+            self.assertEqual(response.status_code, 201)
+
+    def as_user(self, user):
+        self.client.force_authenticate(user)
+
+    def test_members_see_shared_tasks(self):
+        for member in (self.viewer, self.editor):
+            self.as_user(member)
+            response = self.client.get('/api/tasks/')
+            self.assertEqual([task['id'] for task in response.data['results']],
+                             [self.task.pk])
+            self.assertEqual(self.client.get(self.task_url).status_code, 200)
+        self.as_user(self.outsider)
+        self.assertEqual(self.client.get('/api/tasks/').data['count'], 0)
+        self.assertEqual(self.client.get(self.task_url).status_code, 404)
+
+    def test_viewer_cannot_write(self):
+        self.as_user(self.viewer)
+        for method, path in (('patch', self.task_url),
+                             ('delete', self.task_url),
+                             ('post', f'{self.task_url}mark_completed/')):
+            response = getattr(self.client, method)(
+                path, {'title': 'Changed'}, format='json')
+            self.assertEqual(response.status_code, 403, path)
+        response = self.client.post('/api/tasks/', {
+            'title': 'New', 'category': self.category.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.title, self.task.status),
+                         ('Shared task', 'pending'))
+
+    def test_editor_can_write(self):
+        self.as_user(self.editor)
+        response = self.client.patch(
+            self.task_url, {'title': 'Changed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/api/tasks/', {
+            'title': 'New', 'category': self.category.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Only the owner changes the category itself
+        response = self.client.patch(
+            f'/api/categories/{self.category.pk}/', {'name': 'Mine'},
+            format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_only_the_owner_manages_members(self):
+        self.as_user(self.editor)
+        response = self.client.post(
+            self.members_url, {'username': 'outsider'}, format='json')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.delete(
+            self.members_url, {'user': self.viewer.pk}, format='json')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.delete(
+            self.members_url, {'user': 'abc'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_removed_member_loses_access(self):
+        response = self.client.delete(
+            self.members_url, {'user': self.editor.pk}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.as_user(self.editor)
+        self.assertEqual(self.client.get('/api/tasks/').data['count'], 0)
+        response = self.client.patch(
+            self.task_url, {'title': 'Changed'}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_member_can_leave(self):
+        self.as_user(self.viewer)
+        response = self.client.delete(self.members_url)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(self.task_url).status_code, 404)
+
+    def test_dashboard_includes_shared_tasks(self):
+        self.as_user(self.viewer)
+        self.assertEqual(
+            self.client.get('/api/dashboard/').data['total_tasks'], 1)
+        response = self.client.get(
+            '/api/dashboard/?sections=tasks,categories')
+        sections = response.data['sections']
+        self.assertEqual(sections['tasks']['data']['count'], 1)
+        self.assertEqual([category['id'] for category in
+                          sections['categories']['data']],
+                         [self.category.pk])
+
+        etag = sections['tasks']['etag']
+        self.as_user(self.user)
+        self.client.delete(self.members_url, {'user': self.viewer.pk},
+                           format='json')
+        self.as_user(self.viewer)
+        sections = self.client.get(
+            f'/api/dashboard/?sections=tasks&known=tasks:{etag}'
+        ).data['sections']
+        self.assertEqual(sections['tasks']['data']['count'], 0)
+
+    def test_statistics_include_shared_tasks(self):
+        self.as_user(self.viewer)
+        response = self.client.get('/api/tasks/statistics/')
+        self.assertEqual(response.data['total_tasks'], 1)
+        dashboard = self.client.get('/api/dashboard/?sections=statistics')
+        self.assertEqual(
+            dashboard.data['sections']['statistics']['data'], response.data)
+
+    def test_members_filter_by_their_own_tags(self):
+        owner_tag = Tag.objects.create(name='mine', user=self.user)
+        editor_tag = Tag.objects.create(name='mine', user=self.editor)
+        self.client.patch(
+            self.task_url, {'tags': [owner_tag.pk]}, format='json')
+        self.as_user(self.editor)
+        response = self.client.patch(
+            self.task_url, {'tags': [editor_tag.pk]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # The owner's tag stays on the task
+        self.assertEqual(response.data['tags'],
+                         sorted([owner_tag.pk, editor_tag.pk]))
+        response = self.client.get(f'/api/tasks/?tags={editor_tag.pk}')
+        self.assertEqual([task['id'] for task in response.data['results']],
+                         [self.task.pk])
+        self.as_user(self.user)
+        response = self.client.get(f'/api/tasks/?tags={owner_tag.pk}')
+        self.assertEqual(response.data['count'], 1)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ActivityLogTests(APITransactionTestCase):
+    # Activity is only written once transactions really commit
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'owner', 'owner@example.com', 'owner-password')
+        self.client.force_authenticate(self.user)
+        self.task = Task.objects.create(title='Task', user=self.user)
+        TaskActivity.objects.all().delete()
+
+    def actions(self):
+        return list(TaskActivity.objects.order_by('id').values_list(
+            'action', 'actor_id'))
+
+    def test_request_writes_its_activity_in_one_insert(self):
+        tag = Tag.objects.create(name='tag', user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/tasks/{self.task.pk}/',
+                {'title': 'Renamed', 'tags': [tag.pk]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        inserts = [query for query in queries.captured_queries
+                   if query['sql'].startswith(
+                       'INSERT INTO "tasks_taskactivity"')]
+        self.assertEqual(len(inserts), 1)
+        # The task save and the tag change, by the requesting user
+        self.assertEqual(self.actions(), [
+            (TaskActivity.UPDATED, self.user.pk),
+            (TaskActivity.UPDATED, self.user.pk)])
+
+    def test_rolled_back_changes_are_not_logged(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.task.set_status('completed')
+            raise RuntimeError()
+        self.assertEqual(self.actions(), [])
+
+    def test_changes_outside_requests_have_no_actor(self):
+        self.task.set_status('completed')
+        self.assertEqual(self.actions(),
+                         [(TaskActivity.STATUS_CHANGED, None)])
+        self.assertEqual(TaskActivity.objects.get().changes,
+                         {'fields': [], 'status': ['pending', 'completed']})
+
+    def test_events_committed_after_the_flush_are_written(self):
+        buffer = ActivityBuffer()
+        buffer.add(TaskActivity(task_id=self.task.pk, owner_id=self.user.pk,
+                                action=TaskActivity.UPDATED))
+        self.assertEqual(self.actions(), [])
+        buffer.flush(self.user.pk)
+        buffer.add(TaskActivity(task_id=self.task.pk, owner_id=self.user.pk,
+                                action=TaskActivity.DELETED))
+        self.assertEqual(self.actions(), [
+            (TaskActivity.UPDATED, self.user.pk),
+            (TaskActivity.DELETED, self.user.pk)])
+
+    def test_feed(self):
+        other = Task.objects.create(title='Other', user=self.user)
+        record(self.task, TaskActivity.UPDATED)
+        response = self.client.get('/api/activity/')
+        self.assertEqual(
+            [(entry['task'], entry['action'])
+             for entry in response.data['results']],
+            [(self.task.pk, 'updated'), (other.pk, 'created')])
+        response = self.client.get(
+            f'/api/activity/?task={other.pk}&action=created')
+        self.assertEqual(len(response.data['results']), 1)
+        for query in ('task=abc', 'action=renamed'):
+            response = self.client.get(f'/api/activity/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+        self.client.force_authenticate(
+            User.objects.create_user('outsider', 'outsider@example.com'))
+        self.assertEqual(
+            self.client.get('/api/activity/').data['results'], [])
@@ -0,0 +1,175 @@
+"""
+Cost-weighted rate limiting.
+
+Every client has a token bucket in the shared Django cache: ``CAPACITY``
+tokens that refill at ``RATE`` tokens per second. Each request spends a
+number of tokens that depends on how expensive it is (``COSTS``), so a
+client can retrieve many tasks but run statistics or searches only now
+and then. Buckets are keyed by user, or by client address for anonymous
+requests. Settings live in ``TASK_THROTTLE``.
+
+On Redis the check-and-spend is a single Lua script, atomic across all
+workers and one round trip. Other caches fall back to a per-process lock
+around get/set, which is exact for the local memory cache and close
+enough for memcached.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'CAPACITY': 300,
+    'RATE': 5,
+    'ANON_CAPACITY': 60,
+    'ANON_RATE': 1,
+    'DEFAULT_COST': 1,
+    'COSTS': {},
+}
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = tonumber(state[1]) or capacity
+local stamp = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - stamp) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'stamp', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+def get_setting(name):
+    return getattr(settings, 'TASK_THROTTLE', {}).get(name, DEFAULTS[name])
+
+
+def redis_client(cache):
+    """The redis-py client behind a Redis cache backend, if there is one"""
+    client = getattr(cache, '_cache', None)  # django.core.cache RedisCache
+    if client is not None and hasattr(client, 'get_client'):
+        return client.get_client(write=True)
+    client = getattr(cache, 'client', None)  # django-redis
+    if client is not None and hasattr(client, 'get_client'):
+        return client.get_client(write=True)
+    return None
+
+
+class TokenBucket:
+    """Token buckets stored in a Django cache"""
+
+    def __init__(self, cache_alias='default'):
+        self.cache = caches[cache_alias]
+        client = redis_client(self.cache)
+        self._script = (client.register_script(TOKEN_BUCKET_SCRIPT)
+                        if client is not None else None)
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate, cost):
+        """Spend ``cost`` tokens if available; return (allowed, remaining)"""
+        if self._script is not None:
+            allowed, tokens = self._script(
+                keys=[self.cache.make_key(key)], args=[capacity, rate, cost])
+            return bool(allowed), float(tokens)
+
+        with self._lock:
+            now = time.time()
+            tokens, stamp = self.cache.get(key) or (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - stamp) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.cache.set(key, (tokens, now),
+                           timeout=math.ceil(capacity / rate) + 1)
+        return allowed, tokens
+
+
+_bucket = None
+_bucket_lock = threading.Lock()
+
+
+def get_bucket():
+    """Return the shared TokenBucket, creating it on first use"""
+    global _bucket
+    if _bucket is None:
+        with _bucket_lock:
+            if _bucket is None:
+                _bucket = TokenBucket(get_setting('CACHE'))
+    return _bucket
+
+
+def request_cost(request, view):
+    """Tokens a request spends, looked up by action or view name"""
+    name = getattr(view, 'action', None) or view.__class__.__name__
+    if request.query_params.get('stream') in ('1', 'true'):
+        name = 'export'
+    elif request.query_params.get('search'):
+        name = 'search'
+    return get_setting('COSTS').get(name, get_setting('DEFAULT_COST'))
+
+
+class CostThrottle(BaseThrottle):
+    """
+    Token bucket throttle where each request spends its cost in tokens.
+
+    The outcome is stored on the request as ``rate_limit`` for
+    RateLimitHeadersMiddleware.
+    """
+
+    def allow_request(self, request, view):
+        if request.user and request.user.is_authenticated:
+            key = f'throttle:user:{request.user.pk}'
+            capacity = get_setting('CAPACITY')
+            rate = get_setting('RATE')
+        else:
+            key = f'throttle:anon:{self.get_ident(request)}'
+            capacity = get_setting('ANON_CAPACITY')
+            rate = get_setting('ANON_RATE')
+        cost = request_cost(request, view)
+
+        allowed, remaining = get_bucket().consume(key, capacity, rate, cost)
+        self.retry_after = None if allowed else (cost - remaining) / rate
+        request._request.rate_limit = {
+            'limit': capacity,
+            'remaining': int(remaining),
+            'cost': cost,
+            'reset': math.ceil((capacity - remaining) / rate),
+        }
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class RateLimitHeadersMiddleware:
+    """Expose the throttle outcome of API requests as response headers"""
+
+    HEADERS = {
+        'limit': 'X-RateLimit-Limit',
+        'remaining': 'X-RateLimit-Remaining',
+        'cost': 'X-RateLimit-Cost',
+        'reset': 'X-RateLimit-Reset',
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit:
+            for name, header in self.HEADERS.items():
+                response[header] = str(rate_limit[name])
+        return response
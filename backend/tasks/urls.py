@@ -6,7 +6,10 @@ from . import views
 router = DefaultRouter()
 router.register(r'users', views.UserViewSet)
 router.register(r'categories', views.CategoryViewSet, basename='category')
+router.register(r'tags', views.TagViewSet, basename='tag')
+router.register(r'views', views.SavedViewViewSet, basename='saved-view')
 router.register(r'tasks', views.TaskViewSet, basename='task')
+router.register(r'activity', views.ActivityViewSet, basename='activity')
 
 # Define URL patterns
 urlpatterns = [
@@ -21,4 +24,8 @@ urlpatterns = [
 
     # Dashboard endpoints
     path('api/dashboard/', views.dashboard_summary, name='dashboard-summary'),
+
+    # Server-push change notifications
+    path('api/events/', views.event_stream, name='event-stream'),
+    path('api/events/ticket/', views.event_ticket, name='event-ticket'),
 ]
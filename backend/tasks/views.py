@@ -1,23 +1,88 @@
-from rest_framework import viewsets, status, filters
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework import mixins, viewsets, status, filters, serializers
+from rest_framework.decorators import (
+    action, api_view, authentication_classes, permission_classes,
+    renderer_classes
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import NotFound, PermissionDenied
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import login, logout
-from django.db.models import Count, Q
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import Trunc
 from django.utils import timezone
+from django.utils.http import parse_etags
+from copy import copy
 from datetime import datetime, timedelta
+from functools import partial
 
-from .models import User, Category, Task
+from .models import (
+    User, Category, CategoryMembership, SavedView, Tag, Task, ArchivedTask,
+    TaskActivity, TaskDailyStat, TaskDependency, StaleTaskError
+)
+from .archive import ArchiveUnionSequence
+from .authentication import StreamTicketAuthentication, stream_ticket
+from .dashboard import Dashboard, task_statistics
+from .dependencies import (
+    DependencyCycleError, add_dependency, blocked_tasks, critical_path_ids,
+    ready_tasks
+)
+from .events import (
+    EventStream, acquire_stream, get_setting as event_setting
+)
+from .exceptions import PreconditionFailed, StreamsUnavailable
+from .recurrence import (
+    OVERDUE_LOOKBACK_DAYS, day_window, is_occurrence_date,
+    materialize_occurrence, window_tasks
+)
+from .pagination import ActivityCursorPagination, stream_tasks
+from .renderers import EventStreamRenderer
+from . import saved_views
+from .reminders import get_setting as reminder_setting, set_reminders
+from .sharing import (
+    can_edit_task, member_category_ids, visible_tasks
+)
+from .tags import MATCH_MODES, filter_by_tags
 from .serializers import (
-    UserSerializer, UserRegistrationSerializer, UserLoginSerializer,
-    CategorySerializer, TaskSerializer, TaskCreateSerializer,
-    TaskUpdateSerializer, TaskStatisticsSerializer
+    SparseFieldsMixin, UserSerializer, UserRegistrationSerializer,
+    UserLoginSerializer, CategorySerializer, CategoryMembershipSerializer,
+    SavedViewSerializer,
+    TagSerializer, TaskSerializer,
+    TaskCreateSerializer, TaskUpdateSerializer, TaskDependencySerializer,
+    TaskActivitySerializer, TaskReminderSerializer, TaskRemindersSerializer,
+    TaskTrendQuerySerializer
 )
 
 
+def _int_param(data, name, default=None):
+    """Integer value of ``data[name]``; a 400 when missing or malformed"""
+    value = data.get(name, default)
+    if value is None or value == '':
+        raise serializers.ValidationError({name: ['This field is required.']})
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise serializers.ValidationError({name: ['Expected an id']})
+
+
+def _if_none_match(request, etag):
+    """
+    Whether If-None-Match lists ``etag``. The comparison is weak, as
+    compressed responses carry the weak form of the tag.
+    """
+    tags = parse_etags(request.headers.get('If-None-Match', ''))
+    return '*' in tags or etag.removeprefix('W/') in {
+        tag.removeprefix('W/') for tag in tags}
+
+
 class UserViewSet(viewsets.ModelViewSet):
     """User management viewset"""
     queryset = User.objects.all()
@@ -31,7 +96,66 @@ class UserViewSet(viewsets.ModelViewSet):
         return User.objects.filter(id=self.request.user.id)
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class SparseFieldsetMixin:
+    """
+    Let GET requests choose the fields they get back.
+
+    ``?fields=id,title`` keeps only those fields, ``?omit=description``
+    drops some, and ``?compact=1`` selects the serializer's compact field
+    set. The serializer and the SELECT column list are narrowed alike.
+    """
+
+    def sparse_fields(self):
+        """Requested serializer fields, or None for all of them"""
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = self._parse_sparse_fields()
+        return self._sparse_fields
+
+    def _parse_sparse_fields(self):
+        serializer_class = self.get_serializer_class()
+        if (self.request.method != 'GET'
+                or not issubclass(serializer_class, SparseFieldsMixin)):
+            return None
+        params = self.request.query_params
+        available = list(serializer_class.Meta.fields)
+        if params.get('compact') in ('1', 'true'):
+            fields = list(serializer_class.compact_fields)
+        elif params.get('fields'):
+            fields = [name for name in params['fields'].split(',') if name]
+        else:
+            fields = available
+        omit = [name for name in params.get('omit', '').split(',') if name]
+
+        unknown = sorted(set(fields + omit) - set(available))
+        if unknown:
+            raise serializers.ValidationError(
+                {'fields': [f'Unknown field(s): {", ".join(unknown)}']})
+        if fields == available and not omit:
+            return None
+        return [name for name in fields if name not in omit]
+
+    def narrow_queryset(self, queryset, related, extra=()):
+        """
+        Select only the columns the requested fields need, plus the
+        ``extra`` fields the view itself uses
+        """
+        fields = self.sparse_fields()
+        if fields is None:
+            return queryset.select_related(*related)
+        columns = self.get_serializer_class().model_fields(
+            [*fields, *extra])
+        return queryset.select_related(*{
+            column.split('__')[0] for column in columns if '__' in column
+        }).only(*columns)
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.sparse_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+
+class CategoryViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """Category management viewset"""
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
@@ -43,28 +167,246 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Return categories for current user only"""
-        return Category.objects.filter(user=self.request.user)
+        if self.action == 'restore':
+            return Category.all_objects.filter(
+                user=self.request.user, deleted_at__isnull=False)
+        queryset = self.narrow_queryset(Category.objects.filter(
+            pk__in=member_category_ids(self.request.user)), ['user'])
+        if 'task_count' in (self.sparse_fields() or ['task_count']):
+            queryset = queryset.annotate(annotated_task_count=Count(
+                'task', filter=Q(task__deleted_at__isnull=True)))
+        return queryset
 
     def perform_create(self, serializer):
         """Auto-assign current user when creating category"""
         serializer.save(user=self.request.user)
 
+    def get_object(self):
+        """Only the owner may change or delete a shared category"""
+        category = super().get_object()
+        if (self.request.method not in ('GET', 'HEAD', 'OPTIONS')
+                and self.action != 'members'
+                and category.user_id != self.request.user.pk):
+            raise PermissionDenied('Only the owner can change this category.')
+        return category
+
+    def perform_destroy(self, instance):
+        """Soft delete; purge_tombstones removes the row later"""
+        instance.soft_delete()
+
+    @action(detail=True, methods=['get', 'post', 'delete'])
+    def members(self, request, pk=None):
+        """
+        List, add or remove the members of a category.
+
+        The owner adds members (or changes their role) by username and
+        removes them by user id; members can remove themselves.
+        """
+        category = self.get_object()
+        memberships = category.memberships.select_related('user')
+        if request.method == 'GET':
+            return Response(CategoryMembershipSerializer(
+                memberships.order_by('created_at'), many=True).data)
+
+        is_owner = category.user_id == request.user.pk
+        if request.method == 'DELETE':
+            user_id = _int_param(request.data, 'user', request.user.pk)
+            if user_id == category.user_id:
+                return Response({'error': 'The owner cannot be removed'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if not is_owner and user_id != request.user.pk:
+                raise PermissionDenied('Only the owner can remove members.')
+            memberships.filter(user_id=user_id).delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if not is_owner:
+            raise PermissionDenied('Only the owner can add members.')
+        serializer = CategoryMembershipSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data['user'].pk == category.user_id:
+            return Response({'username': ['The owner is already a member']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        membership, created = CategoryMembership.objects.update_or_create(
+            category=category, user=serializer.validated_data['user'],
+            defaults={'role': serializer.validated_data['role']})
+        return Response(
+            CategoryMembershipSerializer(membership).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'])
+    def restore(self, request, pk=None):
+        """Undo deleting a category"""
+        category = self.get_object()
+        try:
+            with transaction.atomic():
+                category.restore()
+        except IntegrityError:
+            return Response(
+                {'error': 'Another category already uses this name'},
+                status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(category).data)
+
+
+class TagViewSet(viewsets.ModelViewSet):
+    """Tag management viewset"""
+    serializer_class = TagSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['name']
+    ordering_fields = ['name', 'task_count', 'created_at']
+    ordering = ['name']
+
+    def get_queryset(self):
+        """Return tags for current user only"""
+        return Tag.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        """Auto-assign current user when creating tag"""
+        serializer.save(user=self.request.user)
 
-class TaskViewSet(viewsets.ModelViewSet):
+
+class SavedViewViewSet(viewsets.ModelViewSet):
+    """Saved task list views; open one with /api/tasks/?view=<id>"""
+    serializer_class = SavedViewSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Return saved views for current user only"""
+        return SavedView.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        """Auto-assign current user when creating saved view"""
+        self._check_query(serializer)
+        serializer.save(user=self.request.user)
+
+    def perform_update(self, serializer):
+        self._check_query(serializer)
+        serializer.save()
+
+    def _check_query(self, serializer):
+        """Reject queries the task list would answer with a 400"""
+        query = serializer.validated_data.get('query')
+        if query is None:
+            return
+        try:
+            TaskViewSet.check_list_params(
+                self.request, saved_views.query_params(query))
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError({'query': exc.detail})
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAdminUser])
+    def metrics(self, request):
+        """Hit rate of the cached saved view results"""
+        return Response(saved_views.metrics())
+
+
+class ActivityViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Feed of changes to the tasks the current user can see, newest first.
+
+    ``?task=<id>`` narrows it to one task and ``?action=status_changed``
+    to one kind of change. Pages are keyset paginated: follow ``next``.
+    """
+    serializer_class = TaskActivitySerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = ActivityCursorPagination
+    # The keyset order is fixed; filters are applied in get_queryset
+    filter_backends = []
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = TaskActivity.objects.filter(
+            Q(owner=user) | Q(category__in=member_category_ids(user)))
+        params = self.request.query_params
+        if params.get('task'):
+            queryset = queryset.filter(task_id=_int_param(params, 'task'))
+        if params.get('action'):
+            codes = {label: code
+                     for code, label in TaskActivity.ACTION_CHOICES}
+            if params['action'] not in codes:
+                raise serializers.ValidationError(
+                    {'action': [f'Expected one of: {", ".join(codes)}']})
+            queryset = queryset.filter(action=codes[params['action']])
+        return queryset.select_related('actor')
+
+
+class TaskViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """Task management viewset"""
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend,
                        filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['status', 'priority', 'category']
+    filterset_fields = ['status', 'priority', 'category', 'parent']
     search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'updated_at', 'due_date', 'priority']
     ordering = ['-priority', 'due_date', '-created_at']
 
     def get_queryset(self):
         """Return tasks for current user only"""
-        queryset = Task.objects.filter(user=self.request.user)
-
-        # Additional filtering options
+        if self.action == 'restore':
+            return Task.all_objects.filter(
+                user=self.request.user, deleted_at__isnull=False)
+        # Single-task responses carry the version as their ETag
+        return self.narrow_queryset(self._tag_filter(self._status_filter(
+            visible_tasks(self.request.user))), ['user', 'category'],
+            extra=['version'] if self.detail else [])
+
+    STATUS_FILTERS = ['overdue', 'today', 'this_week']
+
+    @classmethod
+    def check_list_params(cls, request, params):
+        """
+        Raise the ValidationError a list request with ``params`` fails
+        with, without running its query. Unknown ``ordering`` fields and
+        ``status_filter`` values, which the list ignores, fail too.
+        """
+        list_request = copy(request._request)
+        list_request.GET = params
+        view = cls(request=Request(list_request), action='list',
+                   format_kwarg=None, args=(), kwargs={})
+        view.request.user = request.user
+        view.filter_queryset(view.get_queryset())
+
+        errors = {}
+        ordering = [term.strip() for term in params.get(
+            'ordering', '').split(',') if term.strip()]
+        unknown = [term for term in ordering
+                   if term.lstrip('-') not in cls.ordering_fields]
+        if unknown:
+            errors['ordering'] = [
+                f'Unknown field(s): {", ".join(unknown)}; expected: '
+                f'{", ".join(cls.ordering_fields)}']
+        status_filter = params.get('status_filter')
+        if status_filter and status_filter not in cls.STATUS_FILTERS:
+            errors['status_filter'] = [
+                f'Expected one of: {", ".join(cls.STATUS_FILTERS)}']
+        if errors:
+            raise serializers.ValidationError(errors)
+
+    def _tag_ids(self):
+        """Tag ids from ``?tags=1,2``, or None"""
+        tags = self.request.query_params.get('tags')
+        if not tags:
+            return None
+        try:
+            return [int(tag_id) for tag_id in tags.split(',') if tag_id]
+        except ValueError:
+            raise serializers.ValidationError(
+                {'tags': ['Expected a comma separated list of tag ids']})
+
+    def _tag_filter(self, queryset):
+        """Tasks with all (or with ``tag_match=any``, any) of ``?tags``"""
+        tag_ids = self._tag_ids()
+        if not tag_ids:
+            return queryset
+        match = self.request.query_params.get('tag_match', 'all')
+        if match not in MATCH_MODES:
+            raise serializers.ValidationError(
+                {'tag_match': [f'Expected one of: {", ".join(MATCH_MODES)}']})
+        return filter_by_tags(queryset, self.request.user, tag_ids, match)
+
+    def _status_filter(self, queryset):
+        """Additional filtering options"""
         status_filter = self.request.query_params.get('status_filter', None)
         if status_filter == 'overdue':
             queryset = queryset.filter(
@@ -82,6 +424,47 @@ class TaskViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        """
+        List tasks; ``?include_archived=1`` adds archived tasks and
+        ``?view=<id>`` opens a saved view.
+        """
+        if 'view' in request.query_params:
+            return self._saved_view_response(request.query_params['view'])
+        if request.query_params.get('include_archived') not in ('1', 'true'):
+            return super().list(request, *args, **kwargs)
+        archived = self._status_filter(
+            ArchivedTask.objects.filter(user=request.user))
+        if self._tag_ids():
+            # Archived tasks have no tags
+            archived = archived.none()
+        return self._list_response(ArchiveUnionSequence(
+            self.filter_queryset(self.get_queryset()),
+            self.filter_queryset(archived)))
+
+    def _saved_view_response(self, view_id):
+        """One page of a saved view, fetched by id from its cached result"""
+        if not view_id.isdigit():
+            raise serializers.ValidationError({'view': ['Expected an id']})
+        saved_view = get_object_or_404(
+            SavedView, pk=view_id, user=self.request.user)
+        # The filter backends read the saved parameters from the request
+        self.request._request.GET = saved_views.view_params(
+            saved_view, self.request.query_params)
+
+        ids, hit = saved_views.cached_task_ids(
+            saved_view, lambda: list(self.filter_queryset(
+                self.get_queryset()).values_list('pk', flat=True)))
+        page = self.paginate_queryset(ids)
+        tasks = self.narrow_queryset(
+            visible_tasks(self.request.user),
+            ['user', 'category']).in_bulk(page)
+        serializer = self.get_serializer(
+            [tasks[pk] for pk in page if pk in tasks], many=True)
+        response = self.get_paginated_response(serializer.data)
+        response['X-Saved-View-Cache'] = 'hit' if hit else 'miss'
+        return response
+
     def get_serializer_class(self):
         """Use different serializers for different actions"""
         if self.action == 'create':
@@ -94,90 +477,307 @@ class TaskViewSet(viewsets.ModelViewSet):
         """Auto-assign current user when creating task"""
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        """Soft delete the task and its subtasks; they can be restored"""
+        instance.soft_delete()
+
     @action(detail=True, methods=['post'])
-    def mark_completed(self, request, pk=None):
-        """Mark task as completed"""
+    def restore(self, request, pk=None):
+        """Undo deleting a task, together with its subtasks"""
+        task = self.get_object()
+        try:
+            task.restore()
+        except ValueError as exc:
+            return Response({'error': str(exc)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(task).data)
+
+    def _if_match_version(self):
+        """Task version from the If-Match header, if one was sent"""
+        if_match = self.request.headers.get('If-Match')
+        if not if_match or if_match.strip() == '*':
+            return None
+        try:
+            return int(if_match.strip().removeprefix('W/').strip('"'))
+        except ValueError:
+            raise PreconditionFailed('Malformed If-Match header.')
+
+    def get_object(self):
+        """
+        Reject writes by viewers of a shared task and writes whose
+        If-Match version is already outdated
+        """
+        task = super().get_object()
+        self.etag_version = task.version
+        # Reminders are personal and leave the task itself unchanged
+        if (self.request.method in ('GET', 'HEAD', 'OPTIONS')
+                or self.action == 'reminders'):
+            return task
+        if not can_edit_task(self.request.user, task):
+            raise PermissionDenied('You can only view this shared task.')
+        expected_version = self._if_match_version()
+        if expected_version is not None and expected_version != task.version:
+            raise PreconditionFailed()
+        return task
+
+    def perform_update(self, serializer):
+        """Save only changed fields, guarded by the loaded version"""
+        try:
+            serializer.save()
+        except StaleTaskError:
+            raise PreconditionFailed()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """
+        Expose the task version as an ETag on single-task responses,
+        including sparse ones that leave the version out
+        """
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        data = getattr(response, 'data', None)
+        if self.detail and isinstance(data, dict) and 'version' in data:
+            response['ETag'] = f'"{data["version"]}"'
+        elif self.action == 'retrieve' and response.status_code == 200:
+            response['ETag'] = f'"{self.etag_version}"'
+        return response
+
+    def _set_status(self, new_status):
         task = self.get_object()
-        task.status = 'completed'
-        task.completed_at = timezone.now()
-        task.save()
+        try:
+            task.set_status(new_status, self._if_match_version())
+        except StaleTaskError:
+            raise PreconditionFailed()
         serializer = self.get_serializer(task)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['post'])
+    def mark_completed(self, request, pk=None):
+        """Mark task as completed"""
+        return self._set_status('completed')
+
     @action(detail=True, methods=['post'])
     def mark_pending(self, request, pk=None):
         """Mark task as pending"""
-        task = self.get_object()
-        task.status = 'pending'
-        task.completed_at = None
-        task.save()
-        serializer = self.get_serializer(task)
-        return Response(serializer.data)
+        return self._set_status('pending')
 
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Get task statistics for current user"""
-        user_tasks = Task.objects.filter(user=request.user)
+        # The tasks the list and the dashboard show, shared ones included
+        user_tasks = visible_tasks(request.user)
+        archived_tasks = ArchivedTask.objects.filter(user=request.user)
+        return Response(task_statistics(user_tasks, archived_tasks))
 
-        total_tasks = user_tasks.count()
-        pending_tasks = user_tasks.filter(status='pending').count()
-        in_progress_tasks = user_tasks.filter(status='in_progress').count()
-        completed_tasks = user_tasks.filter(status='completed').count()
+    @action(detail=False, methods=['get'])
+    def trends(self, request):
+        """Get created/completed/overdue counts over time from daily rollups"""
+        query = TaskTrendQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        stats = TaskDailyStat.objects.filter(
+            user=request.user,
+            dimension=params['dimension'],
+            date__range=[params['start'], params['end']],
+        )
+        if params['bucket'] == 'day':
+            stats = stats.annotate(period=F('date'))
+        else:
+            stats = stats.annotate(period=Trunc('date', params['bucket']))
+        rows = stats.values('period', 'key').annotate(
+            created=Sum('created_count'),
+            completed=Sum('completed_count'),
+            overdue=Sum('overdue_count'),
+            tasks=Max('task_count'),
+        ).order_by('period', 'key')
 
-        # Calculate overdue tasks
-        overdue_tasks = user_tasks.filter(
-            due_date__lt=timezone.now(),
-            status__in=['pending', 'in_progress']
-        ).count()
-
-        # Calculate completion rate
-        completion_rate = (completed_tasks / total_tasks *
-                           100) if total_tasks > 0 else 0
-
-        # Tasks by priority
-        priority_stats = user_tasks.values(
-            'priority').annotate(count=Count('id'))
-        tasks_by_priority = {str(item['priority']): item['count']
-                             for item in priority_stats}
-
-        # Tasks by category
-        category_stats = user_tasks.filter(category__isnull=False).values(
-            'category__name'
-        ).annotate(count=Count('id'))
-        tasks_by_category = {item['category__name']                             : item['count'] for item in category_stats}
-
-        statistics_data = {
-            'total_tasks': total_tasks,
-            'pending_tasks': pending_tasks,
-            'in_progress_tasks': in_progress_tasks,
-            'completed_tasks': completed_tasks,
-            'overdue_tasks': overdue_tasks,
-            'completion_rate': round(completion_rate, 2),
-            'tasks_by_priority': tasks_by_priority,
-            'tasks_by_category': tasks_by_category,
-        }
-
-        serializer = TaskStatisticsSerializer(statistics_data)
+        return Response({
+            'start': params['start'],
+            'end': params['end'],
+            'bucket': params['bucket'],
+            'dimension': params['dimension'],
+            'results': list(rows),
+        })
+
+    def _list_response(self, queryset):
+        """Paginate and serialize a queryset like the list action"""
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    def _window_queryset(self):
+        """
+        The tasks a window lists, with the request's filters. Not ordered
+        by ``?ordering=``: merging in occurrences needs the default order.
+        """
+        queryset = self.get_queryset()
+        for backend in (DjangoFilterBackend, filters.SearchFilter):
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
+
+    def _window_response(self, tasks, stored, start, end):
+        """
+        Respond with the ``stored`` tasks merged with the occurrences of
+        the recurring ``tasks`` in a window
+        """
+        tasks = window_tasks(tasks, stored, start, end)
+        if self.request.query_params.get('stream') in ('1', 'true'):
+            serializer_class = self.get_serializer_class()
+            if self.sparse_fields() is not None:
+                serializer_class = partial(
+                    serializer_class, fields=self.sparse_fields())
+            return stream_tasks(
+                tasks.queryset, tasks.occurrences, serializer_class,
+                self.get_serializer_context())
+        return self._list_response(tasks)
+
     @action(detail=False, methods=['get'])
     def overdue(self, request):
-        """Get overdue tasks"""
-        overdue_tasks = self.get_queryset().filter(
-            due_date__lt=timezone.now(),
+        """
+        Get overdue tasks. Missed occurrences of recurring tasks are
+        listed back to the time in ``X-Recurring-Overdue-Since``.
+        """
+        now = timezone.now()
+        since = now - timedelta(days=OVERDUE_LOOKBACK_DAYS)
+        tasks = self._window_queryset()
+        overdue_tasks = tasks.filter(
+            due_date__lt=now,
             status__in=['pending', 'in_progress']
         )
-        serializer = self.get_serializer(overdue_tasks, many=True)
-        return Response(serializer.data)
+        response = self._window_response(tasks, overdue_tasks, since, now)
+        response['X-Recurring-Overdue-Since'] = since.isoformat()
+        return response
 
     @action(detail=False, methods=['get'])
     def today(self, request):
         """Get tasks due today"""
-        today = timezone.now().date()
-        today_tasks = self.get_queryset().filter(due_date__date=today)
-        serializer = self.get_serializer(today_tasks, many=True)
+        start, end = day_window(timezone.now().date())
+        # A range on the column itself, unlike __date, can use indexes
+        tasks = self._window_queryset()
+        today_tasks = tasks.filter(due_date__gte=start, due_date__lt=end)
+        return self._window_response(tasks, today_tasks, start, end)
+
+    @action(detail=False, methods=['get'])
+    def this_week(self, request):
+        """Get tasks due within the next seven days"""
+        start, end = day_window(timezone.now().date(), days=8)
+        tasks = self._window_queryset()
+        week_tasks = tasks.filter(due_date__gte=start, due_date__lt=end)
+        return self._window_response(tasks, week_tasks, start, end)
+
+    @action(detail=True, methods=['post'])
+    def occurrence(self, request, pk=None):
+        """Materialize one occurrence of a recurring task and apply updates"""
+        template = self.get_object()
+        if not template.is_recurring():
+            return Response({'error': 'Task is not recurring'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        field = serializers.DateTimeField()
+        try:
+            occurrence_date = field.to_internal_value(
+                request.data.get('occurrence_date'))
+        except serializers.ValidationError as exc:
+            return Response({'occurrence_date': exc.detail},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not is_occurrence_date(template, occurrence_date):
+            return Response(
+                {'occurrence_date': ['Not an occurrence of this task']},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        task = materialize_occurrence(template, occurrence_date)
+        updates = {key: value for key, value in request.data.items()
+                   if key != 'occurrence_date'}
+        serializer = TaskUpdateSerializer(
+            task, data=updates, partial=True, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(TaskSerializer(task).data)
+
+    @action(detail=False, methods=['get'])
+    def ready(self, request):
+        """Get open tasks whose blockers are all completed"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return self._list_response(ready_tasks(queryset))
+
+    @action(detail=False, methods=['get'])
+    def blocked(self, request):
+        """Get open tasks waiting on at least one open blocker"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return self._list_response(blocked_tasks(queryset))
+
+    @action(detail=False, methods=['get'])
+    def critical_path(self, request):
+        """Get the longest chain of open dependent tasks"""
+        path = critical_path_ids(request.user)
+        tasks = self.narrow_queryset(
+            Task.objects.all(), ['user', 'category']).in_bulk(path)
+        serializer = self.get_serializer(
+            [tasks[task_id] for task_id in path], many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def subtree(self, request, pk=None):
+        """Get a task with all of its subtasks and rolled-up progress"""
+        task = self.get_object()
+        subtree = self.narrow_queryset(visible_tasks(request.user).filter(
+            path__startswith=task.tree_path()
+        ), ['user', 'category']).order_by('path')
+        serializer = self.get_serializer(subtree, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get', 'post', 'delete'])
+    def dependencies(self, request, pk=None):
+        """List, add or remove the tasks blocking this task"""
+        task = self.get_object()
+
+        if request.method == 'GET':
+            dependencies = task.dependencies.select_related('depends_on')
+            serializer = TaskDependencySerializer(dependencies, many=True)
+            return Response(serializer.data)
+
+        if request.method == 'DELETE':
+            depends_on = _int_param(request.data, 'depends_on')
+            deleted, _ = TaskDependency.objects.filter(
+                task=task, depends_on_id=depends_on).delete()
+            if not deleted:
+                raise NotFound('This task does not depend on that task.')
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        serializer = TaskDependencySerializer(
+            data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        try:
+            dependency = add_dependency(
+                task, serializer.validated_data['depends_on'])
+        except DependencyCycleError as exc:
+            return Response({'depends_on': [str(exc)]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(TaskDependencySerializer(dependency).data,
+                        status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get', 'put'])
+    def reminders(self, request, pk=None):
+        """
+        List or replace the current user's reminders of this task.
+
+        PUT takes ``{"minutes_before": [0, 60, ...]}``, offsets from the
+        due date; moving the due date moves its reminders along.
+        """
+        task = self.get_object()
+        reminders = task.reminders.filter(user=request.user).order_by(
+            'offset')
+        if request.method == 'PUT':
+            serializer = TaskRemindersSerializer(data=request.data, context={
+                'max_reminders': reminder_setting('MAX_REMINDERS')})
+            serializer.is_valid(raise_exception=True)
+            offsets = serializer.validated_data['minutes_before']
+            reminders = set_reminders(task, request.user, offsets)
+        return Response(TaskReminderSerializer(reminders, many=True).data)
+
 # Authentication Views
 
 
@@ -187,9 +787,10 @@ def register_user(request):
     """User registration endpoint"""
     serializer = UserRegistrationSerializer(data=request.data)
     if serializer.is_valid():
-        user = serializer.save()
-        # Create auth token for immediate login
-        token, created = Token.objects.get_or_create(user=user)
+        with transaction.atomic():
+            user = serializer.save()
+            # Create auth token for immediate login
+            token = Token.objects.create(user=user)
         return Response({
             'user': UserSerializer(user).data,
             'token': token.key,
@@ -201,12 +802,22 @@ def register_user(request):
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def login_user(request):
-    """User login endpoint"""
+    """
+    User login endpoint
+
+    Token clients don't need a session, so one is only created when the
+    request asks for it with ``"session": true``.
+    """
     serializer = UserLoginSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.validated_data['user']
         token, created = Token.objects.get_or_create(user=user)
-        login(request, user)
+        if str(request.data.get('session', '')).lower() in ('1', 'true'):
+            login(request, user)
+        else:
+            user.last_login = timezone.now()
+            User.objects.filter(pk=user.pk).update(
+                last_login=user.last_login)
         return Response({
             'user': UserSerializer(user).data,
             'token': token.key,
@@ -224,7 +835,9 @@ def logout_user(request):
         request.user.auth_token.delete()
     except:
         pass
-    logout(request)
+    # Token requests take the API pipeline, which has no session
+    if hasattr(request, 'session'):
+        logout(request)
     return Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
 
 
@@ -239,31 +852,71 @@ def user_profile(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def dashboard_summary(request):
-    """Get dashboard summary data"""
-    user_tasks = Task.objects.filter(user=request.user)
-    user_categories = Category.objects.filter(user=request.user)
-
-    # Recent tasks (last 5)
-    recent_tasks = user_tasks.order_by('-created_at')[:5]
-
-    # Upcoming tasks (next 5 by due date)
-    upcoming_tasks = user_tasks.filter(
-        due_date__gte=timezone.now(),
-        status__in=['pending', 'in_progress']
-    ).order_by('due_date')[:5]
-
-    summary_data = {
-        'total_tasks': user_tasks.count(),
-        'total_categories': user_categories.count(),
-        'completed_today': user_tasks.filter(
-            completed_at__date=timezone.now().date()
-        ).count(),
-        'overdue_count': user_tasks.filter(
-            due_date__lt=timezone.now(),
-            status__in=['pending', 'in_progress']
-        ).count(),
-        'recent_tasks': TaskSerializer(recent_tasks, many=True).data,
-        'upcoming_tasks': TaskSerializer(upcoming_tasks, many=True).data,
-    }
+    """
+    Get dashboard summary data
+
+    With ``?sections=tasks,statistics,...`` several dashboard sections are
+    returned in one response, each with its own ETag. Sections listed in
+    ``?known=<section>:<etag>,...`` that are unchanged come back as
+    ``not_modified`` without data.
+    """
+    dashboard = Dashboard(request.user)
+    requested = request.query_params.get('sections')
+    if not requested:
+        return Response(dashboard.build_summary())
+
+    names = [name for name in requested.split(',') if name]
+    unknown = sorted(set(names) - set(Dashboard.SECTIONS))
+    if unknown:
+        return Response(
+            {'sections': [f'Unknown section(s): {", ".join(unknown)}']},
+            status=status.HTTP_400_BAD_REQUEST)
+
+    known_etags = dict(
+        item.split(':', 1)
+        for item in request.query_params.get('known', '').split(',')
+        if ':' in item
+    )
+    sections = dashboard.sections(names, known_etags)
+
+    # Whole-response validator for plain HTTP caches
+    etag = '"{}"'.format('-'.join(
+        sections[name]['etag'][:8] for name in names))
+    if _if_none_match(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED,
+                        headers={'ETag': etag})
+    return Response({'sections': sections}, headers={'ETag': etag})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def event_ticket(request):
+    """Short-lived ticket for opening the event stream with ``?ticket=``"""
+    return Response({
+        'ticket': stream_ticket(request.user),
+        'expires_in': event_setting('TICKET_SECONDS'),
+    })
+
 
-    return Response(summary_data)
+@api_view(['GET'])
+@authentication_classes(
+    [StreamTicketAuthentication] + api_settings.DEFAULT_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+def event_stream(request):
+    """Server-sent events stream of the current user's task/category changes"""
+    last_event_id = request.headers.get(
+        'Last-Event-ID', request.query_params.get('last_event_id'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    if not acquire_stream():
+        raise StreamsUnavailable()
+    response = StreamingHttpResponse(
+        EventStream(request.user.id, last_event_id),
+        content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
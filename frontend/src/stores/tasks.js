@@ -7,6 +7,14 @@ export const useTaskStore = defineStore('tasks', {
         categories: [],
         stats: {},
         loading: false,
+        eventSource: null,
+        eventSourceConnecting: false,
+        lastEventId: null,
+        subscribed: false,
+        changeListener: null,
+        todayTasks: [],
+        overdueTasks: [],
+        sectionEtags: {},
     }),
 
     getters: {
@@ -41,6 +49,37 @@ export const useTaskStore = defineStore('tasks', {
             }
         },
 
+        // Load tasks, stats, categories, today and overdue in one request.
+        // Sections that did not change since the last load are skipped.
+        async loadDashboard() {
+            const sections = ['tasks', 'statistics', 'categories', 'today', 'overdue']
+            const known = Object.entries(this.sectionEtags)
+                .map(([name, etag]) => `${name}:${etag}`)
+                .join(',')
+            try {
+                this.loading = true
+                const response = await api.get('/api/dashboard/', {
+                    params: { sections: sections.join(','), known },
+                })
+                const apply = {
+                    tasks: (data) => { this.tasks = data.results },
+                    statistics: (data) => { this.stats = data },
+                    categories: (data) => { this.categories = data },
+                    today: (data) => { this.todayTasks = data.results },
+                    overdue: (data) => { this.overdueTasks = data.results },
+                }
+                for (const [name, section] of Object.entries(response.data.sections)) {
+                    this.sectionEtags[name] = section.etag
+                    if (!section.not_modified) apply[name](section.data)
+                }
+            } catch (error) {
+                console.error('Load dashboard error:', error)
+                throw new Error('Failed to load dashboard')
+            } finally {
+                this.loading = false
+            }
+        },
+
         // Fetch task statistics
         async fetchStats() {
             try {
@@ -77,7 +116,10 @@ export const useTaskStore = defineStore('tasks', {
         // Update existing task
         async updateTask(taskId, updates) {
             try {
-                const response = await api.put(`/api/tasks/${taskId}/`, updates)
+                // Send only the changed fields, guarded by the version we last saw
+                const current = this.tasks.find(task => task.id === taskId)
+                const headers = current?.version ? { 'If-Match': `"${current.version}"` } : {}
+                const response = await api.patch(`/api/tasks/${taskId}/`, updates, { headers })
                 const index = this.tasks.findIndex(task => task.id === taskId)
                 if (index !== -1) {
                     this.tasks[index] = response.data
@@ -85,6 +127,9 @@ export const useTaskStore = defineStore('tasks', {
                 return response.data
             } catch (error) {
                 console.error('Update task error:', error)
+                if (error.response?.status === 412) {
+                    throw new Error('This task was changed elsewhere, please reload it')
+                }
                 const message = error.response?.data?.detail ||
                     error.response?.data?.message ||
                     'Failed to update task'
@@ -106,6 +151,20 @@ export const useTaskStore = defineStore('tasks', {
             }
         },
 
+        // Undo deleting a task (and its subtasks)
+        async restoreTask(taskId) {
+            try {
+                const response = await api.post(`/api/tasks/${taskId}/restore/`)
+                this.tasks.unshift(response.data)
+                return response.data
+            } catch (error) {
+                console.error('Restore task error:', error)
+                const message = error.response?.data?.error ||
+                    'Failed to restore task'
+                throw new Error(message)
+            }
+        },
+
         // Mark task as completed
         async markCompleted(taskId) {
             try {
@@ -152,7 +211,7 @@ export const useTaskStore = defineStore('tasks', {
         async getTodayTasks() {
             try {
                 const response = await api.get('/api/tasks/today/')
-                return response.data
+                return response.data.results || response.data
             } catch (error) {
                 console.error('Get today tasks error:', error)
                 return []
@@ -163,11 +222,139 @@ export const useTaskStore = defineStore('tasks', {
         async getOverdueTasks() {
             try {
                 const response = await api.get('/api/tasks/overdue/')
-                return response.data
+                return response.data.results || response.data
             } catch (error) {
                 console.error('Get overdue tasks error:', error)
                 return []
             }
         },
+
+        // Subscribe to server-push change events instead of polling.
+        // onChange(type) is called after the store applied each event.
+        async subscribeToChanges(onChange = null) {
+            this.changeListener = onChange
+            this.subscribed = true
+            if (this.eventSource || this.eventSourceConnecting || !localStorage.getItem('token')) return
+            this.eventSourceConnecting = true
+            try {
+                // EventSource can't send the token in a header, and a token in
+                // the URL ends up in logs; a ticket only opens the stream and
+                // expires within a minute
+                const response = await api.post('/api/events/ticket/')
+                if (this.subscribed) this.openEventSource(response.data.ticket)
+            } catch (error) {
+                console.error('Event ticket error:', error)
+                this.resubscribeLater(30000)
+            } finally {
+                this.eventSourceConnecting = false
+            }
+        },
+
+        resubscribeLater(delay) {
+            setTimeout(() => {
+                if (this.subscribed && !this.eventSource) {
+                    this.subscribeToChanges(this.changeListener)
+                }
+            }, delay)
+        },
+
+        openEventSource(ticket) {
+            const params = new URLSearchParams({ ticket })
+            if (this.lastEventId) params.set('last_event_id', this.lastEventId)
+            const source = new EventSource(`${api.defaults.baseURL}/api/events/?${params}`)
+            const notify = (event) => {
+                if (event.lastEventId) this.lastEventId = event.lastEventId
+                this.changeListener?.(event.type)
+            }
+
+            const refreshTask = async (event) => {
+                const { id } = JSON.parse(event.data)
+                try {
+                    const response = await api.get(`/api/tasks/${id}/`)
+                    const index = this.tasks.findIndex(task => task.id === id)
+                    if (index !== -1) {
+                        this.tasks[index] = response.data
+                    } else {
+                        this.tasks.unshift(response.data)
+                    }
+                } catch (error) {
+                    console.error('Refresh task error:', error)
+                }
+                notify(event)
+            }
+
+            source.addEventListener('task.created', refreshTask)
+            source.addEventListener('task.updated', refreshTask)
+            source.addEventListener('task.restored', refreshTask)
+            // Archived tasks leave the lists like deleted ones
+            const removeTask = (event) => {
+                const { id } = JSON.parse(event.data)
+                this.tasks = this.tasks.filter(task => task.id !== id)
+                notify(event)
+            }
+            source.addEventListener('task.deleted', removeTask)
+            source.addEventListener('task.archived', removeTask)
+            for (const type of ['category.created', 'category.updated', 'category.deleted', 'category.restored']) {
+                source.addEventListener(type, async (event) => {
+                    await this.fetchCategories().catch(() => {})
+                    notify(event)
+                })
+            }
+            // Events were missed, reload everything
+            source.addEventListener('reset', async (event) => {
+                await Promise.allSettled([this.fetchTasks(), this.fetchCategories()])
+                notify(event)
+            })
+            // The browser would retry with the same, soon expired ticket;
+            // reconnect with a new one instead. Right away when an open
+            // stream ended, later when the server turned the connection
+            // down (e.g. 503 when it has no free stream slots)
+            let opened = false
+            source.onopen = () => { opened = true }
+            source.onerror = () => {
+                if (this.eventSource !== source) return
+                source.close()
+                this.eventSource = null
+                this.resubscribeLater(opened ? 1000 : 30000)
+            }
+
+            this.eventSource = source
+        },
+
+        // Stop receiving change events
+        unsubscribeFromChanges() {
+            this.changeListener = null
+            this.subscribed = false
+            this.lastEventId = null
+            if (this.eventSource) {
+                this.eventSource.close()
+                this.eventSource = null
+            }
+        },
+
+        // Get tasks due within the next week
+        async getWeekTasks() {
+            try {
+                const response = await api.get('/api/tasks/this_week/')
+                return response.data.results || response.data
+            } catch (error) {
+                console.error('Get week tasks error:', error)
+                return []
+            }
+        },
+
+        // Complete one occurrence of a recurring task
+        async completeOccurrence(taskId, occurrenceDate) {
+            try {
+                const response = await api.post(`/api/tasks/${taskId}/occurrence/`, {
+                    occurrence_date: occurrenceDate,
+                    status: 'completed',
+                })
+                return response.data
+            } catch (error) {
+                console.error('Complete occurrence error:', error)
+                throw new Error('Failed to complete occurrence')
+            }
+        },
     },
 })
\ No newline at end of file